@@ -0,0 +1,21 @@
+"""
+Benchmarks for django_mail_template hot paths.
+
+They need pytest-benchmark and are not run with the test suite. Run them
+with::
+
+    pytest benchmarks --no-cov --benchmark-storage=benchmarks/baseline \
+        --benchmark-compare --benchmark-compare-fail=median:50%
+
+to compare with the stored baseline and fail on regressions. Medians are
+compared as they are not moved by outliers, and the threshold is wide as
+runs of the same commit on a shared machine differ by up to 30%: a
+benchmark failing it should be run again, and compared with a run of the
+previous commit on the same machine, before it is taken as a regression.
+Timings depend on the machine, so the stored baseline is only meaningful on
+machines like the one that recorded it.
+
+Save a new baseline, replacing the stored one, with
+``--benchmark-save=baseline`` after intended changes and whenever
+benchmarks are added.
+"""
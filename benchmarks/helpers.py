@@ -0,0 +1,19 @@
+# -*- coding: UTF-8 -*-
+# Paragraph similar to the HTML CKEditor produces, about 100 bytes.
+PARAGRAPH = ('<p style="margin:0;font-family:Arial">Lorem ipsum dolor sit '
+             'amet, consectetur.</p>\n')
+
+
+def make_body(size, variables):
+    """Return a body of about size bytes using variables placeholders."""
+    paragraphs = [PARAGRAPH] * max(size // len(PARAGRAPH), 1)
+    step = max(len(paragraphs) // max(variables, 1), 1)
+    for index in range(variables):
+        position = min(index * step, len(paragraphs) - 1)
+        paragraphs[position] += '{var_%d}' % index
+    return ''.join(paragraphs)
+
+
+def make_context(variables):
+    return {'var_%d' % index: 'value %d' % index
+            for index in range(variables)}
@@ -0,0 +1,29 @@
+# -*- coding: UTF-8 -*-
+import pytest
+
+from django_mail_template.tools import _clean_addresses, clean_address_list
+
+pytest.importorskip('pytest_benchmark')
+
+LIST_LENGTHS = [1, 10, 40]
+
+
+def make_addresses(length):
+    return ','.join('address{}@mail.com'.format(i) for i in range(length))
+
+
+@pytest.mark.parametrize('length', LIST_LENGTHS)
+def test_clean_address_list_cached(benchmark, length):
+    addresses = make_addresses(length)
+    benchmark(clean_address_list, addresses)
+
+
+@pytest.mark.parametrize('length', LIST_LENGTHS)
+def test_clean_address_list_not_cached(benchmark, length):
+    addresses = make_addresses(length)
+
+    def clean():
+        _clean_addresses.cache_clear()
+        clean_address_list(addresses)
+
+    benchmark(clean)
@@ -0,0 +1,36 @@
+# -*- coding: UTF-8 -*-
+import pytest
+
+from benchmarks.helpers import make_body, make_context
+from django_mail_template.tools import (compile_django_template,
+                                        compile_template,
+                                        replace_context_variable)
+
+pytest.importorskip('pytest_benchmark')
+
+BODY_SIZES = [1000, 10000, 80000]
+CONTEXT_SIZES = [1, 10, 100]
+
+
+@pytest.mark.parametrize('variables', CONTEXT_SIZES)
+@pytest.mark.parametrize('size', BODY_SIZES)
+def test_replace_context_variable(benchmark, size, variables):
+    body = make_body(size, variables)
+    context = make_context(variables)
+    benchmark(replace_context_variable, body, context)
+
+
+@pytest.mark.parametrize('variables', CONTEXT_SIZES)
+@pytest.mark.parametrize('size', BODY_SIZES)
+def test_compiled_template_render(benchmark, size, variables):
+    body = make_body(size, variables)
+    context = make_context(variables)
+    benchmark(lambda: compile_template(body).render(context))
+
+
+@pytest.mark.parametrize('variables', CONTEXT_SIZES)
+@pytest.mark.parametrize('size', BODY_SIZES)
+def test_django_template_render(benchmark, size, variables):
+    body = make_body(size, variables).replace('{', '{{ ').replace('}', ' }}')
+    context = make_context(variables)
+    benchmark(lambda: compile_django_template(body).render(context))
@@ -0,0 +1,59 @@
+# -*- coding: UTF-8 -*-
+import pytest
+from django.core import mail
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from benchmarks.helpers import make_body, make_context
+from django_mail_template.cache import mail_template_lookup_cache
+from django_mail_template.models import MailTemplate, Configuration
+
+pytest.importorskip('pytest_benchmark')
+
+
+@pytest.fixture
+def mail_template(settings):
+    settings.EMAIL_BACKEND = 'django.core.mail.backends.locmem.EmailBackend'
+    return MailTemplate.objects.create(
+        title='Benchmark', from_email='a@b.com', to='b@c.com, c@c.com',
+        cc='d@c.com', reply_to='e@c.com', subject='Hello {var_0}',
+        body=make_body(10000, 10))
+
+
+def test_send(benchmark, mail_template):
+    context = make_context(10)
+
+    def send():
+        mail.outbox = []
+        mail_template.send(context)
+
+    benchmark(send)
+
+
+def test_send_many(benchmark, mail_template):
+    contexts = [make_context(10)] * 100
+
+    def send_many():
+        mail.outbox = []
+        mail_template.send_many(contexts)
+
+    benchmark(send_many)
+
+
+@pytest.mark.parametrize('cached', [False, True])
+def test_get_mail_template(benchmark, mail_template, cached):
+    Configuration.objects.create(process='benchmark',
+                                 mail_template=mail_template)
+    expected_queries = 0 if cached else 1
+
+    def get_mail_template():
+        if not cached:
+            mail_template_lookup_cache.clear()
+            mail_template_lookup_cache.cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            Configuration.get_mail_template('benchmark')
+        assert len(queries) == expected_queries
+
+    Configuration.get_mail_template('benchmark')
+    benchmark(get_mail_template)
+    benchmark.extra_info['queries'] = expected_queries
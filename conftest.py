@@ -18,3 +18,12 @@ def pytest_configure():
 def enable_db_access_for_all_tests(db):
     pass
 
+
+@pytest.fixture(autouse=True)
+def clear_mail_template_caches():
+    # Database changes are rolled back between tests without sending the
+    # signals that invalidate the caches.
+    from django.core.cache import cache
+    from django_mail_template.cache import mail_template_lookup_cache
+    cache.clear()
+    mail_template_lookup_cache.clear()
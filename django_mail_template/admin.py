@@ -1,48 +1,120 @@
 # -*- coding: UTF-8 -*-
 from django.contrib import admin, messages
+from django.core.mail import get_connection
+from django.urls import reverse
+from django.utils.html import format_html
 from django.utils.translation import gettext as _
 
-from django_mail_template.models import MailTemplate, Configuration
+from django_mail_template.conf import app_settings
+from django_mail_template.models import (MailTemplate, Configuration,
+                                         QueuedMail, SentMail)
 
 
 class MailTemplateAdmin(admin.ModelAdmin):
 
     actions = ['test_mail_template']
+    readonly_fields = ['body_bytes_saved']
 
     def test_mail_template(self, request, queryset):
-        send_mail = 0
+        # Every mail template is rendered first, so errors are reported
+        # before anything is sent, and then sent through one connection.
+        prepared = []
         for mail_template in queryset:
             if mail_template.to is None or mail_template.to == '':
                 err_msg = _('MailTemplate {}: Do not have a email '
                             'address in To Field').format(mail_template.title)
                 self.message_user(request, err_msg, messages.ERROR)
-            else:
-                try:
-                    # send with context={} is to force replacement and detect
-                    # any error
-                    mail_template.send(context={})
-                    send_mail += 1
-                except ValueError as e:
-                    err_msg = _('MailTemplate {}: Gives an error when '
-                                'trying to send it. Most likely: please check '
-                                'subject and body uses context variables as '
-                                'expected: "{{variable{{" and "}}variable}}" '
-                                'are both wrong use. The error detail: {} '
-                                '({}).').format(mail_template.title, str(e),
-                                                type(e))
-                    self.message_user(request, err_msg, messages.ERROR)
-                except Exception as e:
-                    # Catch any exception as it is a test.
-                    err_msg = _('MailTemplate {}: Gives an error when '
-                                'trying to send it: {} ({}).').format(
-                                 mail_template.title, str(e), type(e))
-                    self.message_user(request, err_msg, messages.ERROR)
+                continue
+            try:
+                # build with context={} is to force replacement and detect
+                # any error
+                message = mail_template.build_message(context={})
+            except ValueError as e:
+                err_msg = _('MailTemplate {}: Gives an error when '
+                            'trying to send it. Most likely: please check '
+                            'subject and body uses context variables as '
+                            'expected: "{{variable{{" and "}}variable}}" '
+                            'are both wrong use. The error detail: {} '
+                            '({}).').format(mail_template.title, str(e),
+                                            type(e))
+                self.message_user(request, err_msg, messages.ERROR)
+                continue
+            except Exception as e:
+                self._send_error(request, mail_template, e)
+                continue
+            prepared.append((mail_template, message))
+        threshold = app_settings.ADMIN_QUEUE_THRESHOLD
+        if threshold is not None and len(prepared) > threshold:
+            self._enqueue_test_mails(request, prepared)
+            return
+        send_mail = 0
+        if prepared:
+            send_mail = self._send_test_mails(request, prepared)
         if send_mail > 0:
             msg = _('Amount of sent mails: {}.').format(send_mail)
             self.message_user(request, msg, messages.SUCCESS)
 
     test_mail_template.short_description = _('Test mails templates')
 
+    def _send_test_mails(self, request, prepared):
+        connection = get_connection()
+        try:
+            connection.open()
+        except Exception as e:
+            for mail_template, message in prepared:
+                self._send_error(request, mail_template, e)
+            return 0
+        send_mail = 0
+        try:
+            for mail_template, message in prepared:
+                try:
+                    send_mail += mail_template.send_messages(connection,
+                                                             [message])
+                except Exception as e:
+                    # Catch any exception as it is a test.
+                    self._send_error(request, mail_template, e)
+        finally:
+            connection.close()
+        return send_mail
+
+    def _send_error(self, request, mail_template, error):
+        err_msg = _('MailTemplate {}: Gives an error when '
+                    'trying to send it: {} ({}).').format(
+                     mail_template.title, str(error), type(error))
+        self.message_user(request, err_msg, messages.ERROR)
+
+    def _enqueue_test_mails(self, request, prepared):
+        # Too many mails to send them in the request, the mail queue workers
+        # send them in the background.
+        QueuedMail.objects.bulk_create([
+            QueuedMail(mail_template=mail_template, context={})
+            for mail_template, message in prepared])
+        url = reverse('admin:django_mail_template_queuedmail_changelist')
+        msg = format_html(
+            _('Amount of queued mails: {}. Their progress is shown in '
+              '<a href="{}">queued mails</a>.'), len(prepared), url)
+        self.message_user(request, msg, messages.SUCCESS)
+
+
+class QueuedMailAdmin(admin.ModelAdmin):
+    list_display = ['mail_template', 'status', 'attempts', 'next_attempt',
+                    'created', 'sent']
+    list_filter = ['status']
+    list_select_related = ['mail_template']
+    readonly_fields = ['attempts', 'last_error', 'created', 'sent']
+
+
+class SentMailAdmin(admin.ModelAdmin):
+    list_display = ['created', 'mail_template', 'recipients', 'subject',
+                    'status']
+    list_filter = ['status']
+    list_select_related = ['mail_template']
+    date_hierarchy = 'created'
+    readonly_fields = ['mail_template', 'recipients', 'subject', 'status',
+                       'message_id', 'error', 'duration', 'created']
+
 
 admin.site.register(MailTemplate, MailTemplateAdmin)
 admin.site.register(Configuration)
+admin.site.register(QueuedMail, QueuedMailAdmin)
+admin.site.register(SentMail, SentMailAdmin)
@@ -0,0 +1,65 @@
+# -*- coding: UTF-8 -*-
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.mail import get_connection
+from django.core.mail.backends.smtp import EmailBackend as SMTPBackend
+from django.core.mail.message import sanitize_address
+
+try:
+    import aiosmtplib
+except ImportError:  # pragma: no cover
+    aiosmtplib = None
+
+
+async def asend_messages(messages, connection=None, fail_silently=False):
+    """
+    Send messages without blocking the event loop.
+
+    When aiosmtplib is installed and the connection is Django's SMTP backend
+    the messages are sent with aiosmtplib, using the backend configuration,
+    in one SMTP session. Otherwise connection.send_messages() is run in a
+    worker thread, one thread hop for all the messages.
+
+    :param messages: A list of EmailMessage instances.
+    :param connection: An optional email backend instance. If not given
+                       a new one is created with get_connection().
+    :param fail_silently: Passed to get_connection() when a connection is
+                          created.
+    :return: The amount of messages sent.
+    """
+    messages = [message for message in messages if message.recipients()]
+    if not messages:
+        return 0
+    if connection is None:
+        connection = get_connection(fail_silently=fail_silently)
+    if aiosmtplib is not None and isinstance(connection, SMTPBackend):
+        return await _asend_smtp_messages(connection, messages)
+    send_messages = sync_to_async(connection.send_messages,
+                                  thread_sensitive=False)
+    return await send_messages(messages) or 0
+
+
+async def _asend_smtp_messages(backend, messages):
+    smtp = aiosmtplib.SMTP(
+        hostname=backend.host, port=backend.port, use_tls=backend.use_ssl,
+        start_tls=backend.use_tls, timeout=backend.timeout,
+        client_cert=backend.ssl_certfile, client_key=backend.ssl_keyfile)
+    sent = 0
+    try:
+        async with smtp:
+            if backend.username and backend.password:
+                await smtp.login(backend.username, backend.password)
+            for message in messages:
+                # Same as django.core.mail.backends.smtp.EmailBackend._send()
+                encoding = message.encoding or settings.DEFAULT_CHARSET
+                from_email = sanitize_address(message.from_email, encoding)
+                recipients = [sanitize_address(addr, encoding)
+                              for addr in message.recipients()]
+                await smtp.sendmail(
+                    from_email, recipients,
+                    message.message().as_bytes(linesep='\r\n'))
+                sent += 1
+    except (aiosmtplib.SMTPException, OSError):
+        if not backend.fail_silently:
+            raise
+    return sent
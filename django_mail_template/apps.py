@@ -6,3 +6,34 @@ class DjangoMailTemplateConfig(AppConfig):
     name = 'django_mail_template'
     verbose_name = _('Django Mail Template')
     default_auto_field = 'django.db.models.BigAutoField'
+
+    def ready(self):
+        from django_mail_template import receivers  # noqa: F401
+        from django_mail_template.conf import app_settings
+        if app_settings.METRICS:
+            from django_mail_template import metrics
+            metrics.connect()
+        if app_settings.SENT_LOG:
+            from django_mail_template import sent_log
+            sent_log.connect()
+        if app_settings.WARM_UP:
+            # Not here: the database should not be queried while the
+            # applications are set up, and management commands do not need
+            # it.
+            from django.core.signals import request_started
+            request_started.connect(self.warm_up_on_first_request,
+                                    dispatch_uid='mail_template_warm_up')
+
+    def warm_up_on_first_request(self, sender, **kwargs):
+        from django.core.signals import request_started
+        if request_started.disconnect(dispatch_uid='mail_template_warm_up'):
+            self.warm_up()
+
+    def warm_up(self):
+        from django.db import DatabaseError
+        from django_mail_template.warmup import warm_up
+        try:
+            warm_up()
+        except DatabaseError:
+            # Tables are not created yet, for example while migrating.
+            pass
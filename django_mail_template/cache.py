@@ -0,0 +1,403 @@
+# -*- coding: UTF-8 -*-
+import copy
+import datetime
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from decimal import Decimal
+
+from django.core.cache import caches
+from django.utils.functional import Promise
+from django.utils.timezone import get_current_timezone_name
+from django.utils.translation import get_language
+
+from django_mail_template.conf import app_settings
+
+
+class MailTemplateLookupCache:
+    """
+    Two level cache for the process to mail template mapping.
+
+    The first level is a dictionary local to the process, the second one is
+    the Django cache configured by MAIL_TEMPLATE_CACHE_ALIAS, shared between
+    processes. The second level expires after MAIL_TEMPLATE_CACHE_TIMEOUT
+    seconds. Entries are invalidated by signal receivers when a
+    Configuration or a MailTemplate is saved or deleted (see receivers
+    module), but those receivers only clear the first level of the process
+    making the change: in other processes it expires after
+    MAIL_TEMPLATE_CACHE_LOCAL_TIMEOUT seconds (if shorter), and mail
+    templates saved elsewhere are discarded from it by the revision checks
+    made every MAIL_TEMPLATE_REVISION_CHECK_INTERVAL seconds (see
+    discard_stale()).
+
+    Processes without a mail template are cached too, so a lookup never hits
+    the database until the entry expires or is invalidated.
+    """
+    key_prefix = 'django_mail_template.process.'
+
+    def __init__(self):
+        self._local = {}
+        self._checked = 0
+
+    @property
+    def cache(self):
+        return caches[app_settings.CACHE_ALIAS]
+
+    def make_key(self, process):
+        # Hash the process name so any value is a valid cache key.
+        digest = hashlib.md5(process.encode('utf-8')).hexdigest()
+        return self.key_prefix + digest
+
+    def get(self, process, load):
+        """
+        Return the mail template for a process.
+
+        :param process: The process name.
+        :param load: A callable receiving the process name and returning its
+                     mail template (or None), used on cache misses.
+        :return: A copy of the cached mail template, so callers can change
+                 its attributes (for example ``to``) without affecting other
+                 callers, or None.
+        """
+        timeout = app_settings.CACHE_TIMEOUT
+        if not timeout:
+            return load(process)
+        found, mail_template = self._get_local(process)
+        if not found:
+            key = self.make_key(process)
+            value = self.cache.get(key)
+            if value is None:
+                # Wrapped in a tuple so a process without mail template is
+                # distinguished from a cache miss.
+                value = (load(process),)
+                self.cache.set(key, value, timeout)
+            mail_template = self._set_local(process, value[0], timeout)
+        return copy.copy(mail_template)
+
+    def get_many(self, processes, load_many):
+        """
+        Return the mail templates of many processes.
+
+        :param processes: An iterable of process names.
+        :param load_many: A callable receiving a list of process names and
+                          returning a dictionary with their mail templates
+                          (or None), used for the processes not cached.
+        :return: A dictionary mapping each process to a copy of its mail
+                 template, or None.
+        """
+        processes = list(dict.fromkeys(processes))
+        timeout = app_settings.CACHE_TIMEOUT
+        if not timeout:
+            mail_templates = load_many(processes) if processes else {}
+        else:
+            mail_templates = {}
+            missing = []
+            for process in processes:
+                found, mail_template = self._get_local(process)
+                if found:
+                    mail_templates[process] = mail_template
+                else:
+                    missing.append(process)
+            if missing:
+                keys = {self.make_key(process): process
+                        for process in missing}
+                for key, value in self.cache.get_many(list(keys)).items():
+                    mail_templates[keys[key]] = self._set_local(
+                        keys[key], value[0], timeout)
+                missing = [process for process in missing
+                           if process not in mail_templates]
+            if missing:
+                loaded = load_many(missing)
+                self.set_many(loaded)
+                mail_templates.update(loaded)
+        return {process: copy.copy(mail_templates[process])
+                for process in processes}
+
+    async def aget(self, process, load):
+        """
+        Asynchronous version of get(), load must be a coroutine function.
+        """
+        timeout = app_settings.CACHE_TIMEOUT
+        if not timeout:
+            return await load(process)
+        found, mail_template = self._get_local(process)
+        if not found:
+            key = self.make_key(process)
+            value = await self.cache.aget(key)
+            if value is None:
+                value = (await load(process),)
+                await self.cache.aset(key, value, timeout)
+            mail_template = self._set_local(process, value[0], timeout)
+        return copy.copy(mail_template)
+
+    def set_many(self, mail_templates):
+        """
+        Cache the mail templates of many processes at once.
+
+        :param mail_templates: A dictionary mapping process names to their
+                               mail template (or None).
+        """
+        timeout = app_settings.CACHE_TIMEOUT
+        if not timeout:
+            return
+        for process, mail_template in mail_templates.items():
+            self._set_local(process, mail_template, timeout)
+        self.cache.set_many({self.make_key(process): (mail_template,)
+                             for process, mail_template
+                             in mail_templates.items()}, timeout)
+
+    def discard_stale(self, load_revisions, interval=None):
+        """
+        Remove from the level local to the process the mail templates
+        changed by other processes, checking their revisions with a single
+        cache get_many() (see RevisionCache).
+
+        :param load_revisions: A callable receiving a list of mail template
+                               primary keys and returning a dictionary with
+                               their revisions, used when they are not in
+                               the cache.
+        :param interval: When given, nothing is checked if the last check
+                         was less than interval seconds ago.
+        """
+        now = time.monotonic()
+        if interval and now - self._checked < interval:
+            return
+        self._checked = now
+        entries = [(process, mail_template)
+                   for process, (expiry, mail_template)
+                   in list(self._local.items())
+                   if mail_template is not None]
+        stale = {mail_template.pk for mail_template
+                 in mail_template_revisions.stale(
+                     [mail_template for process, mail_template in entries],
+                     load_revisions)}
+        for process, mail_template in entries:
+            if mail_template.pk in stale:
+                self._local.pop(process, None)
+
+    def _get_local(self, process):
+        entry = self._local.get(process)
+        if entry is None or entry[0] < time.monotonic():
+            return False, None
+        return True, entry[1]
+
+    def _set_local(self, process, mail_template, timeout):
+        timeout = min(timeout, app_settings.CACHE_LOCAL_TIMEOUT)
+        self._local[process] = (time.monotonic() + timeout, mail_template)
+        return mail_template
+
+    def invalidate(self, processes):
+        processes = set(processes)
+        for process in processes:
+            self._local.pop(process, None)
+        self.cache.delete_many([self.make_key(p) for p in processes])
+
+    def clear(self):
+        """Empty the level local to the process."""
+        self._local.clear()
+        self._checked = 0
+
+
+class RevisionCache:
+    """
+    Revisions of mail templates published in the Django cache configured by
+    MAIL_TEMPLATE_CACHE_ALIAS.
+
+    MailTemplate.revision is increased on each save and published here by a
+    signal receiver, so a process can check with one cache get_many() if
+    many mail templates it keeps (or anything cached for them, see
+    MailTemplate.get_cache_key()) are still fresh, without loading them.
+    """
+    key_prefix = 'django_mail_template.revision.'
+
+    @property
+    def cache(self):
+        return caches[app_settings.CACHE_ALIAS]
+
+    def make_key(self, pk):
+        return self.key_prefix + str(pk)
+
+    def publish(self, pk, revision):
+        self.cache.set(self.make_key(pk), revision, None)
+
+    def forget(self, pk):
+        self.cache.delete(self.make_key(pk))
+
+    def get_many(self, pks, load=None):
+        """
+        Return a dictionary with the current revision of mail templates.
+
+        :param pks: An iterable of mail template primary keys.
+        :param load: An optional callable receiving a list of primary keys
+                     and returning a dictionary with their revisions, used
+                     (and published) for the ones not in the cache. Deleted
+                     mail templates are not in the result.
+        """
+        keys = {self.make_key(pk): pk for pk in set(pks)}
+        revisions = {keys[key]: revision for key, revision
+                     in self.cache.get_many(list(keys)).items()}
+        missing = [pk for pk in keys.values() if pk not in revisions]
+        if missing and load is not None:
+            loaded = load(missing)
+            self.publish_loaded(loaded)
+            revisions.update(loaded)
+        return revisions
+
+    def publish_loaded(self, revisions):
+        """
+        Publish revisions loaded from the database, given as a dictionary
+        keyed by mail template primary key.
+
+        Revisions already published are kept, as they were published by the
+        save that made them current and a loaded one can be older.
+        """
+        for pk, revision in revisions.items():
+            self.cache.add(self.make_key(pk), revision, None)
+
+    def stale(self, mail_templates, load=None):
+        """
+        Return the list of mail templates whose revision is not the current
+        one, including deleted ones.
+        """
+        revisions = self.get_many(
+            [mail_template.pk for mail_template in mail_templates], load)
+        return [mail_template for mail_template in mail_templates
+                if revisions.get(mail_template.pk) != mail_template.revision]
+
+
+mail_template_revisions = RevisionCache()
+mail_template_lookup_cache = MailTemplateLookupCache()
+
+# Value of the context variables not in the context, so a missing variable is
+# not confused with any value.
+_MISSING = ('django_mail_template.missing',)
+
+#: Types of context values compared by the text they render to in RenderCache
+#: keys, any other value is compared by identity.
+_VALUE_TYPES = (str, int, float, bool, type(None), Decimal, datetime.date,
+                datetime.time, datetime.timedelta)
+
+
+class RenderCache:
+    """
+    LRU cache of texts rendered by compiled templates.
+
+    Entries are keyed by the compiled template (see tools.compile_template(),
+    which returns the same instance for the same text, and another one when
+    the text is edited) and by the values of the context variables the text
+    uses, so other context variables do not matter. Strings, numbers, dates
+    and None are part of the key by their type and the text they render to,
+    as equal values can be rendered differently (``Decimal('1.0')`` and
+    ``Decimal('1.00')``, ``0.0`` and ``-0.0``, the same time in two time
+    zones). Lazy translations are part of the key by their text, and the
+    active language and time zone are part of every key, as Django templates
+    translate, localize and convert aware datetimes with them. Compiled
+    templates whose ``cacheable`` attribute is False (Django templates using
+    ``{% now %}``) are always rendered. Any other value (model instances,
+    lists, dictionaries...) is part of the key by identity, as objects equal
+    by value (for example model instances with the same primary key) can be
+    rendered differently. Cached entries keep a reference to those values,
+    so their identity is not reused while they are cached.
+
+    Context values must not change between renders: a mutated object would
+    return the text rendered with its previous value.
+
+    The cache holds at most maxsize texts of max_bytes UTF-8 bytes in total,
+    the least recently used ones are evicted first. Texts larger than
+    max_bytes are not cached.
+    """
+
+    def __init__(self, maxsize=None, max_bytes=None):
+        self._maxsize = maxsize
+        self._max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def maxsize(self):
+        if self._maxsize is None:
+            return app_settings.RENDER_CACHE_SIZE
+        return self._maxsize
+
+    @property
+    def max_bytes(self):
+        if self._max_bytes is None:
+            return app_settings.RENDER_CACHE_MAX_BYTES
+        return self._max_bytes
+
+    def make_key(self, compiled, context):
+        """
+        Return a tuple with the cache key and the values kept by reference
+        in it.
+        """
+        # Types are part of the key as 1 and True (or a string and a safe
+        # string) can render the same text but not with a format spec or a
+        # filter. The time zone is part of the key of dates and times, as
+        # format specs such as %Z depend on it and not only on the offset.
+        values = []
+        references = []
+        for name in sorted(compiled.field_names):
+            value = context.get(name, _MISSING)
+            if value is _MISSING:
+                values.append(value)
+            elif isinstance(value, _VALUE_TYPES):
+                values.append((type(value), format(value, ''),
+                               getattr(value, 'tzinfo', None)))
+            elif isinstance(value, Promise):
+                values.append((type(value), str(value)))
+            else:
+                values.append((type(value), id(value)))
+                references.append(value)
+        return (compiled, get_language(), get_current_timezone_name(),
+                tuple(values)), references
+
+    def render(self, compiled, context):
+        """
+        Return compiled.render(context), from the cache when the same text
+        was rendered with the same values.
+        """
+        if not compiled.cacheable:
+            return compiled.render(context)
+        key, references = self.make_key(compiled, context)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+        text = compiled.render(context)
+        size = len(text.encode('utf-8'))
+        if size > self.max_bytes:
+            return text
+        with self._lock:
+            if key not in self._entries:
+                self._entries[key] = (text, size, references)
+                self.bytes += size
+            while len(self._entries) > self.maxsize or \
+                    self.bytes > self.max_bytes:
+                _, (_, evicted, _) = self._entries.popitem(last=False)
+                self.bytes -= evicted
+        return text
+
+    def stats(self):
+        """
+        Return a dictionary with the amount of ``hits``, ``misses``, cached
+        ``entries`` and their ``bytes``.
+        """
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses,
+                    'entries': len(self._entries), 'bytes': self.bytes}
+
+    def clear(self):
+        """Remove every entry and reset the counters."""
+        with self._lock:
+            self._entries.clear()
+            self.bytes = self.hits = self.misses = 0
+
+
+render_cache = RenderCache()
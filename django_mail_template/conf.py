@@ -0,0 +1,81 @@
+# -*- coding: UTF-8 -*-
+from django.conf import settings
+
+
+class AppSettings:
+    """
+    Access to django_mail_template settings.
+
+    Every setting is read from the Django settings module with the
+    ``MAIL_TEMPLATE_`` prefix, so ``app_settings.BATCH_SIZE`` is looked up as
+    ``settings.MAIL_TEMPLATE_BATCH_SIZE``. Values are read on each access so
+    ``override_settings`` works as expected.
+    """
+    prefix = 'MAIL_TEMPLATE_'
+    defaults = {
+        # Number of messages handed to the backend on each send_messages()
+        # call by the bulk send methods.
+        'BATCH_SIZE': 100,
+        # Amount of batches sent at the same time by MailTemplate.asend_many().
+        'ASYNC_CONCURRENCY': 4,
+        # Workers used by MailTemplate.send_parallel().
+        'PARALLEL_WORKERS': 4,
+        # Mail queue: times a queued mail is tried before it is marked as
+        # failed, seconds before the first retry (doubled on each retry) and
+        # seconds a worker can hold a claimed mail before another worker
+        # claims it again.
+        'QUEUE_MAX_ATTEMPTS': 5,
+        'QUEUE_RETRY_DELAY': 60,
+        'QUEUE_CLAIM_TIMEOUT': 600,
+        # Connect django_mail_template.metrics receivers to collect in process
+        # rendering and sending metrics.
+        'METRICS': False,
+        # Cache used to share the process to mail template mapping between
+        # processes, seconds the mapping is cached (0 disables it) and
+        # seconds it is kept in the level local to each process, which is not
+        # invalidated by saves made in other processes.
+        'CACHE_ALIAS': 'default',
+        'CACHE_TIMEOUT': 300,
+        'CACHE_LOCAL_TIMEOUT': 30,
+        # Seconds between checks of the revisions of the mail templates
+        # cached in each process, to discard the ones saved by other
+        # processes before they expire (0 disables the checks).
+        'REVISION_CHECK_INTERVAL': 5,
+        # Cache rendered subjects and bodies (see cache.RenderCache) so mails
+        # rendered with the same context variables are rendered once, and
+        # the limits of that cache: amount of texts and bytes.
+        'RENDER_CACHE': False,
+        'RENDER_CACHE_SIZE': 1000,
+        'RENDER_CACHE_MAX_BYTES': 10 * 1024 * 1024,
+        # Messages per second allowed for each sender address or domain, and
+        # cache shared between processes to apply them (see throttle
+        # module). None applies them in each process.
+        'RATE_LIMITS': {},
+        'RATE_LIMIT_CACHE': None,
+        # Load every mail template into the caches when the first request is
+        # started (see warmup module).
+        'WARM_UP': False,
+        # Selections of more mail templates than this are queued by the
+        # admin test action instead of being sent in the request. None sends
+        # them always.
+        'ADMIN_QUEUE_THRESHOLD': None,
+        # Keep a SentMail for each mail sent (see sent_log module), written in
+        # bulk when this amount of rows is waiting or after this amount of
+        # seconds since the last write, and days they are kept by the
+        # mail_template_prune_sent command.
+        'SENT_LOG': False,
+        'SENT_LOG_BUFFER_SIZE': 500,
+        'SENT_LOG_FLUSH_INTERVAL': 10,
+        'SENT_LOG_RETENTION_DAYS': 90,
+        # Store an optimized version of each body when it is saved (see
+        # optimize module) and send it instead of the body.
+        'OPTIMIZE_BODY': False,
+    }
+
+    def __getattr__(self, name):
+        if name not in self.defaults:
+            raise AttributeError(name)
+        return getattr(settings, self.prefix + name, self.defaults[name])
+
+
+app_settings = AppSettings()
@@ -0,0 +1,178 @@
+# -*- coding: UTF-8 -*-
+from datetime import timedelta
+
+from django.core.mail import get_connection
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from django_mail_template.conf import app_settings
+from django_mail_template.models import MailTemplate, QueuedMail
+
+# Fields of a QueuedMail changed by send_queued_mails().
+_RESULT_FIELDS = ['status', 'attempts', 'next_attempt', 'last_error', 'sent']
+
+
+def claim_queued_mails(batch_size, max_attempts=None):
+    """
+    Claim up to batch_size queued mails ready to be sent.
+
+    Rows are locked with select_for_update(skip_locked=True) while they are
+    marked as sending, so several workers can claim mails at the same time
+    without claiming the same ones. Mails claimed by a worker that did not
+    finish in MAIL_TEMPLATE_QUEUE_CLAIM_TIMEOUT seconds can be claimed again.
+
+    Each claim counts as an attempt, so a mail whose worker never finishes
+    (for example because the mail makes it crash) is marked as failed
+    instead of being claimed again after max_attempts claims.
+
+    :return: A list of QueuedMail instances, with their mail templates.
+    """
+    if max_attempts is None:
+        max_attempts = app_settings.QUEUE_MAX_ATTEMPTS
+    now = timezone.now()
+    next_attempt = now + timedelta(seconds=app_settings.QUEUE_CLAIM_TIMEOUT)
+    with transaction.atomic():
+        queued_mails = list(
+            QueuedMail.objects.select_for_update(skip_locked=True)
+            .filter(status__in=[QueuedMail.PENDING, QueuedMail.SENDING],
+                    next_attempt__lte=now)
+            .order_by('next_attempt')[:batch_size])
+        lost = [queued_mail.pk for queued_mail in queued_mails
+                if queued_mail.status == QueuedMail.SENDING and
+                queued_mail.attempts >= max_attempts]
+        if lost:
+            QueuedMail.objects.filter(pk__in=lost).update(
+                status=QueuedMail.FAILED,
+                last_error='The worker sending the mail did not finish.')
+            queued_mails = [queued_mail for queued_mail in queued_mails
+                            if queued_mail.pk not in lost]
+        QueuedMail.objects.filter(
+            pk__in=[queued_mail.pk for queued_mail in queued_mails]
+        ).update(status=QueuedMail.SENDING, next_attempt=next_attempt,
+                 attempts=F('attempts') + 1)
+    for queued_mail in queued_mails:
+        queued_mail.status = QueuedMail.SENDING
+        queued_mail.next_attempt = next_attempt
+        queued_mail.attempts += 1
+    # Mail templates are loaded out of the locking query, joining them would
+    # lock their rows too and workers would skip each other's mails.
+    mail_templates = MailTemplate.objects.in_bulk(
+        {queued_mail.mail_template_id for queued_mail in queued_mails})
+    for queued_mail in queued_mails:
+        queued_mail.mail_template = mail_templates[
+            queued_mail.mail_template_id]
+    return queued_mails
+
+
+def send_queued_mails(queued_mails, connection=None, max_attempts=None):
+    """
+    Send claimed queued mails through a single backend connection.
+
+    Sent mails are marked as sent. Mails that could not be sent are retried
+    with an exponential backoff starting at MAIL_TEMPLATE_QUEUE_RETRY_DELAY
+    seconds, until they are tried max_attempts times and are marked as
+    failed. Mails that can not be rendered are marked as failed at once.
+
+    The result of each mail is saved as soon as it is sent, so the mails of
+    a worker that stops in the middle of a batch are not sent again. While
+    sending, the claim of the mails not sent yet is extended when less than
+    half of MAIL_TEMPLATE_QUEUE_CLAIM_TIMEOUT is left, so a batch slowed
+    down (for example by rate limits) is not claimed by other workers.
+
+    :return: A tuple (sent, failed) with the amount of mails sent and not.
+    """
+    if max_attempts is None:
+        max_attempts = app_settings.QUEUE_MAX_ATTEMPTS
+    if connection is None:
+        connection = get_connection()
+    now = timezone.now()
+    sent = 0
+    failed = 0
+    try:
+        new_connection = connection.open()
+    except Exception as e:
+        # Relay not available, every mail is retried later.
+        for queued_mail in queued_mails:
+            _set_failed(queued_mail, e, max_attempts, now)
+        QueuedMail.objects.bulk_update(queued_mails, _RESULT_FIELDS)
+        return 0, len(queued_mails)
+    try:
+        for index, queued_mail in enumerate(queued_mails):
+            _extend_claim(queued_mails[index:])
+            if _send_queued_mail(queued_mail, connection, max_attempts,
+                                 now):
+                sent += 1
+            else:
+                failed += 1
+            queued_mail.save(update_fields=_RESULT_FIELDS)
+    finally:
+        if new_connection:
+            connection.close()
+    return sent, failed
+
+
+def _extend_claim(queued_mails):
+    # Claims are extended for the mails not sent yet when less than half of
+    # the timeout is left.
+    now = timezone.now()
+    timeout = timedelta(seconds=app_settings.QUEUE_CLAIM_TIMEOUT)
+    if queued_mails[0].next_attempt - now > timeout / 2:
+        return
+    next_attempt = now + timeout
+    QueuedMail.objects.filter(
+        pk__in=[queued_mail.pk for queued_mail in queued_mails],
+        status=QueuedMail.SENDING).update(next_attempt=next_attempt)
+    for queued_mail in queued_mails:
+        queued_mail.next_attempt = next_attempt
+
+
+def _send_queued_mail(queued_mail, connection, max_attempts, now):
+    try:
+        message = queued_mail.mail_template.build_message(queued_mail.context)
+        if not message.recipients():
+            raise ValueError('The mail has no recipients.')
+    except Exception as e:
+        # Retrying would give the same error.
+        _set_failed(queued_mail, e, max_attempts, now, retry=False)
+        return False
+    try:
+        # One message at a time to know which ones fail, the connection is
+        # kept open between them.
+        if not queued_mail.mail_template.send_messages(connection,
+                                                       [message]):
+            raise RuntimeError('The mail was not sent.')
+    except Exception as e:
+        _set_failed(queued_mail, e, max_attempts, now)
+        return False
+    queued_mail.status = QueuedMail.SENT
+    queued_mail.sent = timezone.now()
+    return True
+
+
+def _set_failed(queued_mail, error, max_attempts, now, retry=True):
+    # The attempt was counted when the mail was claimed.
+    queued_mail.last_error = '{} ({})'.format(error, type(error).__name__)
+    if not retry or queued_mail.attempts >= max_attempts:
+        queued_mail.status = QueuedMail.FAILED
+    else:
+        queued_mail.status = QueuedMail.PENDING
+        delay = app_settings.QUEUE_RETRY_DELAY * \
+            2 ** (queued_mail.attempts - 1)
+        queued_mail.next_attempt = now + timedelta(seconds=delay)
+
+
+def process_queue(batch_size=None, connection=None, max_attempts=None):
+    """
+    Claim and send one batch of queued mails.
+
+    :return: A tuple (sent, failed) with the amount of mails sent and not, no
+             mails were ready to be sent when both are 0.
+    """
+    if batch_size is None:
+        batch_size = app_settings.BATCH_SIZE
+    queued_mails = claim_queued_mails(batch_size, max_attempts)
+    if not queued_mails:
+        return 0, 0
+    return send_queued_mails(queued_mails, connection=connection,
+                             max_attempts=max_attempts)
@@ -0,0 +1,80 @@
+# -*- coding: UTF-8 -*-
+import json
+import sys
+
+from django.core.management.base import BaseCommand, CommandError
+
+from django_mail_template.models import MailTemplate, Configuration
+
+
+class Command(BaseCommand):
+    help = ('Render a mail template for a list of contexts without sending '
+            'anything, and report the contexts with missing context '
+            'variables or rendering errors.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'process', nargs='?',
+            help='Process whose mail template is checked.')
+        parser.add_argument(
+            '--id', type=int,
+            help='Id of the mail template checked, instead of a process.')
+        parser.add_argument(
+            '--contexts',
+            help='JSON file with a list of contexts, or with a context in '
+                 'each line. "-" reads it from the standard input. Without '
+                 'it an empty context is checked.')
+        parser.add_argument(
+            '--strict', action='store_true',
+            help='Fail when context variables are missing too.')
+
+    def handle(self, *args, **options):
+        mail_template = self.get_mail_template(options)
+        contexts = self.read_contexts(options['contexts'])
+        results = mail_template.render_many(contexts)
+        missing = errors = 0
+        for index, result in enumerate(results, 1):
+            if result['error'] is not None:
+                errors += 1
+                self.stdout.write('Context {}: {}'.format(
+                    index, result['error']))
+            elif result['missing']:
+                missing += 1
+                self.stdout.write('Context {}: missing {}'.format(
+                    index, ', '.join(result['missing'])))
+        self.stdout.write(
+            'Checked: {}, with missing variables: {}, with errors: {}.'
+            .format(len(results), missing, errors))
+        if errors or (options['strict'] and missing):
+            raise CommandError('Some contexts can not be rendered.')
+
+    def get_mail_template(self, options):
+        if options['id'] is not None:
+            try:
+                return MailTemplate.objects.get(pk=options['id'])
+            except MailTemplate.DoesNotExist:
+                raise CommandError('Mail template {} does not exist.'.format(
+                    options['id']))
+        if not options['process']:
+            raise CommandError('A process or a mail template id is required.')
+        mail_template = Configuration.get_mail_template(options['process'])
+        if mail_template is None:
+            raise CommandError('Process {} has no mail template.'.format(
+                options['process']))
+        return mail_template
+
+    def read_contexts(self, path):
+        if path is None:
+            return [{}]
+        if path == '-':
+            content = sys.stdin.read()
+        else:
+            with open(path, encoding='utf-8') as f:
+                content = f.read()
+        try:
+            if content.lstrip().startswith('['):
+                return json.loads(content)
+            return [json.loads(line) for line in content.splitlines()
+                    if line.strip()]
+        except ValueError as e:
+            raise CommandError('Invalid contexts file: {}'.format(e))
@@ -0,0 +1,33 @@
+# -*- coding: UTF-8 -*-
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from django_mail_template.conf import app_settings
+from django_mail_template.models import SentMail
+
+
+class Command(BaseCommand):
+    help = ('Delete the sent mails logged before a number of days ago, in '
+            'batches so the table is not locked for long.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=app_settings.SENT_LOG_RETENTION_DAYS,
+            help='Days the sent mails are kept.')
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Amount of sent mails deleted by each query.')
+
+    def handle(self, *args, **options):
+        before = timezone.now() - timedelta(days=options['days'])
+        deleted = 0
+        while True:
+            pks = list(SentMail.objects.filter(created__lt=before)
+                       .order_by('created')
+                       .values_list('pk', flat=True)[:options['batch_size']])
+            if not pks:
+                break
+            deleted += SentMail.objects.filter(pk__in=pks).delete()[0]
+        self.stdout.write('Deleted: {}.'.format(deleted))
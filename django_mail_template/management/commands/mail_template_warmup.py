@@ -0,0 +1,21 @@
+# -*- coding: UTF-8 -*-
+from django.core.management.base import BaseCommand
+
+from django_mail_template.warmup import warm_up
+
+
+class Command(BaseCommand):
+    help = ('Load every process to mail template mapping into the cache. '
+            'Only the cache shared between processes '
+            '(MAIL_TEMPLATE_CACHE_ALIAS) outlives the command, set '
+            'MAIL_TEMPLATE_WARM_UP to warm up each process when it starts.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'processes', nargs='*',
+            help='Processes to warm up, all of them by default.')
+
+    def handle(self, *args, **options):
+        processes, mail_templates = warm_up(options['processes'] or None)
+        self.stdout.write('Warmed up {} processes and {} mail templates.'
+                          .format(processes, mail_templates))
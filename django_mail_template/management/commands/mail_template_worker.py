@@ -0,0 +1,43 @@
+# -*- coding: UTF-8 -*-
+import time
+
+from django.core.management.base import BaseCommand
+
+from django_mail_template import sent_log
+from django_mail_template.conf import app_settings
+from django_mail_template.mail_queue import process_queue
+
+
+class Command(BaseCommand):
+    help = ('Send the mails queued with MailTemplate.enqueue(). Several '
+            'workers can be run at the same time.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=app_settings.BATCH_SIZE,
+            help='Amount of queued mails claimed and sent at a time.')
+        parser.add_argument(
+            '--max-attempts', type=int,
+            default=app_settings.QUEUE_MAX_ATTEMPTS,
+            help='Times a mail is tried before it is marked as failed.')
+        parser.add_argument(
+            '--sleep', type=float, default=5,
+            help='Seconds to wait when there are no mails to send.')
+        parser.add_argument(
+            '--once', action='store_true',
+            help='Exit when there are no mails ready to be sent.')
+
+    def handle(self, *args, **options):
+        while True:
+            sent, failed = process_queue(
+                batch_size=options['batch_size'],
+                max_attempts=options['max_attempts'])
+            if app_settings.SENT_LOG:
+                sent_log.flush()
+            if sent or failed:
+                self.stdout.write(
+                    'Sent: {}, failed: {}.'.format(sent, failed))
+            elif options['once']:
+                break
+            else:
+                time.sleep(options['sleep'])
@@ -0,0 +1,165 @@
+# -*- coding: UTF-8 -*-
+"""
+In process metrics for rendering and sending mails.
+
+When MAIL_TEMPLATE_METRICS setting is True the receivers in this module are
+connected to post_render and post_send signals and fill the metrics of
+``registry``. registry.render() returns them in Prometheus text format, to be
+exposed by a view or pushed by a collector.
+"""
+import threading
+from bisect import bisect_left
+
+from django_mail_template.signals import post_render, post_send
+
+#: Default histogram buckets, in seconds.
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5,
+                   5, 10)
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def _format_labels(self, key, extra=()):
+        pairs = list(zip(self.labelnames, key)) + list(extra)
+        if not pairs:
+            return ''
+        return '{' + ','.join('{}="{}"'.format(name, value.replace('"', '\\"'))
+                              for name, value in pairs) + '}'
+
+    def samples(self):
+        raise NotImplementedError
+
+    def render(self):
+        lines = ['# HELP {} {}'.format(self.name, self.documentation),
+                 '# TYPE {} {}'.format(self.name, self.type)]
+        for name, labels, value in self.samples():
+            lines.append('{}{} {}'.format(name, labels, value))
+        return '\n'.join(lines)
+
+
+class Counter(Metric):
+    type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def samples(self):
+        with self._lock:
+            items = sorted(self._values.items())
+        return [(self.name, self._format_labels(key), value)
+                for key, value in items]
+
+
+class Histogram(Metric):
+    type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(),
+                 buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(
+                key, ([0] * (len(self.buckets) + 1), 0))
+            counts[bisect_left(self.buckets, value)] += 1
+            self._values[key] = (counts, total + value)
+
+    def get(self, **labels):
+        """Return a tuple (count, sum) of the observations."""
+        counts, total = self._values.get(self._key(labels), ((), 0))
+        return sum(counts), total
+
+    def samples(self):
+        samples = []
+        with self._lock:
+            items = sorted((key, (list(counts), total))
+                           for key, (counts, total) in self._values.items())
+        for key, (counts, total) in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), counts):
+                cumulative += count
+                samples.append((self.name + '_bucket',
+                                self._format_labels(key, [('le', str(bound))]),
+                                cumulative))
+            samples.append((self.name + '_count', self._format_labels(key),
+                            cumulative))
+            samples.append((self.name + '_sum', self._format_labels(key),
+                            total))
+        return samples
+
+
+class Registry:
+
+    def __init__(self):
+        self.metrics = {}
+
+    def register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def render(self):
+        """Return every metric in Prometheus text exposition format."""
+        return '\n'.join(metric.render()
+                         for metric in self.metrics.values()) + '\n'
+
+
+registry = Registry()
+render_seconds = registry.register(Histogram(
+    'mail_template_render_seconds',
+    'Seconds spent rendering a mail template and validating its addresses.',
+    ['mail_template']))
+send_seconds = registry.register(Histogram(
+    'mail_template_send_seconds',
+    'Seconds spent sending a batch of mails (MIME and transport).',
+    ['mail_template']))
+message_bytes = registry.register(Histogram(
+    'mail_template_message_bytes',
+    'Size of subject, body and alternatives of rendered mails.',
+    ['mail_template'],
+    buckets=(1000, 5000, 10000, 50000, 100000, 500000, 1000000)))
+sent_total = registry.register(Counter(
+    'mail_template_sent_total', 'Mails sent.', ['mail_template']))
+failed_total = registry.register(Counter(
+    'mail_template_failed_total', 'Mails that could not be sent.',
+    ['mail_template']))
+
+
+def record_render(sender, mail_template, size, durations, **kwargs):
+    render_seconds.observe(sum(durations.values()),
+                           mail_template=mail_template.pk)
+    message_bytes.observe(size, mail_template=mail_template.pk)
+
+
+def record_send(sender, mail_template, messages, sent, durations, **kwargs):
+    send_seconds.observe(durations['transport'],
+                         mail_template=mail_template.pk)
+    sent_total.inc(sent, mail_template=mail_template.pk)
+    failed_total.inc(len(messages) - sent, mail_template=mail_template.pk)
+
+
+def connect():
+    post_render.connect(record_render, dispatch_uid='mail_template_metrics')
+    post_send.connect(record_send, dispatch_uid='mail_template_metrics')
+
+
+def disconnect():
+    post_render.disconnect(dispatch_uid='mail_template_metrics')
+    post_send.disconnect(dispatch_uid='mail_template_metrics')
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:22
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_mail_template', '0006_alter_configuration_id_alter_mailtemplate_id'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QueuedMail',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('context', models.JSONField(blank=True, help_text='Context variables used to send the mail.', null=True, verbose_name='Context')),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('sending', 'Sending'), ('sent', 'Sent'), ('failed', 'Failed')], default='pending', max_length=10, verbose_name='Status')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='Attempts')),
+                ('next_attempt', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Next attempt')),
+                ('last_error', models.TextField(blank=True, default='', verbose_name='Last error')),
+                ('created', models.DateTimeField(auto_now_add=True, verbose_name='Created')),
+                ('sent', models.DateTimeField(blank=True, null=True, verbose_name='Sent')),
+                ('mail_template', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='queued_mails', to='django_mail_template.mailtemplate', verbose_name='Mail template')),
+            ],
+            options={
+                'verbose_name': 'Queued mail',
+                'verbose_name_plural': 'Queued mails',
+                'indexes': [models.Index(fields=['status', 'next_attempt'], name='django_mail_status_8a9f61_idx')],
+            },
+        ),
+    ]
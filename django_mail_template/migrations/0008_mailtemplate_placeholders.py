@@ -0,0 +1,100 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:36
+
+from html import unescape
+from html.parser import HTMLParser
+from string import Formatter
+
+from django.db import migrations, models
+
+# The parsing is copied here, as it was when this migration was written, so
+# later changes of django_mail_template.tools do not change it.
+
+
+class TextParser(HTMLParser):
+    # Text of an HTML body, enough to find its context variables.
+    skip_tags = {'head', 'script', 'style', 'title'}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=False)
+        self.parts = []
+        self.skip = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.skip_tags:
+            self.skip += 1
+        elif tag == 'img':
+            self.handle_data(dict(attrs).get('alt') or '')
+        elif tag == 'a':
+            self.handle_data(dict(attrs).get('href') or '')
+
+    def handle_endtag(self, tag):
+        if tag in self.skip_tags:
+            self.skip = max(self.skip - 1, 0)
+
+    def handle_data(self, data):
+        if not self.skip:
+            self.parts.append(data)
+
+    def handle_entityref(self, name):
+        self.handle_reference('&{};'.format(name))
+
+    def handle_charref(self, name):
+        self.handle_reference('&#{};'.format(name))
+
+    def handle_reference(self, reference):
+        # Braces written as references are literal braces.
+        text = unescape(reference)
+        self.handle_data(text.replace('{', '{{').replace('}', '}}'))
+
+
+def html_to_text(html):
+    parser = TextParser()
+    parser.feed(html)
+    parser.close()
+    return ' '.join(parser.parts)
+
+
+def field_names(text):
+    names = set()
+    for _, field_name, _, _ in Formatter().parse(text):
+        if field_name is None:
+            continue
+        first = field_name.partition('.')[0].partition('[')[0]
+        if first.isidentifier():
+            names.add(first)
+    return names
+
+
+def fill_placeholders(apps, schema_editor):
+    MailTemplate = apps.get_model('django_mail_template', 'MailTemplate')
+    mail_templates = list(MailTemplate.objects.all())
+    for mail_template in mail_templates:
+        names = set()
+        body = mail_template.body or ''
+        for text in (mail_template.subject or '', body, html_to_text(body)):
+            try:
+                names.update(field_names(text))
+            except ValueError:
+                pass
+        mail_template.placeholders = \
+            ',' + ''.join(name + ',' for name in sorted(names))
+    MailTemplate.objects.bulk_update(mail_templates, ['placeholders'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_mail_template', '0007_queuedmail'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mailtemplate',
+            name='placeholders',
+            field=models.TextField(
+                blank=True, editable=False,
+                help_text='Context variables used by subject and body.',
+                null=True, verbose_name='Placeholders'),
+        ),
+        migrations.RunPython(fill_placeholders, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:39
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def check_duplicated_processes(apps, schema_editor):
+    Configuration = apps.get_model('django_mail_template', 'Configuration')
+    duplicated = list(
+        Configuration.objects.values('process')
+        .annotate(count=Count('id')).filter(count__gt=1)
+        .values_list('process', flat=True))
+    if duplicated:
+        raise RuntimeError(
+            'Processes must be unique, remove or rename the duplicated '
+            'configurations of: {}.'.format(', '.join(duplicated)))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_mail_template', '0008_mailtemplate_placeholders'),
+    ]
+
+    operations = [
+        migrations.RunPython(check_duplicated_processes,
+                             migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='configuration',
+            name='process',
+            field=models.CharField(
+                help_text='A name to identify the process.', max_length=200,
+                unique=True, verbose_name='Process'),
+        ),
+    ]
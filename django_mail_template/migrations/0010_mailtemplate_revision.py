@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_mail_template', '0009_configuration_process_unique'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mailtemplate',
+            name='revision',
+            field=models.PositiveIntegerField(
+                default=0, editable=False,
+                help_text='Increased each time the mail template is saved.',
+                verbose_name='Revision'),
+        ),
+    ]
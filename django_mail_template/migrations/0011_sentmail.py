@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:42
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_mail_template', '0010_mailtemplate_revision'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SentMail',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('recipients', models.TextField(blank=True, default='', help_text='To, Cc and Bcc addresses separated with coma.', verbose_name='Recipients')),
+                ('subject', models.CharField(blank=True, default='', max_length=255, verbose_name='Subject')),
+                ('status', models.CharField(choices=[('sent', 'Sent'), ('failed', 'Failed')], max_length=10, verbose_name='Status')),
+                ('message_id', models.CharField(blank=True, default='', max_length=255, verbose_name='Message-ID')),
+                ('error', models.TextField(blank=True, default='', verbose_name='Error')),
+                ('duration', models.FloatField(blank=True, help_text='Seconds spent sending the mail.', null=True, verbose_name='Duration')),
+                ('created', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Created')),
+                ('mail_template', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='sent_mails', to='django_mail_template.mailtemplate', verbose_name='Mail template')),
+            ],
+            options={
+                'verbose_name': 'Sent mail',
+                'verbose_name_plural': 'Sent mails',
+                'indexes': [models.Index(fields=['mail_template', 'created'], name='django_mail_mail_te_173851_idx'), models.Index(fields=['created'], name='django_mail_created_5eaa07_idx')],
+            },
+        ),
+    ]
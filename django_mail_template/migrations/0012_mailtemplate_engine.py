@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_mail_template', '0011_sentmail'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mailtemplate',
+            name='engine',
+            field=models.CharField(
+                choices=[('format', 'Format ({name} context variables)'),
+                         ('django', 'Django template language')],
+                default='format',
+                help_text='How context variables are replaced. Django '
+                          'templates can use loops, conditions and filters, '
+                          'and values are escaped in the body.',
+                max_length=10, verbose_name='Engine'),
+        ),
+    ]
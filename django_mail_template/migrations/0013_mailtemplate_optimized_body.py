@@ -0,0 +1,30 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('django_mail_template', '0012_mailtemplate_engine'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='mailtemplate',
+            name='body_bytes_saved',
+            field=models.IntegerField(
+                blank=True, editable=False,
+                help_text='Bytes saved in each mail by the optimized body.',
+                null=True, verbose_name='Bytes saved'),
+        ),
+        migrations.AddField(
+            model_name='mailtemplate',
+            name='optimized_body',
+            field=models.TextField(
+                blank=True, editable=False,
+                help_text='The body with CSS inlined, minified and without '
+                          'editor markup, as it is sent.',
+                null=True, verbose_name='Optimized body'),
+        ),
+    ]
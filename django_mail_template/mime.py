@@ -0,0 +1,110 @@
+# -*- coding: UTF-8 -*-
+"""
+MIME serialization reusing the static parts of the mails of a template.
+
+Mails of a mail template share most of their headers: From, Cc, Reply-To,
+MIME-Version and the Content-Type and Content-Transfer-Encoding of their
+parts. The email package folds and encodes every header of every message on
+serialization, and scans the whole text of each message to choose a MIME
+boundary. TemplateEmailMessage serializes with a policy folding static
+headers only once, and with a boundary chosen once for each template, so only
+the headers and parts that change between recipients are encoded for each
+mail. The bytes produced are the same the email package would produce with
+that boundary.
+"""
+import random
+import sys
+from functools import lru_cache
+from email.policy import Compat32, compat32
+
+from django.core.mail import EmailMultiAlternatives
+
+#: Headers whose folded value is cached, any other one (To, Subject, Date,
+#: Message-ID...) is folded for each message.
+STATIC_HEADERS = {'content-type', 'content-transfer-encoding', 'mime-version',
+                  'from', 'cc', 'reply-to'}
+
+
+@lru_cache(maxsize=1024)
+def _fold_binary(linesep, max_line_length, cte_type, name, value):
+    # The generator clones the policy with the line separator it serializes
+    # with (SMTP backends use \r\n), so the folding settings are part of the
+    # key.
+    policy = compat32.clone(linesep=linesep, max_line_length=max_line_length,
+                            cte_type=cte_type)
+    return policy.fold_binary(name, value)
+
+
+class StaticHeadersPolicy(Compat32):
+    """Compat32 policy folding static header values once."""
+
+    def fold_binary(self, name, value):
+        if isinstance(value, str) and name.lower() in STATIC_HEADERS:
+            return _fold_binary(self.linesep, self.max_line_length,
+                                self.cte_type, name, value)
+        return super().fold_binary(name, value)
+
+
+static_headers_policy = StaticHeadersPolicy()
+
+
+def make_boundary():
+    # Same format email.generator.Generator uses.
+    token = random.randrange(sys.maxsize)
+    return '=' * 15 + ('%019d' % token) + '=='
+
+
+class MessageSkeleton:
+    """
+    Static serialization state shared by the mails of a mail template.
+    """
+
+    def __init__(self):
+        self.boundary = make_boundary()
+
+    def prepare(self, msg):
+        """
+        Prepare a MIME message built by TemplateEmailMessage.message() to be
+        serialized reusing this skeleton.
+        """
+        msg.policy = static_headers_policy
+        if msg.is_multipart():
+            payloads = [part.get_payload() for part in msg.walk()
+                        if not part.is_multipart()]
+            if any(self.boundary in payload for payload in payloads
+                   if isinstance(payload, str)):
+                # Almost impossible, but the boundary can not be in the
+                # content. Choose another one for next messages.
+                self.boundary = make_boundary()
+            else:
+                msg.set_boundary(self.boundary)
+        return msg
+
+
+@lru_cache(maxsize=128)
+def get_skeleton(key):
+    """
+    Return the MessageSkeleton for a key identifying the static parts of the
+    mails, for example the mail template and its static headers.
+    """
+    return MessageSkeleton()
+
+
+class TemplateEmailMessage(EmailMultiAlternatives):
+    """
+    An EmailMultiAlternatives serialized reusing a MessageSkeleton.
+    """
+
+    def __init__(self, *args, skeleton=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.skeleton = skeleton
+        #: Message-ID header of the last MIME message built, the one sent
+        #: after the message is handed to the backend.
+        self.message_id = None
+
+    def message(self):
+        msg = super().message()
+        self.message_id = msg['Message-ID']
+        if self.skeleton is not None:
+            self.skeleton.prepare(msg)
+        return msg
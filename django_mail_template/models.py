@@ -1,15 +1,64 @@
 # -*- coding: UTF-8 -*-
-from django.db import models
-from django.core.exceptions import ObjectDoesNotExist
-from django.core.mail import EmailMultiAlternatives
+import asyncio
+from collections.abc import Mapping
+from itertools import islice
+from time import perf_counter
+
+from asgiref.sync import sync_to_async
+from django.db import models, router, transaction
+from django.core.exceptions import ObjectDoesNotExist, ValidationError
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from django.utils.translation import gettext
 from ckeditor.fields import RichTextField
-from django_mail_template.tools import (replace_context_variable,
-                                        clean_address_list)
+from django_mail_template.aio import asend_messages
+from django_mail_template.cache import (mail_template_lookup_cache,
+                                        render_cache)
+from django_mail_template.conf import app_settings
+from django_mail_template.mime import TemplateEmailMessage, get_skeleton
+from django_mail_template.optimize import optimize_html
+from django_mail_template.parallel import send_parallel
+from django_mail_template.signals import (pre_render, post_render, sending,
+                                          message_size)
+from django_mail_template.throttle import athrottled, throttled
+from django_mail_template.tools import (LazyContext,
+                                        compile_django_template,
+                                        compile_template,
+                                        clean_address_list,
+                                        html_to_text,
+                                        resolve_attribute,
+                                        send_messages_in_batches)
+
+
+def format_placeholders(names):
+    """
+    Return the value stored in MailTemplate.placeholders for a set of context
+    variables.
+    """
+    return ',' + ''.join(name + ',' for name in sorted(names))
+
+
+class MailTemplateQuerySet(models.QuerySet):
+
+    def with_placeholders(self, *names):
+        """
+        Filter the mail templates using every given context variable.
+        """
+        queryset = self
+        for name in names:
+            queryset = queryset.filter(placeholders__contains=',{},'.format(
+                name))
+        return queryset
 
 
 class MailTemplate(models.Model):
+    FORMAT = 'format'
+    DJANGO = 'django'
+    ENGINE_CHOICES = (
+        (FORMAT, _('Format ({name} context variables)')),
+        (DJANGO, _('Django template language')),
+    )
+
     #: Title for mail template
     title = models.CharField(
         verbose_name=_('Title'), max_length=100,
@@ -51,6 +100,44 @@ class MailTemplate(models.Model):
     description = models.TextField(
         verbose_name=_('Description'), blank=True, null=True,
         help_text=_('Description of the mail template.'))
+    #: How subject and body are rendered: with str.format_map() or as Django
+    #: templates, see tools.compile_template() and
+    #: tools.compile_django_template().
+    engine = models.CharField(
+        verbose_name=_('Engine'), max_length=10, choices=ENGINE_CHOICES,
+        default=FORMAT,
+        help_text=_('How context variables are replaced. Django templates '
+                    'can use loops, conditions and filters, and values are '
+                    'escaped in the body.'))
+    #: Context variables used by subject and body, updated on save. Stored
+    #: as ",name,other," so a variable is found with a contains lookup, see
+    #: MailTemplateQuerySet.with_placeholders().
+    placeholders = models.TextField(
+        verbose_name=_('Placeholders'), blank=True, null=True,
+        editable=False,
+        help_text=_('Context variables used by subject and body.'))
+
+    #: Increased each time the mail template is saved, to know if cached
+    #: copies or values computed from it are stale.
+    revision = models.PositiveIntegerField(
+        verbose_name=_('Revision'), default=0, editable=False,
+        help_text=_('Increased each time the mail template is saved.'))
+
+    #: Send ready version of the body computed on save when
+    #: MAIL_TEMPLATE_OPTIMIZE_BODY is True, see optimize module.
+    optimized_body = models.TextField(
+        verbose_name=_('Optimized body'), blank=True, null=True,
+        editable=False,
+        help_text=_('The body with CSS inlined, minified and without editor '
+                    'markup, as it is sent.'))
+    #: Difference of size between body and optimized_body, negative when
+    #: inlined CSS takes more bytes than the ones removed.
+    body_bytes_saved = models.IntegerField(
+        verbose_name=_('Bytes saved'), blank=True, null=True,
+        editable=False,
+        help_text=_('Bytes saved in each mail by the optimized body.'))
+
+    objects = MailTemplateQuerySet.as_manager()
 
     class Meta:
         verbose_name = _('Mail Template')
@@ -59,7 +146,133 @@ class MailTemplate(models.Model):
     def __str__(self):
         return self.title
 
+    def save(self, *args, **kwargs):
+        self.placeholders = format_placeholders(self.find_placeholders())
+        self.optimize_body()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None:
+            update_fields = set(update_fields) | {'revision'}
+            if {'subject', 'body', 'engine'}.intersection(update_fields):
+                update_fields.add('placeholders')
+            if {'body', 'engine'}.intersection(update_fields):
+                update_fields.update(['optimized_body', 'body_bytes_saved'])
+            kwargs['update_fields'] = update_fields
+        using = kwargs.get('using') or router.db_for_write(type(self),
+                                                           instance=self)
+        with transaction.atomic(using=using):
+            if self._state.adding:
+                revision = self.revision or 0
+            else:
+                # The row is locked so concurrent saves get different
+                # revisions.
+                revision = MailTemplate.objects.using(using) \
+                    .select_for_update().filter(pk=self.pk) \
+                    .values_list('revision', flat=True).first() or 0
+            self.revision = revision + 1
+            super().save(*args, **kwargs)
+        self.prepare()
+
+    def get_cache_key(self, *parts):
+        """
+        Return a cache key for values computed from this mail template,
+        including its revision so keys of previous revisions are not used
+        once it is saved again.
+        """
+        return ':'.join(['django_mail_template', str(self.pk),
+                         str(self.revision)] + [str(part) for part in parts])
+
+    @staticmethod
+    def get_revisions(pks):
+        """
+        Return a dictionary with the revision of each mail template, loaded
+        with one query.
+        """
+        return dict(MailTemplate.objects.filter(pk__in=pks).values_list(
+            'pk', 'revision'))
+
+    def find_placeholders(self):
+        """
+        Parse subject and body and return the set of context variables they
+        use. Texts that are not valid templates are skipped.
+        """
+        names = set()
+        body = self.body or ''
+        text = html_to_text(body, self.engine)
+        for text in (self.subject or '', body, text):
+            try:
+                names.update(self._compile(text).field_names)
+            except ValueError:
+                pass
+        return names
+
+    def optimize_body(self):
+        """
+        Set optimized_body and body_bytes_saved from the body, or to None when
+        MAIL_TEMPLATE_OPTIMIZE_BODY is False or the body is not valid. Called
+        on save, so mails are sent without processing the body again.
+        """
+        self.optimized_body = self.body_bytes_saved = None
+        if not app_settings.OPTIMIZE_BODY or not self.body:
+            return
+        try:
+            optimized_body = optimize_html(self.body, self.engine)
+        except ValueError:
+            return
+        self.optimized_body = optimized_body
+        self.body_bytes_saved = len(self.body.encode('utf-8')) - \
+            len(optimized_body.encode('utf-8'))
+
+    def get_send_body(self):
+        """
+        Return the body mails are built from: the optimized body stored when
+        the mail template was saved if MAIL_TEMPLATE_OPTIMIZE_BODY is True,
+        or the body.
+        """
+        if app_settings.OPTIMIZE_BODY and self.optimized_body is not None:
+            return self.optimized_body
+        return self.body or ''
+
+    def get_placeholders(self):
+        """
+        Return a frozenset with the context variables used by subject and
+        body, so callers can build only the context variables needed.
+
+        The value stored when the mail template was saved is used, mail
+        templates not saved yet are parsed.
+        """
+        if self.placeholders is None:
+            return frozenset(self.find_placeholders())
+        return frozenset(name for name in self.placeholders.split(',')
+                         if name)
+
+    def prepare(self):
+        """
+        Fill the caches used to build messages: the compiled subject and
+        body, the plain text version of the body and the validated address
+        lists, so first mails do not pay for them. Errors are ignored, they
+        are raised when sending.
+        """
+        body = self.get_send_body()
+        try:
+            self._compile(self.subject)
+            if body:
+                self._compile(body, html=True)
+                self._compile(html_to_text(body, self.engine))
+        except ValueError:
+            pass
+        for addresses in (self.to, self.cc, self.bcc, self.reply_to):
+            try:
+                clean_address_list(addresses)
+            except ValidationError:
+                pass
+
     def clean(self):
+        if self.engine == self.DJANGO:
+            try:
+                self._compile(self.subject or '')
+                self._compile(self.body or '', html=True)
+            except ValueError as e:
+                raise ValidationError(str(e))
         if self.to:
             clean_address_list(self.to, _('To'))
         if self.cc:
@@ -69,6 +282,150 @@ class MailTemplate(models.Model):
         if self.reply_to:
             clean_address_list(self.reply_to, _('Reply to'))
 
+    def build_message(self, context=None, connection=None, to=None):
+        """
+        Build the message to be sent for a context without sending it.
+
+        :param context: A mapping with context variables to be used with
+                        the subject and the message. Callable values are
+                        called only if subject or body use them, once (see
+                        tools.LazyContext). Without it, format variables are
+                        left as they are, and Django templates are rendered
+                        with an empty context.
+        :param connection: An optional email backend the message will use.
+        :param to: An optional recipient address (or list, or comma separated
+                   string of addresses) used instead of the mail template's
+                   to. A mail for a given recipient is not copied to the mail
+                   template's cc and bcc.
+        :return: An EmailMultiAlternatives instance. The static headers and
+                 the MIME boundary of the messages of a mail template are
+                 encoded once and reused when they are serialized.
+        """
+        sender = type(self)
+        pre_render.send(sender=sender, mail_template=self, context=context)
+        start = perf_counter()
+        subject = self.subject
+        body = self.get_send_body()
+        text = html_to_text(body, self.engine)
+        if context is None and self.engine == self.DJANGO:
+            # Template tags are always rendered, only format variables are
+            # left as they are without a context.
+            context = {}
+        if context is None:
+            # Needed whe no context is received so no replacement is tried.
+            pass
+        elif not isinstance(context, Mapping):
+            raise ValueError(_('The argument for send method must be a '
+                               'mapping.'))
+        else:
+            # Callable values are called once, only if they are used.
+            context = LazyContext(context)
+            subject = self._render(self._compile(subject), context)
+            body = self._render(self._compile(body, html=True), context)
+            text = self._render(self._compile(text), context)
+        rendered = perf_counter()
+        if to is None:
+            to = clean_address_list(self.to)
+            cc = clean_address_list(self.cc)
+            bcc = clean_address_list(self.bcc)
+        else:
+            to = clean_address_list(to, _('To'))
+            cc = bcc = []
+        reply_to = clean_address_list(self.reply_to)
+        validated = perf_counter()
+        msg = TemplateEmailMessage(
+            subject=subject,
+            from_email=self.from_email,
+            to=to,
+            cc=cc,
+            bcc=bcc,
+            reply_to=reply_to,
+            connection=connection,
+            skeleton=get_skeleton((sender, self.pk))
+        )
+        msg.body = text
+        msg.attach_alternative(body, 'text/html')
+        if post_render.has_listeners(sender):
+            post_render.send(
+                sender=sender, mail_template=self, context=context,
+                message=msg, size=message_size(msg),
+                durations={'render': rendered - start,
+                           'addresses': validated - rendered})
+        return msg
+
+    def render(self, context=None):
+        """
+        Render the mail template for a context without building a message.
+
+        Nothing is sent and neither MIME nor address lists are processed, so
+        it is a fast way to check contexts before sending them.
+
+        :param context: A dictionary with context variables to be used with
+                        the subject and the message.
+        :return: A dictionary with the rendered ``subject``, ``body`` and
+                 ``text`` (plain text version of the body), and ``missing``,
+                 a sorted list of the context variables used by the mail
+                 template which are not in the context and are left as they
+                 are (with the Django engine, rendered as string_if_invalid).
+        :raise ValueError: When subject or body are not valid templates, or
+                           the context is not a mapping. Other errors, like
+                           a missing attribute of a context variable, are
+                           raised as they are.
+        """
+        if context is not None and not isinstance(context, Mapping):
+            raise ValueError(_('The argument for send method must be a '
+                               'mapping.'))
+        body = self.get_send_body()
+        compiled = [self._compile(self.subject),
+                    self._compile(body, html=True),
+                    self._compile(html_to_text(body, self.engine))]
+        names = set()
+        for template in compiled:
+            names.update(template.field_names)
+        texts = [template.text for template in compiled]
+        if context is None and self.engine == self.DJANGO:
+            context = {}
+        if context is not None:
+            context = LazyContext(context)
+            texts = [self._render(template, context)
+                     for template in compiled]
+        return {'subject': texts[0], 'body': texts[1], 'text': texts[2],
+                'missing': sorted(names.difference(context or ()))}
+
+    def render_many(self, contexts):
+        """
+        Check that the mail template renders for each context.
+
+        :param contexts: An iterable of context dictionaries (or None).
+        :return: A list with a dictionary for each context with its
+                 ``missing`` context variables (see render()) and its
+                 ``error``, a string describing the exception raised when
+                 rendering it, or None.
+        """
+        results = []
+        for context in contexts:
+            try:
+                missing = self.render(context)['missing']
+            except Exception as e:
+                results.append({'missing': [],
+                                'error': '{} ({})'.format(
+                                    e, type(e).__name__)})
+            else:
+                results.append({'missing': missing, 'error': None})
+        return results
+
+    def _compile(self, text, html=False):
+        # Values are escaped only in the HTML body of Django templates.
+        if self.engine == self.DJANGO:
+            return compile_django_template(text, autoescape=html)
+        return compile_template(text)
+
+    @staticmethod
+    def _render(compiled, context):
+        if app_settings.RENDER_CACHE:
+            return render_cache.render(compiled, context)
+        return compiled.render(context)
+
     def send(self, context=None):
         """
         When sending an email a set of attributes will be required.
@@ -87,36 +444,319 @@ class MailTemplate(models.Model):
                  could not be sent the message will be the reason. This could
                  have future uses if logging is implemented.
         """
-        subject = self.subject
-        body = self.body
-        if context is None:
-            # Needed whe no context is received so no replacement is tried.
-            pass
-        elif not isinstance(context, dict):
+        message = self.build_message(context)
+        with sending(self, [message]) as result:
+            for _chunk in throttled(self.from_email, [message]):
+                result['sent'] = message.send()
+        return result['sent']
+
+    def send_messages(self, connection, messages):
+        """
+        Send messages built by this mail template through a connection.
+
+        Used by the bulk send methods, it sends pre_send and post_send
+        signals around connection.send_messages(). When there is a rate
+        limit for the mail template's from email (see throttle module)
+        messages are handed to the backend in chunks as the limit allows.
+
+        :return: The amount of messages sent.
+        """
+        with sending(self, messages) as result:
+            for chunk in throttled(self.from_email, messages):
+                result['sent'] += connection.send_messages(chunk) or 0
+        return result['sent']
+
+    def send_many(self, contexts, batch_size=None, connection=None,
+                  fail_silently=False):
+        """
+        Send one mail for each context using a single backend connection.
+
+        Contexts are rendered and sent lazily in batches of batch_size
+        messages, each batch handed to the backend with one
+        send_messages() call, so there is only one connection handshake for
+        the whole iterable.
+
+        :param contexts: An iterable of context dictionaries (or None).
+        :param batch_size: Amount of messages for each send_messages() call.
+                           Defaults to MAIL_TEMPLATE_BATCH_SIZE setting.
+        :param connection: An optional email backend instance to reuse.
+        :param fail_silently: Used when creating the backend connection.
+        :return: A list with an item for each context: 1 if its mail was sent
+                 and 0 if not. When a backend reports only part of a batch as
+                 sent, every mail in that batch is reported as 0 because the
+                 backend does not tell which ones failed.
+        """
+        return self._send_each(((None, context) for context in contexts),
+                               batch_size, connection, fail_silently)
+
+    def send_merge(self, recipients, batch_size=None, connection=None,
+                   fail_silently=False):
+        """
+        Send an individual mail to each recipient with its own context.
+
+        Each mail is rendered for its context and sent only to its recipient
+        address (see the to argument of build_message()), with the mail
+        template's from and reply to. Mails are sent lazily in batches of
+        batch_size through a single backend connection, like send_many().
+
+        :param recipients: An iterable of (address, context) pairs.
+        :param batch_size: Amount of messages for each send_messages() call.
+                           Defaults to MAIL_TEMPLATE_BATCH_SIZE setting.
+        :param connection: An optional email backend instance to reuse.
+        :param fail_silently: Used when creating the backend connection.
+        :return: A list with an item for each pair: 1 if its mail was sent
+                 and 0 if not, including invalid addresses. See send_many()
+                 for partially sent batches.
+        """
+        return self._send_each(recipients, batch_size, connection,
+                               fail_silently)
+
+    def _send_each(self, recipients, batch_size, connection, fail_silently):
+        if batch_size is None:
+            batch_size = app_settings.BATCH_SIZE
+        results = []
+        pending = []
+
+        def messages():
+            for to, context in recipients:
+                results.append(0)
+                try:
+                    message = self.build_message(context, to=to)
+                except ValidationError:
+                    if to is None:
+                        raise
+                    continue
+                # Mails without recipients are never handed to the backend,
+                # same as EmailMessage.send() does.
+                if message.recipients():
+                    pending.append(len(results) - 1)
+                    yield message
+
+        for batch, sent in send_messages_in_batches(
+                messages(), batch_size, connection=connection,
+                fail_silently=fail_silently, send=self.send_messages):
+            result = 1 if sent == len(batch) else 0
+            for index in pending:
+                results[index] = result
+            pending.clear()
+        return results
+
+    def send_objects(self, objects, context_fields, recipient_field=None,
+                     chunk_size=2000, batch_size=None, connection=None,
+                     fail_silently=False):
+        """
+        Send one mail for each object of a queryset or iterable.
+
+        Querysets are consumed with iterator(chunk_size=chunk_size) and mails
+        are rendered and sent in batches as objects are read, so memory use
+        does not depend on the amount of objects. Use select_related() in the
+        queryset when context_fields follow relations.
+
+        :param objects: A queryset, or an iterable of objects.
+        :param context_fields: A dictionary mapping each context variable to
+                               an attribute of the objects (see
+                               tools.resolve_attribute()), or a list of
+                               attribute names used as context variables.
+                               Variables not used by the mail template (see
+                               get_placeholders()) are skipped.
+        :param recipient_field: An optional attribute of the objects with
+                                their email address, used instead of the mail
+                                template's to (see build_message()).
+        :param chunk_size: Amount of rows fetched from the database at a time.
+        :param batch_size: Amount of messages for each send_messages() call.
+                           Defaults to MAIL_TEMPLATE_BATCH_SIZE setting.
+        :param connection: An optional email backend instance to reuse.
+        :param fail_silently: Used when creating the backend connection.
+        :return: A dictionary with the amount of mails ``sent`` and
+                 ``failed``. Objects without a valid email address are
+                 counted as failed.
+        """
+        if batch_size is None:
+            batch_size = app_settings.BATCH_SIZE
+        if not isinstance(context_fields, dict):
+            context_fields = {name: name for name in context_fields}
+        # Attributes of context variables not used are not resolved, they
+        # could query related objects.
+        placeholders = self.get_placeholders()
+        context_fields = {name: path for name, path in context_fields.items()
+                          if name in placeholders}
+        if isinstance(objects, models.QuerySet):
+            objects = objects.iterator(chunk_size=chunk_size)
+        report = {'sent': 0, 'failed': 0}
+
+        def messages():
+            for obj in objects:
+                context = {name: resolve_attribute(obj, path)
+                           for name, path in context_fields.items()}
+                to = None
+                if recipient_field is not None:
+                    to = resolve_attribute(obj, recipient_field) or ''
+                try:
+                    message = self.build_message(context, to=to)
+                except ValidationError:
+                    report['failed'] += 1
+                    continue
+                if not message.recipients():
+                    report['failed'] += 1
+                    continue
+                yield message
+
+        for batch, sent in send_messages_in_batches(
+                messages(), batch_size, connection=connection,
+                fail_silently=fail_silently, send=self.send_messages):
+            report['sent'] += sent
+            report['failed'] += len(batch) - sent
+        return report
+
+    def send_parallel(self, contexts, workers=None, batch_size=None,
+                      processes=False):
+        """
+        Send one mail for each context using a pool of workers.
+
+        Each worker, a thread or a process, has its own copy of the mail
+        template and its own backend connection. Threads are enough when the
+        time is spent waiting for the mail server; processes also spread
+        rendering between CPU cores. See
+        django_mail_template.parallel.send_parallel().
+
+        :param contexts: An iterable of context dictionaries (or None).
+        :param workers: Amount of workers. Defaults to
+                        MAIL_TEMPLATE_PARALLEL_WORKERS setting.
+        :param batch_size: Amount of contexts sent by a worker at a time.
+                           Defaults to MAIL_TEMPLATE_BATCH_SIZE setting.
+        :param processes: Use processes instead of threads. Not allowed
+                          inside an atomic block, as the database
+                          connections are closed before starting them.
+        :return: A dictionary with the amount of mails ``sent`` and
+                 ``failed``, and the ``errors`` found.
+        """
+        if workers is None:
+            workers = app_settings.PARALLEL_WORKERS
+        if batch_size is None:
+            batch_size = app_settings.BATCH_SIZE
+        return send_parallel(self, contexts, workers, batch_size,
+                             processes=processes)
+
+    def enqueue(self, context=None):
+        """
+        Queue a mail to be sent later by the mail_template_worker command.
+
+        :param context: A JSON serializable dictionary with context variables
+                        to be used with the subject and the message.
+        :return: The QueuedMail instance created.
+        """
+        if context is not None and not isinstance(context, dict):
             raise ValueError(_('The argument for send method must be a '
                                'mapping.'))
-        else:
-            subject = replace_context_variable(text=self.subject,
-                                               context_variable=context)
-            body = replace_context_variable(text=self.body,
-                                            context_variable=context)
-        msg = EmailMultiAlternatives(
-            subject=subject,
-            from_email=self.from_email,
-            to=clean_address_list(self.to),
-            cc=clean_address_list(self.cc),
-            bcc=clean_address_list(self.bcc),
-            reply_to=clean_address_list(self.reply_to)
-        )
-        msg.body = body
-        msg.attach_alternative(body, 'text/html')
-        return msg.send()
+        return QueuedMail.objects.create(mail_template=self, context=context)
+
+    async def asend(self, context=None):
+        """
+        Asynchronous version of send().
+
+        The mail is rendered in a thread and sent without blocking the event
+        loop, see django_mail_template.aio.asend_messages(). As with
+        asend_many(), lazy context values can query the database.
+
+        :param context: A dictionary with context variables to be used with
+                        the subject and the message.
+        :return: The amount of mails sent (1 or 0).
+        """
+        messages = [await sync_to_async(self.build_message)(context)]
+        with sending(self, messages) as result:
+            async for _chunk in athrottled(self.from_email, messages):
+                result['sent'] = await asend_messages(messages)
+        await self._aflush_sent_log()
+        return result['sent']
+
+    async def asend_many(self, contexts, batch_size=None, concurrency=None,
+                         fail_silently=False):
+        """
+        Asynchronous version of send_many().
+
+        Mails are sent in batches of batch_size messages, each batch in its
+        own connection, with at most concurrency batches being sent at the
+        same time. Contexts are consumed and rendered (in a thread) one batch
+        at a time, so an iterable of any length can be given.
+
+        :param contexts: An iterable of context dictionaries (or None).
+        :param batch_size: Amount of messages for each connection. Defaults to
+                           MAIL_TEMPLATE_BATCH_SIZE setting.
+        :param concurrency: Maximum amount of connections at the same time.
+                            Defaults to MAIL_TEMPLATE_ASYNC_CONCURRENCY
+                            setting.
+        :param fail_silently: Used when creating the backend connections.
+        :return: A list with an item for each context: 1 if its mail was sent
+                 and 0 if not, as send_many() does.
+        """
+        if batch_size is None:
+            batch_size = app_settings.BATCH_SIZE
+        if concurrency is None:
+            concurrency = app_settings.ASYNC_CONCURRENCY
+        results = []
+        errors = []
+        pending = set()
+        semaphore = asyncio.Semaphore(concurrency)
+
+        def build_messages(contexts):
+            return [self.build_message(context) for context in contexts]
+
+        async def send_batch(start, contexts):
+            try:
+                # Rendered in a thread when the batch is sent, so the event
+                # loop is not blocked and at most concurrency batches are
+                # held in memory. Lazy context values can query the database.
+                messages = await sync_to_async(build_messages)(contexts)
+                batch = [start + index
+                         for index, message in enumerate(messages)
+                         if message.recipients()]
+                batch_messages = [messages[index - start] for index in batch]
+                if not batch_messages:
+                    return
+                with sending(self, batch_messages) as result:
+                    async for chunk in athrottled(self.from_email,
+                                                  batch_messages):
+                        result['sent'] += await asend_messages(
+                            chunk, fail_silently=fail_silently)
+                if result['sent'] == len(batch):
+                    for index in batch:
+                        results[index] = 1
+                await self._aflush_sent_log()
+            except Exception as e:
+                errors.append(e)
+            finally:
+                semaphore.release()
+
+        contexts = iter(contexts)
+        while not errors:
+            await semaphore.acquire()
+            contexts_batch = list(islice(contexts, batch_size))
+            if not contexts_batch:
+                semaphore.release()
+                break
+            task = asyncio.ensure_future(
+                send_batch(len(results), contexts_batch))
+            results.extend([0] * len(contexts_batch))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+        await asyncio.gather(*pending)
+        if errors:
+            raise errors[0]
+        return results
+
+    @staticmethod
+    async def _aflush_sent_log():
+        # The sent log is not written from the event loop, see sent_log.
+        if app_settings.SENT_LOG:
+            # Imported here as sent_log imports this module.
+            from django_mail_template import sent_log
+            await sent_log.aflush_if_full()
 
 
 class Configuration(models.Model):
 
     process = models.CharField(
-        verbose_name=_("Process"), max_length=200,
+        verbose_name=_("Process"), max_length=200, unique=True,
         help_text=_("A name to identify the process."))
 
     mail_template = models.ForeignKey(
@@ -144,9 +784,181 @@ class Configuration(models.Model):
             str_ += gettext('No mail template')
         return str_
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Keep loaded process so cache can be invalidated if it is renamed.
+        instance._loaded_process = instance.__dict__.get('process')
+        return instance
+
     @staticmethod
     def get_mail_template(process):
+        """
+        Return the mail template configured for a process, or None.
+
+        The mapping is cached (see MailTemplateLookupCache), so repeated
+        lookups do not hit the database.
+        """
+        Configuration._discard_stale()
+        return mail_template_lookup_cache.get(
+            process, Configuration._load_mail_template)
+
+    @staticmethod
+    def get_mail_templates(processes):
+        """
+        Return the mail templates configured for many processes at once.
+
+        Processes not cached are loaded in a single query.
+
+        :param processes: An iterable of process names.
+        :return: A dictionary mapping each process to its mail template, or
+                 None.
+        """
+        Configuration._discard_stale()
+        return mail_template_lookup_cache.get_many(
+            processes, Configuration._load_mail_templates)
+
+    @staticmethod
+    def _discard_stale():
+        interval = app_settings.REVISION_CHECK_INTERVAL
+        if interval:
+            mail_template_lookup_cache.discard_stale(
+                MailTemplate.get_revisions, interval)
+
+    @staticmethod
+    async def aget_mail_template(process):
+        """
+        Asynchronous version of get_mail_template().
+        """
+        if app_settings.REVISION_CHECK_INTERVAL:
+            await sync_to_async(Configuration._discard_stale)()
+        return await mail_template_lookup_cache.aget(
+            process, Configuration._aload_mail_template)
+
+    @staticmethod
+    async def _aload_mail_template(process):
+        try:
+            configuration = await Configuration.objects.select_related(
+                'mail_template').aget(process=process)
+        except ObjectDoesNotExist:
+            return None
+        return configuration.mail_template
+
+    @staticmethod
+    def _load_mail_templates(processes):
+        mail_templates = dict.fromkeys(processes)
+        for configuration in Configuration.objects.select_related(
+                'mail_template').filter(process__in=processes):
+            mail_templates[configuration.process] = \
+                configuration.mail_template
+        return mail_templates
+
+    @staticmethod
+    def _load_mail_template(process):
         try:
-            return Configuration.objects.get(process=process).mail_template
+            return Configuration.objects.select_related(
+                'mail_template').get(process=process).mail_template
         except ObjectDoesNotExist:
             return None
+
+
+class QueuedMail(models.Model):
+    """
+    A mail waiting to be sent by the mail_template_worker command.
+
+    Created by MailTemplate.enqueue(), see django_mail_template.mail_queue
+    for how the queue is processed.
+    """
+    PENDING = 'pending'
+    SENDING = 'sending'
+    SENT = 'sent'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (PENDING, _('Pending')),
+        (SENDING, _('Sending')),
+        (SENT, _('Sent')),
+        (FAILED, _('Failed')),
+    )
+
+    mail_template = models.ForeignKey(
+        MailTemplate, verbose_name=_('Mail template'),
+        on_delete=models.CASCADE, related_name='queued_mails')
+    context = models.JSONField(
+        verbose_name=_('Context'), blank=True, null=True,
+        help_text=_('Context variables used to send the mail.'))
+    status = models.CharField(
+        verbose_name=_('Status'), max_length=10, choices=STATUS_CHOICES,
+        default=PENDING)
+    attempts = models.PositiveIntegerField(
+        verbose_name=_('Attempts'), default=0)
+    #: When pending, the mail is not sent before this moment. When sending, a
+    #: worker claimed it and after this moment is considered lost so it can
+    #: be claimed again.
+    next_attempt = models.DateTimeField(
+        verbose_name=_('Next attempt'), default=timezone.now)
+    last_error = models.TextField(
+        verbose_name=_('Last error'), blank=True, default='')
+    created = models.DateTimeField(
+        verbose_name=_('Created'), auto_now_add=True)
+    sent = models.DateTimeField(
+        verbose_name=_('Sent'), blank=True, null=True)
+
+    class Meta:
+        verbose_name = _('Queued mail')
+        verbose_name_plural = _('Queued mails')
+        indexes = [
+            models.Index(fields=['status', 'next_attempt']),
+        ]
+
+    def __str__(self):
+        return '{} - {}'.format(self.mail_template, self.get_status_display())
+
+
+class SentMail(models.Model):
+    """
+    A mail handed to the backend, logged when MAIL_TEMPLATE_SENT_LOG is True.
+
+    Rows are written in bulk by django_mail_template.sent_log and removed by
+    the mail_template_prune_sent command.
+    """
+    SENT = 'sent'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (SENT, _('Sent')),
+        (FAILED, _('Failed')),
+    )
+
+    mail_template = models.ForeignKey(
+        MailTemplate, verbose_name=_('Mail template'),
+        on_delete=models.SET_NULL, null=True, blank=True,
+        related_name='sent_mails')
+    recipients = models.TextField(
+        verbose_name=_('Recipients'), blank=True, default='',
+        help_text=_('To, Cc and Bcc addresses separated with coma.'))
+    subject = models.CharField(
+        verbose_name=_('Subject'), max_length=255, blank=True, default='')
+    status = models.CharField(
+        verbose_name=_('Status'), max_length=10, choices=STATUS_CHOICES)
+    message_id = models.CharField(
+        verbose_name=_('Message-ID'), max_length=255, blank=True,
+        default='')
+    error = models.TextField(
+        verbose_name=_('Error'), blank=True, default='')
+    #: Seconds the backend took for the batch of the mail, divided by the
+    #: amount of mails in the batch.
+    duration = models.FloatField(
+        verbose_name=_('Duration'), blank=True, null=True,
+        help_text=_('Seconds spent sending the mail.'))
+    created = models.DateTimeField(
+        verbose_name=_('Created'), default=timezone.now)
+
+    class Meta:
+        verbose_name = _('Sent mail')
+        verbose_name_plural = _('Sent mails')
+        indexes = [
+            models.Index(fields=['mail_template', 'created']),
+            models.Index(fields=['created']),
+        ]
+
+    def __str__(self):
+        return '{} - {}'.format(self.recipients, self.get_status_display())
@@ -0,0 +1,386 @@
+# -*- coding: UTF-8 -*-
+"""
+Save time processing of mail template bodies.
+
+HTML written with CKEditor holds whitespace, comments, ``<style>`` blocks
+many mail clients ignore and editor markup. optimize_html() returns a send
+ready version of such a body, computed once when the mail template is saved
+(see MailTemplate.optimized_body):
+
+- Editor artifacts are removed: ``data-cke-*``, ``contenteditable`` and
+  ``spellcheck`` attributes, ``cke_*`` classes, selection bookmarks and
+  ``<br type="_moz">``.
+- Rules of ``<style>`` blocks with simple selectors (``p``, ``.note``,
+  ``#footer``, ``td.total`` and groups of them) are inlined in the style
+  attribute of the elements they match, by specificity and order, and the
+  element's own declarations win. Other rules (media queries, pseudo
+  classes, descendant selectors...) are kept in a single ``<style>`` block.
+- Comments (except Outlook conditional comments) are removed, and
+  whitespace is collapsed outside ``<pre>`` and ``<textarea>``.
+
+Context variables are preserved: they are replaced by markers before the
+HTML is parsed and restored afterwards, so they can be used in text,
+attributes and CSS. With the format engine, braces written as ``{{`` and
+``}}`` (as CSS in a body needs) are escaped again in the result.
+"""
+import re
+from html import escape
+from html.parser import HTMLParser
+from string import Formatter
+
+_formatter = Formatter()
+
+# Characters of the private use area, not found in bodies.
+_MARKER = '\ue000{}\ue001'
+_MARKER_RE = re.compile('\ue000(\\d+)\ue001')
+_DJANGO_TAG_RE = re.compile(r'{{.*?}}|{%.*?%}|{#.*?#}', re.DOTALL)
+
+_STYLE_RE = re.compile(r'<style(\s[^>]*)?>(.*?)</style\s*>',
+                       re.IGNORECASE | re.DOTALL)
+_CSS_COMMENT_RE = re.compile(r'/\*.*?\*/', re.DOTALL)
+_SIMPLE_SELECTOR_RE = re.compile(
+    r'^([a-zA-Z][\w-]*)?(#[\w-]+)?((?:\.[\w-]+)*)$')
+
+_BLOCK_TAGS = {'address', 'article', 'aside', 'blockquote', 'body', 'br',
+               'caption', 'center', 'col', 'colgroup', 'dd', 'div', 'dl',
+               'dt', 'fieldset', 'figure', 'footer', 'form', 'h1', 'h2',
+               'h3', 'h4', 'h5', 'h6', 'head', 'header', 'hr', 'html', 'li',
+               'link', 'main', 'meta', 'nav', 'ol', 'p', 'section', 'style',
+               'table', 'tbody', 'td', 'tfoot', 'th', 'thead', 'title', 'tr',
+               'ul'}
+_RAW_TAGS = {'pre', 'textarea', 'script'}
+_ARTIFACT_ATTRIBUTES = {'contenteditable', 'spellcheck'}
+
+
+def protect(text, engine='format'):
+    """
+    Replace the context variables (or Django template tags) of a text by
+    markers.
+
+    :return: A tuple with the text and the list of replaced sources, to be
+             given to restore().
+    :raise ValueError: When a format text is not valid.
+    """
+    sources = []
+
+    def marker(source):
+        sources.append(source)
+        return _MARKER.format(len(sources) - 1)
+
+    if engine == 'django':
+        return _DJANGO_TAG_RE.sub(lambda m: marker(m.group()), text), sources
+    parts = []
+    for literal, field_name, format_spec, conversion in \
+            _formatter.parse(text):
+        # Literal parts come with escaped braces already unescaped.
+        parts.append(literal)
+        if field_name is not None:
+            source = field_name
+            if conversion is not None:
+                source += '!' + conversion
+            if format_spec:
+                source += ':' + format_spec
+            parts.append(marker('{' + source + '}'))
+    return ''.join(parts), sources
+
+
+def restore(text, sources, engine='format'):
+    """Return a text given by protect() with its sources back."""
+    if engine != 'django':
+        text = text.replace('{', '{{').replace('}', '}}')
+    return _MARKER_RE.sub(lambda m: sources[int(m.group(1))], text)
+
+
+def parse_declarations(style):
+    """
+    Return a dictionary with the declarations of a style attribute or CSS
+    rule, keyed by lower case property name.
+
+    Fragments that are not a declaration but hold context variables (as
+    ``{extra}`` or ``{{ cell_style }}``, which render to whole declarations)
+    are kept as written, keyed by themselves with a None value.
+    """
+    declarations = {}
+    for declaration in style.split(';'):
+        name, sep, value = declaration.partition(':')
+        name = name.strip().lower()
+        value = ' '.join(value.split())
+        if sep and name and value:
+            # Redefined properties go last, as the last one applies.
+            declarations.pop(name, None)
+            declarations[name] = value
+        elif _MARKER_RE.search(declaration):
+            fragment = ' '.join(declaration.split())
+            declarations.pop(fragment, None)
+            declarations[fragment] = None
+    return declarations
+
+
+def format_declarations(declarations):
+    return ';'.join(name if value is None else '{}:{}'.format(name, value)
+                    for name, value in declarations.items())
+
+
+def minify_css(css):
+    css = _CSS_COMMENT_RE.sub('', css)
+    css = ' '.join(css.split())
+    # Spaces around colons are kept, they separate descendant selectors.
+    return re.sub(r'\s*([{};,>])\s*', r'\1', css).replace(';}', '}')
+
+
+def _split_rules(css):
+    # Yield (prelude, block) for each top level rule, block is None for
+    # statements such as @import.
+    position = 0
+    while position < len(css):
+        brace = css.find('{', position)
+        semicolon = css.find(';', position)
+        if brace == -1 and semicolon == -1:
+            break
+        if semicolon != -1 and (brace == -1 or semicolon < brace):
+            yield css[position:semicolon].strip(), None
+            position = semicolon + 1
+            continue
+        depth = 0
+        end = brace
+        while end < len(css):
+            if css[end] == '{':
+                depth += 1
+            elif css[end] == '}':
+                depth -= 1
+                if depth == 0:
+                    break
+            end += 1
+        yield css[position:brace].strip(), css[brace + 1:end]
+        position = end + 1
+
+
+class Rule:
+    __slots__ = ('tag', 'id', 'classes', 'specificity', 'declarations')
+
+    def __init__(self, match, declarations):
+        tag, id_, classes = match.groups()
+        self.tag = tag.lower() if tag else None
+        self.id = id_[1:] if id_ else None
+        self.classes = set(classes.split('.')[1:]) if classes else set()
+        self.specificity = (int(bool(id_)), len(self.classes),
+                            int(bool(tag)))
+        self.declarations = declarations
+
+    def matches(self, tag, id_, classes):
+        return (self.tag is None or self.tag == tag) and \
+            (self.id is None or self.id == id_) and \
+            self.classes.issubset(classes)
+
+
+def parse_css(css):
+    """
+    Split the CSS of a style block in the rules that can be inlined and the
+    CSS that can not.
+
+    :return: A tuple with a list of Rule, in the order they are written,
+             and the minified CSS kept.
+    """
+    rules = []
+    kept = []
+    for prelude, block in _split_rules(_CSS_COMMENT_RE.sub('', css)):
+        if block is None:
+            if prelude:
+                kept.append(prelude + ';')
+            continue
+        if prelude.startswith('@'):
+            kept.append('{}{{{}}}'.format(prelude, block))
+            continue
+        declarations = parse_declarations(block)
+        not_inlined = []
+        for selector in prelude.split(','):
+            selector = selector.strip()
+            match = _SIMPLE_SELECTOR_RE.match(selector)
+            if match and selector:
+                rules.append(Rule(match, declarations))
+            elif selector:
+                not_inlined.append(selector)
+        if not_inlined and declarations:
+            kept.append('{}{{{}}}'.format(','.join(not_inlined),
+                                          format_declarations(declarations)))
+    return rules, minify_css(''.join(kept))
+
+
+def _inlined_style(attrs):
+    # Only style blocks for screens are inlined.
+    media = dict(attrs).get('media')
+    return media is None or media.strip().lower() in ('all', 'screen')
+
+
+class _Optimizer(HTMLParser):
+
+    def __init__(self, rules, css):
+        super().__init__(convert_charrefs=False)
+        self.rules = rules
+        self.css = css
+        self.parts = []
+        self.raw = 0
+        self.skip = 0
+        self.style = None
+        self.pending_space = False
+        self.after_block = True
+
+    def emit(self, text, block=False):
+        if self.pending_space and not block and not self.after_block:
+            self.parts.append(' ')
+        self.pending_space = False
+        self.parts.append(text)
+        self.after_block = block
+
+    def format_tag(self, tag, attrs, close=''):
+        parts = [tag]
+        for name, value in attrs:
+            if value is None:
+                parts.append(name)
+            else:
+                parts.append('{}="{}"'.format(name, escape(value)))
+        return '<{}{}>'.format(' '.join(parts), close)
+
+    def clean_attrs(self, tag, attrs):
+        cleaned = []
+        style = None
+        id_ = None
+        classes = set()
+        for name, value in attrs:
+            if name.startswith('data-cke-') or \
+                    name in _ARTIFACT_ATTRIBUTES:
+                continue
+            if name == 'class' and value is not None:
+                value = ' '.join(class_name for class_name in value.split()
+                                 if not class_name.startswith('cke_'))
+                classes.update(value.split())
+            elif name == 'id':
+                id_ = value
+            elif name == 'style' and value is not None:
+                style = value
+                continue
+            if name in ('class', 'style') and not value:
+                continue
+            cleaned.append((name, value))
+        declarations = {}
+        for rule in self.rules:
+            if rule.matches(tag, id_, classes):
+                declarations.update(rule.declarations)
+        if style is not None:
+            declarations.update(parse_declarations(style))
+        if declarations:
+            cleaned.append(('style', format_declarations(declarations)))
+        return cleaned
+
+    def is_artifact(self, tag, attrs):
+        attrs = dict(attrs)
+        return (tag == 'span' and 'data-cke-bookmark' in attrs or
+                (attrs.get('id') or '').startswith('cke_bm_') or
+                tag == 'br' and attrs.get('type') == '_moz')
+
+    def handle_starttag(self, tag, attrs):
+        if self.skip:
+            if tag not in ('br', 'img', 'hr'):
+                self.skip += 1
+            return
+        if self.is_artifact(tag, attrs):
+            if tag == 'span':
+                self.skip = 1
+            return
+        if tag == 'style' and _inlined_style(attrs):
+            self.style = attrs
+            return
+        if tag in _RAW_TAGS:
+            self.raw += 1
+        self.emit(self.format_tag(tag, self.clean_attrs(tag, attrs)),
+                  tag in _BLOCK_TAGS)
+
+    def handle_startendtag(self, tag, attrs):
+        if self.skip or self.is_artifact(tag, attrs):
+            return
+        self.emit(self.format_tag(tag, self.clean_attrs(tag, attrs), '/'),
+                  tag in _BLOCK_TAGS)
+
+    def handle_endtag(self, tag):
+        if self.skip:
+            self.skip -= 1
+            return
+        if tag == 'style' and self.style is not None:
+            # Rules not inlined are kept where the first style block was.
+            if self.css:
+                self.emit('<style>{}</style>'.format(self.css), True)
+                self.css = ''
+            self.style = None
+            return
+        if tag in _RAW_TAGS:
+            self.raw = max(self.raw - 1, 0)
+        self.emit('</{}>'.format(tag), tag in _BLOCK_TAGS)
+
+    def handle_data(self, data):
+        if self.skip or self.style is not None:
+            return
+        if self.raw:
+            self.emit(data)
+            return
+        data = re.sub(r'\s+', ' ', data)
+        if data.startswith(' '):
+            self.pending_space = True
+            data = data[1:]
+        if not data:
+            return
+        space = data.endswith(' ')
+        self.emit(data.rstrip(' '))
+        self.pending_space = space
+
+    def handle_entityref(self, name):
+        if not self.skip:
+            self.emit('&{};'.format(name))
+
+    def handle_charref(self, name):
+        if not self.skip:
+            self.emit('&#{};'.format(name))
+
+    def handle_comment(self, data):
+        # Conditional comments are used to target Outlook.
+        if data.startswith('[if') or data.endswith('[endif]'):
+            self.emit('<!--{}-->'.format(data))
+
+    def handle_decl(self, decl):
+        self.emit('<!{}>'.format(decl), True)
+
+    def unknown_decl(self, data):
+        self.emit('<![{}]>'.format(data))
+
+    def handle_pi(self, data):
+        self.emit('<?{}>'.format(data), True)
+
+    def get_html(self):
+        return ''.join(self.parts)
+
+
+def optimize_html(html, engine='format'):
+    """
+    Return a send ready version of an HTML body, see the module
+    documentation.
+
+    :param html: The body, which can use context variables.
+    :param engine: The engine of the mail template the body belongs to,
+                   ``'format'`` or ``'django'``.
+    :raise ValueError: When a format body is not valid.
+    """
+    text, sources = protect(html, engine)
+    rules = []
+    kept = []
+    for match in _STYLE_RE.finditer(text):
+        attrs = re.findall(r'([\w-]+)\s*=\s*["\']?([^"\'\s>]*)',
+                           match.group(1) or '')
+        if _inlined_style([(name.lower(), value) for name, value in attrs]):
+            block_rules, css = parse_css(match.group(2))
+            rules.extend(block_rules)
+            kept.append(css)
+    # The sort is stable, so later rules win on equal specificity.
+    rules.sort(key=lambda rule: rule.specificity)
+    parser = _Optimizer(rules, ''.join(kept))
+    parser.feed(text)
+    parser.close()
+    return restore(parser.get_html(), sources, engine)
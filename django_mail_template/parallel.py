@@ -0,0 +1,118 @@
+# -*- coding: UTF-8 -*-
+import copy
+import threading
+from concurrent.futures import (ThreadPoolExecutor, ProcessPoolExecutor,
+                                FIRST_COMPLETED, wait)
+from itertools import islice
+from multiprocessing.util import Finalize
+
+import django
+from django.apps import apps
+from django.core.mail import get_connection
+from django.db import connections
+from django.db.transaction import TransactionManagementError
+from django.utils.translation import gettext_lazy as _
+
+# State of the worker (thread or process): the mail template and an open
+# backend connection used for all the chunks the worker sends.
+_worker = threading.local()
+
+
+def _init_worker(mail_template, opened=None):
+    if not apps.ready:
+        # Processes started with spawn do not inherit the set up.
+        django.setup()
+    if opened is not None:
+        # Processes get a pickled copy, threads need their own one.
+        mail_template = copy.copy(mail_template)
+    _worker.mail_template = mail_template
+    _worker.connection = get_connection()
+    _worker.connection.open()
+    if opened is not None:
+        # Threads: connections are closed by the main thread at the end.
+        opened.append(_worker.connection)
+    else:
+        # Pool processes exit with os._exit(), without running atexit
+        # functions, but they run these finalizers.
+        Finalize(None, _worker.connection.close, exitpriority=10)
+        Finalize(None, _flush_sent_log, exitpriority=10)
+
+
+def _flush_sent_log():
+    # Imported here as sent_log imports the models, which import this module.
+    from django_mail_template import sent_log
+    sent_log.flush()
+
+
+def _send_chunk(contexts, batch_size):
+    results = _worker.mail_template.send_many(
+        contexts, batch_size=batch_size, connection=_worker.connection)
+    return sum(results), len(results) - sum(results)
+
+
+def send_parallel(mail_template, contexts, workers, batch_size,
+                  processes=False):
+    """
+    Send one mail for each context using a pool of workers.
+
+    Contexts are split in chunks of batch_size and sent by the workers of a
+    thread pool, or a process pool when processes is True. Each worker keeps
+    its own copy of the mail template, with its own compiled subject and
+    body, and its own backend connection opened for all its chunks. At most
+    two chunks for each worker are waiting at a time, so contexts can be a
+    long lazy iterable.
+
+    With processes, the database connections of the caller are closed
+    before the pool is started (they can not be shared with forked
+    processes), so it can not be used inside a transaction.
+
+    :return: A dictionary with the amount of mails ``sent``, the amount of
+             ``failed`` ones and the ``errors`` (a list of strings) raised by
+             chunks that could not be sent, whose mails are counted as failed.
+    :raise TransactionManagementError: When processes is True inside an
+                                       atomic block.
+    """
+    if processes and any(connection.in_atomic_block for connection in
+                         connections.all(initialized_only=True)):
+        raise TransactionManagementError(_(
+            'Mails can not be sent with processes inside an atomic block.'))
+    report = {'sent': 0, 'failed': 0, 'errors': []}
+    opened = []
+    if processes:
+        # Database connections can not be shared with forked processes.
+        connections.close_all()
+        executor = ProcessPoolExecutor(
+            workers, initializer=_init_worker, initargs=(mail_template,))
+    else:
+        executor = ThreadPoolExecutor(
+            workers, initializer=_init_worker,
+            initargs=(mail_template, opened))
+    contexts = iter(contexts)
+    pending = {}
+    try:
+        with executor:
+            while True:
+                while len(pending) < workers * 2:
+                    chunk = list(islice(contexts, batch_size))
+                    if not chunk:
+                        break
+                    future = executor.submit(_send_chunk, chunk, batch_size)
+                    pending[future] = len(chunk)
+                if not pending:
+                    break
+                done = wait(pending, return_when=FIRST_COMPLETED).done
+                for future in done:
+                    size = pending.pop(future)
+                    try:
+                        sent, failed = future.result()
+                    except Exception as e:
+                        report['failed'] += size
+                        report['errors'].append(
+                            '{} ({})'.format(e, type(e).__name__))
+                    else:
+                        report['sent'] += sent
+                        report['failed'] += failed
+    finally:
+        for connection in opened:
+            connection.close()
+    return report
@@ -0,0 +1,52 @@
+# -*- coding: UTF-8 -*-
+from functools import partial
+
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete, pre_delete
+from django.dispatch import receiver
+
+from django_mail_template.cache import (mail_template_lookup_cache,
+                                        mail_template_revisions)
+from django_mail_template.models import MailTemplate, Configuration
+
+
+# Caches are changed when the transaction is committed, so other processes
+# can not load the previous rows again before it, and rolled back changes
+# are not published.
+
+
+@receiver([post_save, post_delete], sender=Configuration)
+def invalidate_configuration(sender, instance, using, **kwargs):
+    processes = {instance.process}
+    # The process could have been renamed since it was loaded.
+    loaded_process = getattr(instance, '_loaded_process', None)
+    if loaded_process is not None:
+        processes.add(loaded_process)
+    transaction.on_commit(
+        partial(mail_template_lookup_cache.invalidate, processes),
+        using=using)
+
+
+@receiver([post_save, pre_delete], sender=MailTemplate)
+def invalidate_mail_template(sender, instance, using, **kwargs):
+    # On delete the processes are collected before the foreign keys are set
+    # to null.
+    processes = list(Configuration.objects.using(using).filter(
+        mail_template=instance).values_list('process', flat=True))
+    transaction.on_commit(
+        partial(mail_template_lookup_cache.invalidate, processes),
+        using=using)
+
+
+@receiver(post_save, sender=MailTemplate)
+def publish_revision(sender, instance, using, **kwargs):
+    transaction.on_commit(
+        partial(mail_template_revisions.publish, instance.pk,
+                instance.revision),
+        using=using)
+
+
+@receiver(post_delete, sender=MailTemplate)
+def forget_revision(sender, instance, using, **kwargs):
+    transaction.on_commit(
+        partial(mail_template_revisions.forget, instance.pk), using=using)
@@ -0,0 +1,183 @@
+# -*- coding: UTF-8 -*-
+"""
+Log of sent mails.
+
+When MAIL_TEMPLATE_SENT_LOG setting is True, log_sent_mails() is connected
+to post_send signal and keeps a SentMail for each mail handed to the backend.
+Rows are not inserted one by one: they are kept in a buffer local to the
+process and written with a single bulk_create() when the buffer holds
+MAIL_TEMPLATE_SENT_LOG_BUFFER_SIZE rows or was last written
+MAIL_TEMPLATE_SENT_LOG_FLUSH_INTERVAL seconds ago, and when the process
+exits. Long running processes sending mails from time to time can call
+flush() to write the rows without waiting for the next mail.
+
+The buffer is shared by every caller of the process, so it is not written
+inside the transaction of the caller that fills it: it is written once that
+transaction is committed (see transaction.on_commit()), and its rows stay
+in the buffer if it is rolled back, as the mails were sent anyway. Database
+errors writing the buffer are logged, and never raised to the code sending
+the mails.
+
+Mails sent by MailTemplate.asend() and asend_many() are logged from the
+event loop, where the database can not be used: the buffer is not written
+there but by aflush_if_full(), which those methods await after sending.
+"""
+import asyncio
+import atexit
+import logging
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.db import DatabaseError, IntegrityError, router, transaction
+from django.utils import timezone
+
+from django_mail_template.conf import app_settings
+from django_mail_template.models import MailTemplate, SentMail
+from django_mail_template.signals import post_send
+
+logger = logging.getLogger(__name__)
+
+
+class SentMailBuffer:
+    """
+    SentMail instances waiting to be written with bulk_create().
+    """
+
+    def __init__(self):
+        self._sent_mails = []
+        self._flushed = time.monotonic()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._sent_mails)
+
+    def is_full(self):
+        """
+        Return True when the buffer holds SENT_LOG_BUFFER_SIZE rows, or was
+        last written SENT_LOG_FLUSH_INTERVAL seconds ago.
+        """
+        return bool(self._sent_mails) and (
+            len(self._sent_mails) >= app_settings.SENT_LOG_BUFFER_SIZE or
+            time.monotonic() - self._flushed >=
+            app_settings.SENT_LOG_FLUSH_INTERVAL)
+
+    def add(self, sent_mails):
+        with self._lock:
+            self._sent_mails.extend(sent_mails)
+            full = self.is_full()
+        if full and not _in_event_loop():
+            transaction.on_commit(self.flush,
+                                  using=router.db_for_write(SentMail))
+
+    async def aflush_if_full(self):
+        """
+        Write the buffered rows in a thread if the buffer is full.
+
+        :return: The amount of rows written.
+        """
+        if self.is_full():
+            return await sync_to_async(self.flush)()
+        return 0
+
+    def flush(self):
+        """
+        Write the buffered rows.
+
+        Rows referencing mail templates deleted while they were buffered are
+        written without mail template, as if they were deleted afterwards.
+        Other database errors are logged and the rows are discarded.
+
+        :return: The amount of rows written.
+        """
+        with self._lock:
+            sent_mails, self._sent_mails = self._sent_mails, []
+            self._flushed = time.monotonic()
+        if not sent_mails:
+            return 0
+        try:
+            try:
+                _write(sent_mails)
+            except IntegrityError:
+                _forget_deleted_mail_templates(sent_mails)
+                _write(sent_mails)
+        except DatabaseError:
+            logger.exception('%d sent mails could not be logged.',
+                             len(sent_mails))
+            return 0
+        return len(sent_mails)
+
+
+def _write(sent_mails):
+    # In its own transaction, or savepoint, so an error does not break the
+    # transaction the buffer is written from.
+    using = router.db_for_write(SentMail)
+    with transaction.atomic(using=using):
+        SentMail.objects.using(using).bulk_create(sent_mails)
+
+
+def _forget_deleted_mail_templates(sent_mails):
+    pks = {sent_mail.mail_template_id for sent_mail in sent_mails}
+    existing = set(MailTemplate.objects.filter(pk__in=pks).values_list(
+        'pk', flat=True))
+    for sent_mail in sent_mails:
+        if sent_mail.mail_template_id not in existing:
+            sent_mail.mail_template = None
+        # Instances keep the primary key given by a failed bulk_create().
+        sent_mail.pk = None
+
+
+def _in_event_loop():
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+
+buffer = SentMailBuffer()
+
+
+def flush():
+    """Write the buffered rows, see SentMailBuffer.flush()."""
+    return buffer.flush()
+
+
+async def aflush_if_full():
+    """See SentMailBuffer.aflush_if_full()."""
+    return await buffer.aflush_if_full()
+
+
+def log_sent_mails(sender, mail_template, messages, sent, error, durations,
+                   **kwargs):
+    # Backends only report how many messages were sent, so when some of them
+    # failed every message of the batch is logged as failed.
+    if sent == len(messages):
+        status = SentMail.SENT
+        error = ''
+    else:
+        status = SentMail.FAILED
+        error = '' if error is None else '{} ({})'.format(
+            error, type(error).__name__)
+    duration = durations['transport'] / len(messages) if messages else None
+    now = timezone.now()
+    if mail_template.pk is None:
+        # Not saved, it can not be referenced.
+        mail_template = None
+    buffer.add([
+        SentMail(mail_template=mail_template,
+                 recipients=', '.join(message.recipients()),
+                 subject=message.subject[:255], status=status,
+                 message_id=getattr(message, 'message_id', None) or '',
+                 error=error, duration=duration, created=now)
+        for message in messages])
+
+
+def connect():
+    post_send.connect(log_sent_mails, dispatch_uid='mail_template_sent_log')
+    atexit.register(flush)
+
+
+def disconnect():
+    post_send.disconnect(dispatch_uid='mail_template_sent_log')
+    atexit.unregister(flush)
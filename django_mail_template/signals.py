@@ -0,0 +1,78 @@
+# -*- coding: UTF-8 -*-
+from contextlib import contextmanager
+from time import perf_counter
+
+from django.dispatch import Signal
+
+#: Sent before a mail template is rendered for a context.
+#: Arguments: mail_template, context.
+pre_render = Signal()
+
+#: Sent after a mail template is rendered and its message built.
+#: Arguments: mail_template, context, message, size (see message_size()) and
+#: durations, a dictionary with the seconds spent in each phase: ``render``
+#: (subject and body) and ``addresses`` (address lists validation).
+post_render = Signal()
+
+#: Sent before messages of a mail template are handed to the backend.
+#: Arguments: mail_template, messages.
+pre_send = Signal()
+
+#: Sent after messages of a mail template are handed to the backend, also
+#: when sending raises an exception.
+#: Arguments: mail_template, messages, sent (amount of messages sent), size
+#: (sum of message_size() for messages), error (the exception raised or None)
+#: and durations, a dictionary with the seconds spent in ``transport`` (MIME
+#: serialization and backend).
+post_send = Signal()
+
+
+def message_size(message):
+    """
+    Return the size in bytes of the subject, body and alternatives of an
+    EmailMessage, a cheap approximation of the size of the mail sent.
+    """
+    encoding = message.encoding or 'utf-8'
+    size = len(message.subject.encode(encoding)) + \
+        len(message.body.encode(encoding))
+    for content, mimetype in getattr(message, 'alternatives', ()):
+        if isinstance(content, str):
+            content = content.encode(encoding)
+        size += len(content)
+    return size
+
+
+@contextmanager
+def sending(mail_template, messages):
+    """
+    Send pre_send and post_send around the code sending messages.
+
+    The code must set ``result['sent']`` to the amount of messages sent::
+
+        with sending(mail_template, messages) as result:
+            result['sent'] = connection.send_messages(messages)
+
+    When there are no receivers nothing is measured.
+    """
+    result = {'sent': 0}
+    sender = type(mail_template)
+    if not (pre_send.has_listeners(sender) or
+            post_send.has_listeners(sender)):
+        yield result
+        return
+    pre_send.send(sender=sender, mail_template=mail_template,
+                  messages=messages)
+    start = perf_counter()
+    error = None
+    try:
+        yield result
+    except Exception as e:
+        error = e
+        raise
+    finally:
+        duration = perf_counter() - start
+        post_send.send(
+            sender=sender, mail_template=mail_template, messages=messages,
+            sent=result['sent'] or 0, error=error,
+            size=sum(message_size(message) for message in messages),
+            durations={'transport': duration})
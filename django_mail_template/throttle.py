@@ -0,0 +1,236 @@
+# -*- coding: UTF-8 -*-
+"""
+Rate limits for sending mails.
+
+MAIL_TEMPLATE_RATE_LIMITS maps a sender address, a sender domain or ``'*'``
+(any other sender) to the messages per second allowed, or to a tuple (rate,
+burst) where burst is the amount of messages that can be sent at once::
+
+    MAIL_TEMPLATE_RATE_LIMITS = {
+        'news@example.com': (5, 10),
+        'example.com': 14,
+    }
+
+Limits are applied by MailTemplate.send_messages(), used by every bulk send
+method and by the mail queue workers, which hands messages to the backend in
+chunks of at most burst messages and waits for the limiter before each
+chunk.
+
+By default each process has its own token buckets. When
+MAIL_TEMPLATE_RATE_LIMIT_CACHE is the alias of a cache shared between
+processes (memcached, redis or database ones, not the local memory one)
+every process counts the messages sent in fixed windows in that cache, so
+the limit is shared by all of them.
+"""
+import asyncio
+import hashlib
+import threading
+import time
+from email.utils import parseaddr
+
+from django.core.cache import caches
+
+from django_mail_template.conf import app_settings
+
+
+class TokenBucket:
+    """
+    Token bucket local to the process, safe to be used from threads.
+
+    The bucket holds up to burst tokens and gets rate tokens per second.
+    Taking more tokens than available leaves the bucket in debt, and the
+    caller waits until the debt is paid, so the long term rate is kept for
+    any amount.
+    """
+
+    def __init__(self, rate, burst=None, clock=time.monotonic):
+        self.rate = float(rate)
+        self.burst = int(burst or max(1, round(self.rate)))
+        self.clock = clock
+        self._tokens = self.burst
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount=1):
+        """
+        Take amount tokens and return the seconds to wait before using them.
+        """
+        with self._lock:
+            now = self.clock()
+            self._tokens = min(
+                self.burst,
+                self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= amount
+            if self._tokens >= 0:
+                return 0
+            return -self._tokens / self.rate
+
+    def acquire(self, amount=1):
+        wait = self.reserve(amount)
+        if wait:
+            time.sleep(wait)
+        return wait
+
+    async def aacquire(self, amount=1):
+        wait = self.reserve(amount)
+        if wait:
+            await asyncio.sleep(wait)
+        return wait
+
+
+class CacheRateLimiter:
+    """
+    Rate limiter shared by processes through a Django cache.
+
+    Up to burst messages are allowed in each window of burst / rate seconds,
+    counted with cache.incr() in a key for each window. A caller whose
+    messages do not fit in the window gives them back with cache.decr() and
+    waits until the next one.
+    """
+    key_prefix = 'django_mail_template.rate.'
+
+    def __init__(self, name, rate, burst=None, cache_alias='default',
+                 clock=time.time):
+        self.rate = float(rate)
+        self.burst = int(burst or max(1, round(self.rate)))
+        self.window = self.burst / self.rate
+        self.cache_alias = cache_alias
+        self.clock = clock
+        digest = hashlib.md5(name.encode('utf-8')).hexdigest()
+        self.key_prefix = self.key_prefix + digest + '.'
+
+    @property
+    def cache(self):
+        return caches[self.cache_alias]
+
+    def _window(self):
+        now = self.clock()
+        number = int(now // self.window)
+        wait = (number + 1) * self.window - now
+        return self.key_prefix + str(number), wait
+
+    def _allowed(self, count, amount):
+        # A chunk larger than burst is allowed alone in an empty window, so
+        # it does not wait forever.
+        return count <= self.burst or count == amount
+
+    def reserve(self, amount=1):
+        """
+        Count amount messages in the current window and return 0, or the
+        seconds until the next window when it is full.
+        """
+        key, wait = self._window()
+        timeout = int(self.window) + 2
+        self.cache.add(key, 0, timeout)
+        try:
+            count = self.cache.incr(key, amount)
+        except ValueError:
+            # Expired between add() and incr().
+            self.cache.add(key, amount, timeout)
+            count = amount
+        if self._allowed(count, amount):
+            return 0
+        self.cache.decr(key, amount)
+        return wait
+
+    async def areserve(self, amount=1):
+        key, wait = self._window()
+        timeout = int(self.window) + 2
+        await self.cache.aadd(key, 0, timeout)
+        try:
+            count = await self.cache.aincr(key, amount)
+        except ValueError:
+            await self.cache.aadd(key, amount, timeout)
+            count = amount
+        if self._allowed(count, amount):
+            return 0
+        await self.cache.adecr(key, amount)
+        return wait
+
+    def acquire(self, amount=1):
+        waited = 0
+        while True:
+            wait = self.reserve(amount)
+            if not wait:
+                return waited
+            time.sleep(wait)
+            waited += wait
+
+    async def aacquire(self, amount=1):
+        waited = 0
+        while True:
+            wait = await self.areserve(amount)
+            if not wait:
+                return waited
+            await asyncio.sleep(wait)
+            waited += wait
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_limiter(from_email):
+    """
+    Return the rate limiter for a sender address, or None when there is no
+    limit for it in MAIL_TEMPLATE_RATE_LIMITS.
+
+    The limit of the address is used first, then the one of its domain and
+    then ``'*'``. Senders sharing a limit share the limiter.
+    """
+    limits = app_settings.RATE_LIMITS
+    if not limits:
+        return None
+    address = parseaddr(from_email or '')[1].lower()
+    domain = address.rpartition('@')[2]
+    for name in (address, domain, '*'):
+        if name and name in limits:
+            break
+    else:
+        return None
+    limit = limits[name]
+    rate, burst = limit if isinstance(limit, (tuple, list)) else (limit, None)
+    cache_alias = app_settings.RATE_LIMIT_CACHE
+    key = (name, rate, burst, cache_alias)
+    limiter = _limiters.get(key)
+    if limiter is None:
+        with _limiters_lock:
+            limiter = _limiters.get(key)
+            if limiter is None:
+                if cache_alias:
+                    limiter = CacheRateLimiter(name, rate, burst, cache_alias)
+                else:
+                    limiter = TokenBucket(rate, burst)
+                _limiters[key] = limiter
+    return limiter
+
+
+def throttled(from_email, messages):
+    """
+    Yield the messages in chunks of at most burst messages, waiting for the
+    rate limiter of from_email before each chunk. With no limit all the
+    messages are yielded at once.
+    """
+    limiter = get_limiter(from_email)
+    if limiter is None:
+        yield messages
+        return
+    for start in range(0, len(messages), limiter.burst):
+        chunk = messages[start:start + limiter.burst]
+        limiter.acquire(len(chunk))
+        yield chunk
+
+
+async def athrottled(from_email, messages):
+    """
+    Asynchronous version of throttled().
+    """
+    limiter = get_limiter(from_email)
+    if limiter is None:
+        yield messages
+        return
+    for start in range(0, len(messages), limiter.burst):
+        chunk = messages[start:start + limiter.burst]
+        await limiter.aacquire(len(chunk))
+        yield chunk
@@ -1,4 +1,19 @@
 # -*- coding: UTF-8 -*-
+import re
+from collections.abc import Mapping
+from functools import lru_cache
+from html import unescape
+from html.parser import HTMLParser
+from itertools import islice
+from string import Formatter
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.mail import get_connection
+from django.template import (Context, Engine, NodeList, TemplateSyntaxError,
+                             Variable)
+from django.template.base import FilterExpression, Node
+from django.template.defaulttags import ForNode, NowNode, WithNode
+from django.template.smartif import TokenBase
 from django.utils.translation import gettext_lazy as _
 from django.forms import EmailField, ValidationError
 
@@ -12,15 +27,455 @@ def replace_context_variable(text, context_variable):
     return text.format_map(Default(**context_variable))
 
 
+class LazyContext(Mapping):
+    """
+    Read only view of a context whose callable values are called when they
+    are first used, and their result kept for next uses.
+
+    So a value that is expensive to compute (for example with database
+    queries) can be given as a function, and it is computed only if subject
+    or body use it, and once for both. As in Django templates, callables with
+    a ``do_not_call_in_templates`` attribute set are not called.
+    """
+    __slots__ = ('_context', '_values')
+
+    def __init__(self, context):
+        self._context = context
+        self._values = {}
+
+    def __getitem__(self, key):
+        try:
+            return self._values[key]
+        except KeyError:
+            pass
+        value = self._context[key]
+        if callable(value) and \
+                not getattr(value, 'do_not_call_in_templates', False):
+            value = value()
+        self._values[key] = value
+        return value
+
+    def __contains__(self, key):
+        return key in self._values or key in self._context
+
+    def __iter__(self):
+        return iter(self._context)
+
+    def __len__(self):
+        return len(self._context)
+
+
+class _Defaulting:
+    # Mapping for str.format_map() leaving missing variables as they are,
+    # like Default, without copying the context.
+    __slots__ = ('context',)
+
+    def __init__(self, context):
+        self.context = context
+
+    def __getitem__(self, key):
+        if key in self.context:
+            return self.context[key]
+        return '{' + key + '}'
+
+
+_formatter = Formatter()
+
+
+class CompiledTemplate:
+    """
+    A text with context variables parsed once to be rendered many times.
+
+    Rendering gives the same result as replace_context_variable() but the
+    text is not parsed again: literal parts are kept in a list and only the
+    context variable positions are filled before joining it. Fields using
+    attributes, indexes, conversions or format specs (``{a.b}``,
+    ``{a!r}``, ``{a:>5}``) are rendered with format_map() to keep its exact
+    behaviour.
+
+    Parse errors are raised on creation, with the same ValueError
+    str.format_map() raises.
+    """
+    __slots__ = ('text', 'field_names', '_parts', '_fields')
+
+    #: The rendered text only depends on the context, see cache.RenderCache.
+    cacheable = True
+
+    def __init__(self, text):
+        self.text = text
+        self.field_names = set()
+        self._parts = []
+        self._fields = []
+        for literal, field_name, format_spec, conversion in \
+                _formatter.parse(text):
+            if literal:
+                self._parts.append(literal)
+            if field_name is None:
+                continue
+            if field_name.isidentifier() and not format_spec and \
+                    conversion is None:
+                self.field_names.add(field_name)
+                # Missing variables are left as they are, see Default.
+                self._fields.append((len(self._parts), field_name, None))
+                self._parts.append('{' + field_name + '}')
+            else:
+                source = field_name
+                if conversion is not None:
+                    source += '!' + conversion
+                if format_spec:
+                    source += ':' + format_spec
+                first = field_name.partition('.')[0].partition('[')[0]
+                if first.isidentifier():
+                    self.field_names.add(first)
+                self._fields.append((len(self._parts), None,
+                                     '{' + source + '}'))
+                self._parts.append('')
+
+    def render(self, context):
+        """
+        Return the text with context variables replaced.
+
+        :param context: A mapping with context variables.
+        """
+        parts = self._parts.copy()
+        default = None
+        for index, name, source in self._fields:
+            if source is None:
+                if name in context:
+                    parts[index] = format(context[name], '')
+            else:
+                if default is None:
+                    default = _Defaulting(context)
+                parts[index] = source.format_map(default)
+        return ''.join(parts)
+
+
+@lru_cache(maxsize=128)
+def compile_template(text):
+    """
+    Return a CompiledTemplate for a text.
+
+    Compiled templates are kept in a LRU cache keyed by the text itself, so
+    a text is parsed once however many times (and from however many
+    MailTemplate instances) it is rendered, and an edited text is never
+    rendered from a stale compilation.
+    """
+    return CompiledTemplate(text)
+
+
+@lru_cache(maxsize=1)
+def _get_engine():
+    # The engine configured in TEMPLATES, so its libraries and builtins can
+    # be used, or a default one.
+    try:
+        return Engine.get_default()
+    except ImproperlyConfigured:
+        return Engine()
+
+
+def _expressions(value):
+    # Yield the filter expressions kept in a node attribute.
+    if isinstance(value, FilterExpression):
+        yield value
+    elif isinstance(value, NodeList):
+        # Child nodes are visited by get_nodes_by_type().
+        pass
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            yield from _expressions(item)
+    elif isinstance(value, dict):
+        for item in value.values():
+            yield from _expressions(item)
+    elif isinstance(value, TokenBase):
+        # Conditions of {% if %} tags.
+        for name in ('value', 'first', 'second'):
+            yield from _expressions(getattr(value, name, None))
+
+
+def _is_cacheable(nodelist):
+    if nodelist.get_nodes_by_type(NowNode):
+        return False
+    for node in nodelist.get_nodes_by_type(Node):
+        for expression in _expressions(list(vars(node).values())):
+            if any(getattr(func, '__name__', None) == 'random'
+                   for func, _ in expression.filters):
+                return False
+    return True
+
+
+def _variable_names(nodelist):
+    names = set()
+    bound = {'forloop', 'block'}
+    for node in nodelist.get_nodes_by_type(Node):
+        if isinstance(node, ForNode):
+            bound.update(node.loopvars)
+        elif isinstance(node, WithNode):
+            bound.update(node.extra_context)
+        # Variables set with "as" ({% now "Y" as year %}, {% cycle %}...).
+        for name in ('asvar', 'variable_name', 'target_var', 'var_name'):
+            if isinstance(getattr(node, name, None), str):
+                bound.add(getattr(node, name))
+        for expression in _expressions(list(vars(node).values())):
+            variables = [expression.var] + [
+                arg for _, args in expression.filters for _, arg in args]
+            for variable in variables:
+                if isinstance(variable, Variable) and variable.lookups:
+                    names.add(variable.lookups[0])
+    return names - bound
+
+
+class DjangoTemplate:
+    """
+    A text written in the Django template language, parsed once to be
+    rendered many times.
+
+    It has the same interface as CompiledTemplate, so both can be rendered
+    (and cached, see cache.RenderCache) the same way. Loops, conditions and
+    filters can be used, and with autoescape values are HTML escaped.
+    Missing variables are rendered as the engine's string_if_invalid, as in
+    any Django template.
+
+    field_names holds the context variables used, without the ones set by
+    the template itself (loop variables, ``{% with %}``). cacheable is False
+    when the rendered text also depends on the time it is rendered
+    (``{% now %}`` or the ``random`` filter), so it is never taken from
+    cache.RenderCache.
+
+    Parse errors are raised on creation, as ValueError.
+    """
+    __slots__ = ('text', 'autoescape', 'field_names', 'cacheable',
+                 '_template')
+
+    def __init__(self, text, autoescape=True):
+        self.text = text
+        self.autoescape = autoescape
+        try:
+            self._template = _get_engine().from_string(text)
+        except TemplateSyntaxError as e:
+            raise ValueError(str(e)) from e
+        self.field_names = _variable_names(self._template.nodelist)
+        self.cacheable = _is_cacheable(self._template.nodelist)
+
+    def render(self, context):
+        """
+        Return the rendered text.
+
+        :param context: A mapping with context variables.
+        """
+        context = Context(context, autoescape=self.autoescape)
+        # Tags as {% now "Y" as year %} set variables in the top level
+        # mapping, which must be writable.
+        context.push()
+        return self._template.render(context)
+
+
+@lru_cache(maxsize=128)
+def compile_django_template(text, autoescape=True):
+    """
+    Return a DjangoTemplate for a text.
+
+    As with compile_template(), compiled templates are kept in a LRU cache
+    keyed by the text, so they are parsed once as with Django's cached
+    template loader, and a new revision of a text is compiled again.
+    """
+    return DjangoTemplate(text, autoescape)
+
+
+class _TextParser(HTMLParser):
+    block_tags = {'address', 'article', 'aside', 'blockquote', 'div', 'dl',
+                  'fieldset', 'figure', 'footer', 'form', 'h1', 'h2', 'h3',
+                  'h4', 'h5', 'h6', 'header', 'hr', 'main', 'nav', 'ol', 'p',
+                  'pre', 'section', 'table', 'tr', 'ul'}
+    skip_tags = {'head', 'script', 'style', 'title'}
+    # How literal braces are written for each engine.
+    braces = {
+        'format': {'{': '{{', '}': '}}'},
+        'django': {'{': '{% templatetag openbrace %}',
+                   '}': '{% templatetag closebrace %}'},
+    }
+
+    def __init__(self, engine='format'):
+        # Character references are converted by handle_charref() and
+        # handle_entityref() to escape braces.
+        super().__init__(convert_charrefs=False)
+        self.braces = self.braces[engine]
+        self.parts = []
+        self.skip = 0
+        self.pre = 0
+        self.links = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.skip_tags:
+            self.skip += 1
+        elif tag == 'pre':
+            self.pre += 1
+        if tag in self.block_tags:
+            self.parts.append('\n\n')
+        elif tag == 'br':
+            self.parts.append('\n')
+        elif tag == 'li':
+            self.parts.append('\n- ')
+        elif tag in ('td', 'th'):
+            self.parts.append(' ')
+        elif tag == 'img':
+            self.handle_data(dict(attrs).get('alt') or '')
+        elif tag == 'a':
+            self.links.append((dict(attrs).get('href'), len(self.parts)))
+
+    def handle_endtag(self, tag):
+        if tag in self.skip_tags:
+            self.skip = max(self.skip - 1, 0)
+        elif tag == 'pre':
+            self.pre = max(self.pre - 1, 0)
+        if tag in self.block_tags:
+            self.parts.append('\n\n')
+        elif tag == 'a' and self.links:
+            href, start = self.links.pop()
+            text = ''.join(self.parts[start:]).strip()
+            if href and href != text and not href.startswith('#'):
+                self.parts.append(' ({})'.format(href))
+
+    def handle_data(self, data):
+        if self.skip:
+            return
+        if not self.pre:
+            data = re.sub(r'\s+', ' ', data)
+        self.parts.append(data)
+
+    def handle_entityref(self, name):
+        self.handle_reference('&{};'.format(name))
+
+    def handle_charref(self, name):
+        self.handle_reference('&#{};'.format(name))
+
+    def handle_reference(self, reference):
+        # A brace written as a reference is a literal brace, not a context
+        # variable, so it is escaped as the template engine expects.
+        text = ''.join(self.braces.get(char, char)
+                       for char in unescape(reference))
+        self.handle_data(text)
+
+    def get_text(self):
+        lines = [line.strip(' ') for line in ''.join(self.parts).split('\n')]
+        return re.sub(r'\n{3,}', '\n\n', '\n'.join(lines)).strip()
+
+
+@lru_cache(maxsize=128)
+def html_to_text(html, engine='format'):
+    """
+    Return a plain text version of an HTML text.
+
+    Blocks are separated by blank lines, list items are prefixed with a dash
+    and links are followed by their URL. Context variables are kept, so the
+    result can be rendered with the same engine as the HTML text: braces
+    written as character references are escaped for compile_template(), or
+    for compile_django_template() when engine is ``'django'``. Results are
+    kept in a LRU cache keyed by the HTML text, so each body is converted
+    once.
+    """
+    parser = _TextParser(engine)
+    parser.feed(html)
+    parser.close()
+    return parser.get_text()
+
+
+def resolve_attribute(obj, path):
+    """
+    Return the value of an attribute of an object.
+
+    :param obj: Any object, for example a model instance.
+    :param path: An attribute name, a dotted path to follow attributes (for
+                 example ``'profile.city'``) or a callable receiving obj.
+                 When the value found is callable (for example a model method
+                 as ``'get_full_name'``) it is called without arguments.
+    """
+    if callable(path):
+        return path(obj)
+    value = obj
+    for name in path.split('.'):
+        value = getattr(value, name)
+        if callable(value):
+            value = value()
+    return value
+
+
+_email_field = EmailField()
+
+
+@lru_cache(maxsize=1024)
+def _clean_addresses(addresses):
+    # Receive the raw string (or a tuple) so it can be used as cache key.
+    if isinstance(addresses, str):
+        addresses = addresses.split(',')
+    return tuple(_email_field.clean(addr) for addr in addresses)
+
+
 def clean_address_list(addresses, field_name=None):
+    """
+    Return a list of validated email addresses.
+
+    Validated lists are kept in a LRU cache keyed by the raw value, so the
+    addresses stored in a MailTemplate are validated only once however many
+    mails are sent with it.
+
+    :param addresses: A string with comma separated email addresses, or a
+                      list of email addresses.
+    :param field_name: Name of the field used in the validation error.
+    :return: A new list on each call, so callers can change it.
+    """
     if (addresses is None or len(addresses) == 0) and field_name is None:
         return []
-    if not isinstance(addresses, list):
-        addresses = addresses.split(',')
-    field_ = EmailField()
+    if isinstance(addresses, list):
+        addresses = tuple(addresses)
+    elif not isinstance(addresses, str):
+        addresses = tuple(addresses.split(','))
     try:
-        return [field_.clean(addr) for addr in addresses]
+        return list(_clean_addresses(addresses))
     except ValidationError:
         raise ValidationError(_('Enter a valid comma separated '
                                 'list of email addresses for '
                                 'field {}.'.format(field_name)))
+
+
+def send_messages_in_batches(messages, batch_size, connection=None,
+                             fail_silently=False, send=None):
+    """
+    Send messages through one backend connection, batch_size at a time.
+
+    The connection is opened once before the first batch and closed after
+    the last one (only if it was opened here), so there is a single backend
+    handshake for the whole iterable. Messages are consumed lazily, so at
+    most batch_size of them are held in memory.
+
+    :param messages: An iterable of EmailMessage instances.
+    :param batch_size: Amount of messages for each send_messages() call.
+    :param connection: An optional email backend instance. If not given
+                       a new one is created with get_connection().
+    :param fail_silently: Passed to get_connection() when a connection is
+                          created.
+    :param send: An optional callable receiving the connection and a batch
+                 and returning the amount of messages sent, used instead of
+                 connection.send_messages().
+    :return: A generator yielding tuples (batch, sent) where batch is the list
+             of messages handed to the backend and sent the amount of them
+             reported as sent.
+    """
+    if batch_size < 1:
+        raise ValueError(_('Batch size must be a positive number.'))
+    if connection is None:
+        connection = get_connection(fail_silently=fail_silently)
+    messages = iter(messages)
+    new_connection = connection.open()
+    try:
+        while True:
+            batch = list(islice(messages, batch_size))
+            if not batch:
+                break
+            if send is None:
+                sent = connection.send_messages(batch)
+            else:
+                sent = send(connection, batch)
+            yield batch, sent or 0
+    finally:
+        if new_connection:
+            connection.close()
@@ -0,0 +1,37 @@
+# -*- coding: UTF-8 -*-
+from django_mail_template.cache import (mail_template_lookup_cache,
+                                        mail_template_revisions)
+from django_mail_template.models import Configuration
+
+
+def warm_up(processes=None):
+    """
+    Fill the caches used to send mails, so the first mails sent after the
+    process starts do not pay for database queries, template parsing and
+    address validation.
+
+    Every Configuration (or the ones of the given processes) is loaded with
+    its mail template in one query. The process to mail template mapping is
+    stored in the lookup cache (see MailTemplateLookupCache), the revisions
+    of the mail templates are published for the revision checks (see
+    RevisionCache) and each mail template is prepared (see
+    MailTemplate.prepare()).
+
+    :param processes: An optional iterable of process names.
+    :return: A tuple with the amount of processes and of mail templates
+             warmed up.
+    """
+    configurations = Configuration.objects.select_related('mail_template')
+    if processes is not None:
+        configurations = configurations.filter(process__in=list(processes))
+    mail_templates = {configuration.process: configuration.mail_template
+                      for configuration in configurations}
+    mail_template_lookup_cache.set_many(mail_templates)
+    prepared = {}
+    for mail_template in mail_templates.values():
+        if mail_template is not None and mail_template.pk not in prepared:
+            mail_template.prepare()
+            prepared[mail_template.pk] = mail_template
+    mail_template_revisions.publish_loaded(
+        {pk: mail_template.revision for pk, mail_template in prepared.items()})
+    return len(mail_templates), len(prepared)
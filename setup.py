@@ -18,9 +18,14 @@ setup(
                 'variables. There is a double mapping between a mail template '
                 'and process configuration so is possible to change used '
                 'mail template of a process at run time.',
+    python_requires='>=3.8',
     install_requires=[
+          'Django>=4.1',
           'django-ckeditor==6.0.0',
     ],
+    extras_require={
+          'async': ['aiosmtplib'],
+    },
     long_description=README,
     long_description_content_type='text/markdown',
     url='https://github.com/django-mail-template/master',
@@ -36,19 +41,20 @@ setup(
         # 'Development Status :: 7 - Inactive'
         'Environment :: Web Environment',
         'Framework :: Django',
-        'Framework :: Django :: 1.11',
-        'Framework :: Django :: 2.0',
-        'Framework :: Django :: 2.1',
-        'Framework :: Django :: 2.2',
-        'Framework :: Django :: 3.0',
+        'Framework :: Django :: 4.1',
+        'Framework :: Django :: 4.2',
+        'Framework :: Django :: 5.0',
+        'Framework :: Django :: 5.1',
+        'Framework :: Django :: 5.2',
         'Intended Audience :: Developers',
         'License :: OSI Approved :: BSD License',
         'Operating System :: OS Independent',
         'Programming Language :: Python',
-        'Programming Language :: Python :: 3.5',
-        'Programming Language :: Python :: 3.6',
-        'Programming Language :: Python :: 3.7',
         'Programming Language :: Python :: 3.8',
+        'Programming Language :: Python :: 3.9',
+        'Programming Language :: Python :: 3.10',
+        'Programming Language :: Python :: 3.11',
+        'Programming Language :: Python :: 3.12',
         'Topic :: Communications :: Email',
     ],
 )
@@ -1,13 +1,15 @@
 from unittest import TestCase as UnitTestCase
 from unittest.mock import patch, Mock
 
-from django.test import TestCase
+from django.core import mail
+from django.test import TestCase, override_settings
 from django.contrib import admin
 from django.contrib.auth import get_user_model
 from django.utils.translation import gettext as _
 
 from django_mail_template.admin import MailTemplateAdmin
-from django_mail_template.models import MailTemplate, Configuration
+from django_mail_template.models import (MailTemplate, Configuration,
+                                         QueuedMail, SentMail)
 
 
 class DjangoRegistrationAdminTest(TestCase):
@@ -20,6 +22,12 @@ class DjangoRegistrationAdminTest(TestCase):
         # Test the class
         self.assertTrue(admin.site._registry[Configuration])
 
+    def test_queued_mail_registry(self):
+        self.assertTrue(admin.site._registry[QueuedMail])
+
+    def test_sent_mail_registry(self):
+        self.assertTrue(admin.site._registry[SentMail])
+
 
 User = get_user_model()
 
@@ -32,6 +40,8 @@ class TestMailTemplateActionUnitTest(UnitTestCase):
         self.mail_template_1.to = ''
         self.mail_template_2 = Mock()
         self.mail_template_2.to = ''
+        self.mail_template_1.send_messages.return_value = 1
+        self.mail_template_2.send_messages.return_value = 1
         self.mock_queryset = [self.mail_template_1, self.mail_template_2]
         self.request = Mock()
 
@@ -83,19 +93,28 @@ class TestMailTemplateActionUnitTest(UnitTestCase):
         mock_message_user.assert_called_once_with(
             self.request, err_msg, mock_messages.ERROR)
 
-    def test_call_send_method_on_each_mail_template(self):
+    @patch('django_mail_template.admin.get_connection')
+    def test_send_each_mail_template_through_one_connection(
+            self, mock_get_connection
+    ):
         self.mail_template_1.to = 'a@b.com'
         self.mail_template_2.to = 'a@b.com'
         self.admin_mail_template.test_mail_template(
             self.request, self.mock_queryset)
-        self.mail_template_1.send.assert_called_once_with(context={})
-        self.mail_template_2.send.assert_called_once_with(context={})
+        connection = mock_get_connection.return_value
+        assert mock_get_connection.call_count == 1
+        assert connection.open.call_count == 1
+        assert connection.close.call_count == 1
+        for mail_template in self.mock_queryset:
+            mail_template.build_message.assert_called_once_with(context={})
+            mail_template.send_messages.assert_called_once_with(
+                connection, [mail_template.build_message.return_value])
 
     def test_method_catch_problems_when_sending_mail(self):
         self.mail_template_1.to = 'a@b.com'
-        self.mail_template_1.send.side_effect = Exception
+        self.mail_template_1.send_messages.side_effect = Exception
         self.mail_template_2.to = 'a@b.com'
-        self.mail_template_2.send.side_effect = Exception
+        self.mail_template_2.build_message.side_effect = Exception
         self.admin_mail_template.test_mail_template(
             self.request, self.mock_queryset)
 
@@ -108,7 +127,8 @@ class TestMailTemplateActionUnitTest(UnitTestCase):
                   "send it: An error occurred (<class 'Exception'>)."
         self.mail_template_1.title = 'Test title'
         self.mail_template_1.to = 'a@b.com'
-        self.mail_template_1.send.side_effect = Exception('An error occurred')
+        self.mail_template_1.send_messages.side_effect = Exception(
+            'An error occurred')
         self.admin_mail_template.test_mail_template(
             self.request, [self.mail_template_1])
         mock_message_user.assert_called_once_with(
@@ -170,3 +190,52 @@ class TestMailTemplateActionUnitTest(UnitTestCase):
             self.request, [mail_template])
         mock_message_user.assert_called_once_with(
             self.request, msg, mock_messages.ERROR)
+
+    @patch('django_mail_template.admin.messages')
+    @patch('django_mail_template.admin.admin.ModelAdmin.message_user')
+    @patch('django_mail_template.admin.get_connection')
+    def test_connection_errors_are_reported_for_each_mail_template(
+            self, mock_get_connection, mock_message_user, mock_messages
+    ):
+        mock_get_connection.return_value.open.side_effect = OSError('Down')
+        self.mail_template_1.to = 'a@b.com'
+        self.mail_template_2.to = 'a@b.com'
+        self.admin_mail_template.test_mail_template(
+            self.request, self.mock_queryset)
+        assert mock_message_user.call_count == 2
+        assert self.mail_template_1.send_messages.call_count == 0
+
+
+class TestMailTemplateActionQueue(TestCase):
+
+    def setUp(self) -> None:
+        self.admin_mail_template = admin.site._registry[MailTemplate]
+        self.mail_templates = [
+            MailTemplate.objects.create(
+                title='Test {}'.format(i), to='a@b.com', from_email='b@c.com',
+                subject='Subject {}'.format(i))
+            for i in range(3)]
+        self.request = Mock()
+
+    @override_settings(MAIL_TEMPLATE_ADMIN_QUEUE_THRESHOLD=2)
+    @patch('django_mail_template.admin.admin.ModelAdmin.message_user')
+    def test_large_selections_are_queued(self, mock_message_user):
+        self.admin_mail_template.test_mail_template(
+            self.request, MailTemplate.objects.all())
+        assert len(mail.outbox) == 0
+        assert set(QueuedMail.objects.values_list(
+            'mail_template', flat=True)) == {m.pk for m in self.mail_templates}
+        assert QueuedMail.objects.filter(context={}).count() == 3
+        msg = mock_message_user.call_args.args[1]
+        assert 'Amount of queued mails: 3.' in msg
+        assert '/admin/django_mail_template/queuedmail/' in msg
+
+    @override_settings(MAIL_TEMPLATE_ADMIN_QUEUE_THRESHOLD=3)
+    @patch('django_mail_template.admin.admin.ModelAdmin.message_user')
+    def test_small_selections_are_sent(self, mock_message_user):
+        self.admin_mail_template.test_mail_template(
+            self.request, MailTemplate.objects.all())
+        assert len(mail.outbox) == 3
+        assert not QueuedMail.objects.exists()
+        assert mock_message_user.call_args.args[1] == \
+            'Amount of sent mails: 3.'
@@ -0,0 +1,155 @@
+# -*- coding: UTF-8 -*-
+import asyncio
+from unittest.mock import patch, Mock, MagicMock, AsyncMock
+
+from django.core import mail
+from django.core.mail import EmailMessage
+from django.core.mail.backends.smtp import EmailBackend as SMTPBackend
+from django.test import TestCase, override_settings
+
+from django_mail_template.aio import asend_messages
+from django_mail_template.cache import (mail_template_lookup_cache,
+                                        mail_template_revisions)
+from django_mail_template.models import MailTemplate, Configuration
+
+
+class TestAsendMessages(TestCase):
+
+    async def test_send_with_backend_in_a_thread(self):
+        messages = [EmailMessage('Subject', 'Body', 'a@b.com', ['b@c.com'])
+                    for _ in range(2)]
+        assert await asend_messages(messages) == 2
+        assert len(mail.outbox) == 2
+
+    async def test_messages_without_recipients_are_not_sent(self):
+        connection = Mock()
+        messages = [EmailMessage('Subject', 'Body', 'a@b.com')]
+        assert await asend_messages(messages, connection=connection) == 0
+        assert connection.send_messages.call_count == 0
+
+    async def test_send_with_aiosmtplib_for_smtp_backend(self):
+        aiosmtplib = MagicMock()
+        smtp = aiosmtplib.SMTP.return_value
+        smtp.__aenter__ = AsyncMock(return_value=smtp)
+        smtp.__aexit__ = AsyncMock(return_value=False)
+        smtp.login = AsyncMock()
+        smtp.sendmail = AsyncMock()
+        connection = SMTPBackend(host='smtp.b.com', port=25,
+                                 username='user', password='secret')
+        messages = [EmailMessage('Subject', 'Body', 'a@b.com', ['b@c.com'])
+                    for _ in range(3)]
+        with patch('django_mail_template.aio.aiosmtplib', aiosmtplib):
+            assert await asend_messages(messages, connection=connection) == 3
+        assert aiosmtplib.SMTP.call_count == 1
+        assert aiosmtplib.SMTP.call_args.kwargs['hostname'] == 'smtp.b.com'
+        smtp.login.assert_awaited_once_with('user', 'secret')
+        assert smtp.sendmail.await_count == 3
+        assert smtp.sendmail.await_args.args[:2] == ('a@b.com', ['b@c.com'])
+
+
+class TestAsendMailTemplate(TestCase):
+
+    def setUp(self) -> None:
+        self.mail = MailTemplate(from_email='a@b.com',
+                                 subject='Hello {name}',
+                                 body='Dear {name}', to='b@c.com')
+
+    async def test_asend(self):
+        assert await self.mail.asend({'name': 'Ana'}) == 1
+        assert mail.outbox[0].subject == 'Hello Ana'
+
+    async def test_asend_renders_in_a_thread(self):
+        # Lazy context values can query the database.
+        self.mail.subject = 'Processes: {n}'
+        assert await self.mail.asend(
+            {'n': lambda: Configuration.objects.count()}) == 1
+        assert mail.outbox[0].subject == 'Processes: 0'
+
+    async def test_asend_many(self):
+        contexts = [{'name': str(i)} for i in range(5)]
+        results = await self.mail.asend_many(contexts, batch_size=2)
+        assert results == [1] * 5
+        assert sorted(m.subject for m in mail.outbox) == \
+            ['Hello {}'.format(i) for i in range(5)]
+
+    async def test_asend_many_limit_concurrency(self):
+        running = []
+        max_running = []
+
+        async def fake_asend_messages(messages, **kwargs):
+            running.append(1)
+            max_running.append(len(running))
+            await asyncio.sleep(0)
+            running.pop()
+            return len(messages)
+
+        with patch('django_mail_template.models.asend_messages',
+                   fake_asend_messages):
+            results = await self.mail.asend_many(
+                [{}] * 10, batch_size=1, concurrency=3)
+        assert results == [1] * 10
+        assert max(max_running) == 3
+
+    async def test_asend_many_report_failed_batches(self):
+        with patch('django_mail_template.models.asend_messages',
+                   AsyncMock(side_effect=[2, 1])):
+            results = await self.mail.asend_many([{}] * 4, batch_size=2,
+                                                 concurrency=1)
+        assert results == [1, 1, 0, 0]
+
+    async def test_asend_many_renders_each_batch_when_it_is_sent(self):
+        consumed = []
+
+        def contexts():
+            for i in range(6):
+                consumed.append(i)
+                yield {'name': str(i)}
+
+        async def fake_asend_messages(messages, **kwargs):
+            assert len(consumed) <= 2 * len(running) + 2
+            running.append(messages)
+            return len(messages)
+
+        running = []
+        with patch('django_mail_template.models.asend_messages',
+                   fake_asend_messages):
+            results = await self.mail.asend_many(contexts(), batch_size=2,
+                                                 concurrency=1)
+        assert results == [1] * 6
+        assert [m.subject for batch in running for m in batch] == [
+            'Hello {}'.format(i) for i in range(6)]
+
+    async def test_asend_many_render_errors(self):
+        self.mail.subject = 'Hello {name'
+        with self.assertRaises(ValueError):
+            await self.mail.asend_many([{}] * 3, batch_size=1)
+        assert mail.outbox == []
+
+
+class TestAgetMailTemplate(TestCase):
+
+    async def test_aget_mail_template(self):
+        mail_template = await MailTemplate.objects.acreate(
+            title='Greeting', subject='Hello', from_email='a@b.com')
+        await Configuration.objects.acreate(process='greeting',
+                                            mail_template=mail_template)
+        assert await Configuration.aget_mail_template(
+            'greeting') == mail_template
+        assert await Configuration.aget_mail_template('unknown') is None
+
+    @override_settings(MAIL_TEMPLATE_REVISION_CHECK_INTERVAL=60)
+    async def test_stale_mail_templates_are_discarded(self):
+        mail_template = await MailTemplate.objects.acreate(
+            title='Greeting', subject='Hello', from_email='a@b.com')
+        await Configuration.objects.acreate(process='greeting',
+                                            mail_template=mail_template)
+        await Configuration.aget_mail_template('greeting')
+        # Another process saves the mail template.
+        await MailTemplate.objects.filter(pk=mail_template.pk).aupdate(
+            subject='Bye', revision=2)
+        mail_template_revisions.publish(mail_template.pk, 2)
+        mail_template_lookup_cache.cache.delete(
+            mail_template_lookup_cache.make_key('greeting'))
+        mail_template_lookup_cache._checked = 0
+        mail_template = await Configuration.aget_mail_template('greeting')
+        assert mail_template.subject == 'Bye'
@@ -1,6 +1,11 @@
+from unittest.mock import patch
+
 from django.apps import apps
-from django.test import TestCase
+from django.core.signals import request_started
+from django.db import DatabaseError
+from django.test import TestCase, override_settings
 from django_mail_template.apps import DjangoMailTemplateConfig
+from django_mail_template.models import Configuration, MailTemplate
 
 
 class DjangoMailTemplateConfigTest(TestCase):
@@ -14,3 +19,31 @@ class DjangoMailTemplateConfigTest(TestCase):
         # Test the app
         self.assertEqual(apps.get_app_config('django_mail_template').name,
                          'django_mail_template')
+
+    @override_settings(MAIL_TEMPLATE_WARM_UP=True)
+    def test_warm_up_on_first_request(self):
+        config = apps.get_app_config('django_mail_template')
+        with patch('django_mail_template.warmup.warm_up') as warm_up:
+            config.ready()
+            warm_up.assert_not_called()
+            request_started.send(sender=self.__class__)
+            request_started.send(sender=self.__class__)
+        warm_up.assert_called_once_with()
+
+    @override_settings(MAIL_TEMPLATE_WARM_UP=True)
+    def test_warm_up_fills_caches(self):
+        mail_template = MailTemplate.objects.create(
+            title='Greeting', subject='Hello', from_email='a@b.com')
+        Configuration.objects.create(process='greeting',
+                                     mail_template=mail_template)
+        apps.get_app_config('django_mail_template').ready()
+        request_started.send(sender=self.__class__)
+        with self.assertNumQueries(0):
+            assert Configuration.get_mail_template(
+                'greeting') == mail_template
+
+    def test_warm_up_without_tables(self):
+        config = apps.get_app_config('django_mail_template')
+        with patch('django_mail_template.warmup.warm_up',
+                   side_effect=DatabaseError):
+            config.warm_up()
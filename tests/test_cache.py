@@ -0,0 +1,442 @@
+# -*- coding: UTF-8 -*-
+import datetime
+from decimal import Decimal
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.db import IntegrityError, transaction
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from django.utils.functional import lazy
+from django.utils.translation import get_language, override
+
+from django_mail_template.cache import (RenderCache,
+                                        mail_template_lookup_cache,
+                                        mail_template_revisions,
+                                        render_cache)
+from django_mail_template.models import MailTemplate, Configuration
+from django_mail_template.tools import (CompiledTemplate, compile_template,
+                                        compile_django_template)
+
+
+class TestMailTemplateLookupCache(TestCase):
+
+    def setUp(self) -> None:
+        self.mail_template = MailTemplate.objects.create(
+            title='Greeting', subject='Hello {name}', from_email='a@b.com')
+        self.configuration = Configuration.objects.create(
+            process='greeting', mail_template=self.mail_template)
+        mail_template_lookup_cache.clear()
+
+    def test_first_lookup_uses_one_query(self):
+        with self.assertNumQueries(1):
+            mail_template = Configuration.get_mail_template('greeting')
+            self.assertEqual(mail_template.title, 'Greeting')
+
+    def test_next_lookups_do_not_query(self):
+        Configuration.get_mail_template('greeting')
+        with self.assertNumQueries(0):
+            mail_template = Configuration.get_mail_template('greeting')
+        assert mail_template == self.mail_template
+
+    def test_shared_cache_is_used_when_local_level_is_empty(self):
+        Configuration.get_mail_template('greeting')
+        mail_template_lookup_cache.clear()
+        with self.assertNumQueries(0):
+            assert Configuration.get_mail_template(
+                'greeting') == self.mail_template
+
+    def test_process_without_mail_template_is_cached(self):
+        assert Configuration.get_mail_template('unknown') is None
+        with self.assertNumQueries(0):
+            assert Configuration.get_mail_template('unknown') is None
+
+    def test_lookup_returns_a_copy(self):
+        mail_template = Configuration.get_mail_template('greeting')
+        mail_template.to = 'changed@b.com'
+        assert Configuration.get_mail_template('greeting').to is None
+
+    def test_entries_expire(self):
+        with patch('django_mail_template.cache.time.monotonic',
+                   return_value=0):
+            Configuration.get_mail_template('greeting')
+        # Avoid signal invalidation to check expiration.
+        Configuration.objects.filter(pk=self.configuration.pk).update(
+            mail_template=None)
+        mail_template_lookup_cache.cache.clear()
+        with patch('django_mail_template.cache.time.monotonic',
+                   return_value=301):
+            assert Configuration.get_mail_template('greeting') is None
+
+    def test_local_level_expires_before_shared_level(self):
+        with patch('django_mail_template.cache.time.monotonic',
+                   return_value=1000):
+            Configuration.get_mail_template('greeting')
+        # Another process changes the configuration: its receivers only
+        # clear the shared level.
+        Configuration.objects.filter(pk=self.configuration.pk).update(
+            mail_template=None)
+        mail_template_lookup_cache.cache.delete(
+            mail_template_lookup_cache.make_key('greeting'))
+        with patch('django_mail_template.cache.time.monotonic',
+                   return_value=1029):
+            assert Configuration.get_mail_template('greeting') == \
+                self.mail_template
+        with patch('django_mail_template.cache.time.monotonic',
+                   return_value=1031):
+            assert Configuration.get_mail_template('greeting') is None
+
+    def test_mail_templates_saved_by_other_processes_are_discarded(self):
+        with patch('django_mail_template.cache.time.monotonic',
+                   return_value=1000):
+            Configuration.get_mail_template('greeting')
+        # Another process saves the mail template.
+        MailTemplate.objects.filter(pk=self.mail_template.pk).update(
+            subject='Bye', revision=2)
+        mail_template_revisions.publish(self.mail_template.pk, 2)
+        mail_template_lookup_cache.cache.delete(
+            mail_template_lookup_cache.make_key('greeting'))
+        with patch('django_mail_template.cache.time.monotonic',
+                   return_value=1006):
+            assert Configuration.get_mail_template('greeting').subject == \
+                'Bye'
+
+    @override_settings(MAIL_TEMPLATE_CACHE_TIMEOUT=0)
+    def test_cache_can_be_disabled(self):
+        Configuration.get_mail_template('greeting')
+        with self.assertNumQueries(1):
+            Configuration.get_mail_template('greeting')
+
+    def test_configuration_save_invalidates(self):
+        Configuration.get_mail_template('greeting')
+        self.configuration.mail_template = None
+        with self.captureOnCommitCallbacks(execute=True):
+            self.configuration.save()
+        assert Configuration.get_mail_template('greeting') is None
+
+    def test_configuration_rename_invalidates(self):
+        Configuration.get_mail_template('greeting')
+        configuration = Configuration.objects.get(pk=self.configuration.pk)
+        configuration.process = 'welcome'
+        with self.captureOnCommitCallbacks(execute=True):
+            configuration.save()
+        assert Configuration.get_mail_template('greeting') is None
+        assert Configuration.get_mail_template(
+            'welcome') == self.mail_template
+
+    def test_configuration_delete_invalidates(self):
+        Configuration.get_mail_template('greeting')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.configuration.delete()
+        assert Configuration.get_mail_template('greeting') is None
+
+    def test_mail_template_save_invalidates(self):
+        Configuration.get_mail_template('greeting')
+        self.mail_template.subject = 'Bye {name}'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.mail_template.save()
+        assert Configuration.get_mail_template(
+            'greeting').subject == 'Bye {name}'
+
+    def test_rolled_back_changes_do_not_invalidate(self):
+        Configuration.get_mail_template('greeting')
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with self.assertRaises(IntegrityError):
+                with transaction.atomic():
+                    self.mail_template.subject = 'Bye {name}'
+                    self.mail_template.save()
+                    raise IntegrityError
+        assert callbacks == []
+        with self.assertNumQueries(0):
+            assert Configuration.get_mail_template(
+                'greeting').subject == 'Hello {name}'
+
+    def test_mail_template_delete_invalidates(self):
+        Configuration.get_mail_template('greeting')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.mail_template.delete()
+        assert Configuration.get_mail_template('greeting') is None
+
+
+class TestGetMailTemplates(TestCase):
+
+    def setUp(self) -> None:
+        self.greeting = MailTemplate.objects.create(
+            title='Greeting', subject='Hello', from_email='a@b.com')
+        self.bye = MailTemplate.objects.create(
+            title='Bye', subject='Bye', from_email='a@b.com')
+        Configuration.objects.create(process='greeting',
+                                     mail_template=self.greeting)
+        Configuration.objects.create(process='bye', mail_template=self.bye)
+        Configuration.objects.create(process='none')
+        mail_template_lookup_cache.clear()
+
+    def test_processes_are_loaded_in_one_query(self):
+        with self.assertNumQueries(1):
+            mail_templates = Configuration.get_mail_templates(
+                ['greeting', 'bye', 'none', 'unknown', 'bye'])
+        assert mail_templates == {'greeting': self.greeting,
+                                  'bye': self.bye, 'none': None,
+                                  'unknown': None}
+        with self.assertNumQueries(0):
+            Configuration.get_mail_templates(['greeting', 'unknown'])
+            assert Configuration.get_mail_template('bye') == self.bye
+
+    def test_only_missing_processes_are_loaded(self):
+        Configuration.get_mail_template('greeting')
+        Configuration.get_mail_template('bye')
+        mail_template_lookup_cache.clear()
+        Configuration.get_mail_template('bye')
+        with patch.object(Configuration, '_load_mail_templates',
+                          wraps=Configuration._load_mail_templates) as load:
+            mail_templates = Configuration.get_mail_templates(
+                ['greeting', 'bye', 'none'])
+        load.assert_called_once_with(['none'])
+        assert mail_templates['greeting'] == self.greeting
+        assert mail_templates['greeting'] is not \
+            Configuration.get_mail_templates(['greeting'])['greeting']
+
+    @override_settings(MAIL_TEMPLATE_CACHE_TIMEOUT=0)
+    def test_cache_disabled(self):
+        with self.assertNumQueries(1):
+            Configuration.get_mail_templates(['greeting', 'none'])
+        with self.assertNumQueries(0):
+            assert Configuration.get_mail_templates([]) == {}
+
+    def test_process_is_unique(self):
+        with self.assertRaises(IntegrityError):
+            Configuration.objects.create(process='bye')
+
+
+class TestRenderCache(TestCase):
+
+    def setUp(self) -> None:
+        self.cache = RenderCache(maxsize=3, max_bytes=100)
+        self.compiled = compile_template('Hello {name}')
+
+    def test_same_values_are_rendered_once(self):
+        with patch.object(CompiledTemplate, 'render',
+                          autospec=True, return_value='Hello Ana') as render:
+            for other in range(3):
+                text = self.cache.render(self.compiled,
+                                         {'name': 'Ana', 'other': other})
+        assert text == 'Hello Ana'
+        assert render.call_count == 1
+        assert self.cache.stats() == {'hits': 2, 'misses': 1, 'entries': 1,
+                                      'bytes': 9}
+
+    def test_values_of_different_types(self):
+        assert self.cache.render(self.compiled, {'name': 1}) == 'Hello 1'
+        assert self.cache.render(self.compiled, {'name': True}) == \
+            'Hello True'
+        assert self.cache.render(self.compiled, {}) == 'Hello {name}'
+
+    def test_objects_are_compared_by_identity(self):
+        names = [1]
+        assert self.cache.render(self.compiled, {'name': names}) == \
+            'Hello [1]'
+        assert self.cache.render(self.compiled, {'name': names}) == \
+            'Hello [1]'
+        assert self.cache.hits == 1
+        # Equal objects, as model instances with the same primary key, are
+        # not rendered from the cache.
+        compiled = compile_template('Hi {user.first_name}')
+        user = get_user_model()(pk=1, first_name='Ana')
+        assert self.cache.render(compiled, {'user': user}) == 'Hi Ana'
+        user = get_user_model()(pk=1, first_name='Bob')
+        assert self.cache.render(compiled, {'user': user}) == 'Hi Bob'
+
+    def test_equal_values_rendered_differently(self):
+        compiled = compile_template('Total: {amount} at {when}')
+        utc = datetime.timezone.utc
+        one = datetime.timezone(datetime.timedelta(hours=1))
+        assert self.cache.render(compiled, {
+            'amount': Decimal('1.0'),
+            'when': datetime.datetime(2020, 1, 1, 12, tzinfo=utc)}) == \
+            'Total: 1.0 at 2020-01-01 12:00:00+00:00'
+        assert self.cache.render(compiled, {
+            'amount': Decimal('1.00'),
+            'when': datetime.datetime(2020, 1, 1, 13, tzinfo=one)}) == \
+            'Total: 1.00 at 2020-01-01 13:00:00+01:00'
+        assert self.cache.render(self.compiled, {'name': 0.0}) == \
+            'Hello 0.0'
+        assert self.cache.render(self.compiled, {'name': -0.0}) == \
+            'Hello -0.0'
+        assert self.cache.hits == 0
+
+    def test_lazy_values_in_the_active_language(self):
+        name = lazy(get_language, str)()
+        with override('en'):
+            assert self.cache.render(self.compiled, {'name': name}) == \
+                'Hello en'
+        with override('es'):
+            assert self.cache.render(self.compiled, {'name': name}) == \
+                'Hello es'
+            assert self.cache.render(self.compiled, {'name': name}) == \
+                'Hello es'
+        assert self.cache.hits == 1
+
+    def test_django_templates_in_the_active_time_zone(self):
+        compiled = compile_django_template('{{ when|time:"H:i" }}')
+        when = datetime.datetime(2020, 1, 1, 12,
+                                 tzinfo=datetime.timezone.utc)
+        with timezone.override('UTC'):
+            assert self.cache.render(compiled, {'when': when}) == '12:00'
+        with timezone.override('Europe/Madrid'):
+            assert self.cache.render(compiled, {'when': when}) == '13:00'
+        assert self.cache.hits == 0
+
+    def test_django_templates_using_now_are_not_cached(self):
+        compiled = compile_django_template('{% now "U" %} {{ name }}')
+        assert not compiled.cacheable
+        assert compile_django_template('{{ items|random }}').cacheable \
+            is False
+        assert compile_django_template('{{ name|upper }}').cacheable
+        with patch('django.template.defaulttags.datetime') as now:
+            now.now.return_value = datetime.datetime(2020, 1, 1)
+            first = self.cache.render(compiled, {'name': 'Ana'})
+            now.now.return_value = datetime.datetime(2021, 1, 1)
+            assert self.cache.render(compiled, {'name': 'Ana'}) != first
+        assert self.cache.stats()['entries'] == 0
+
+    def test_edited_text_is_not_rendered_from_cache(self):
+        self.cache.render(self.compiled, {'name': 'Ana'})
+        compiled = compile_template('Bye {name}')
+        assert self.cache.render(compiled, {'name': 'Ana'}) == 'Bye Ana'
+
+    def test_limits(self):
+        for name in ['Ana', 'Eva', 'Noa', 'Pía']:
+            self.cache.render(self.compiled, {'name': name})
+        assert self.cache.stats()['entries'] == 3
+        self.cache.render(self.compiled, {'name': 'Ana'})
+        assert self.cache.misses == 5
+        self.cache.render(self.compiled, {'name': 'x' * 90})
+        assert self.cache.stats()['entries'] == 1
+        self.cache.render(self.compiled, {'name': 'x' * 100})
+        assert self.cache.stats()['entries'] == 1
+        assert self.cache.bytes == 96
+        self.cache.clear()
+        assert self.cache.stats() == {'hits': 0, 'misses': 0, 'entries': 0,
+                                      'bytes': 0}
+
+    @override_settings(MAIL_TEMPLATE_RENDER_CACHE=True)
+    def test_build_message_uses_render_cache(self):
+        mail_template = MailTemplate.objects.create(
+            title='Digest', subject='News for {group}', from_email='a@b.com',
+            body='<p>{news}</p>', to='b@c.com')
+        render_cache.clear()
+        for member in ['Ana', 'Eva']:
+            message = mail_template.build_message(
+                {'group': 'Admins', 'news': 'Hi', 'member': member})
+        assert message.subject == 'News for Admins'
+        assert render_cache.stats()['hits'] == 3
+        assert render_cache.stats()['misses'] == 3
+        render_cache.clear()
+
+
+class TestRevisions(TestCase):
+
+    def setUp(self) -> None:
+        with self.captureOnCommitCallbacks(execute=True):
+            self.mail_template = MailTemplate.objects.create(
+                title='Greeting', subject='Hello {name}',
+                from_email='a@b.com')
+        Configuration.objects.create(process='greeting',
+                                     mail_template=self.mail_template)
+        mail_template_lookup_cache.clear()
+
+    def test_revision_is_increased_on_save(self):
+        assert self.mail_template.revision == 1
+        self.mail_template.save()
+        assert self.mail_template.revision == 2
+        self.mail_template.save(update_fields=['title'])
+        self.mail_template.refresh_from_db()
+        assert self.mail_template.revision == 3
+
+    def test_concurrent_saves_get_different_revisions(self):
+        other = MailTemplate.objects.get(pk=self.mail_template.pk)
+        self.mail_template.save()
+        other.save()
+        assert (self.mail_template.revision, other.revision) == (2, 3)
+
+    def test_cache_key(self):
+        key = self.mail_template.get_cache_key('text')
+        assert key == 'django_mail_template:{}:1:text'.format(
+            self.mail_template.pk)
+        self.mail_template.save()
+        assert self.mail_template.get_cache_key('text') != key
+
+    def test_revisions_are_published(self):
+        pk = self.mail_template.pk
+        assert mail_template_revisions.get_many([pk]) == {pk: 1}
+        with self.captureOnCommitCallbacks(execute=True):
+            self.mail_template.save()
+        assert mail_template_revisions.get_many([pk]) == {pk: 2}
+        with self.captureOnCommitCallbacks(execute=True):
+            self.mail_template.delete()
+        assert mail_template_revisions.get_many([pk]) == {}
+
+    def test_rolled_back_revisions_are_not_published(self):
+        pk = self.mail_template.pk
+        with self.captureOnCommitCallbacks(execute=True):
+            with self.assertRaises(IntegrityError):
+                with transaction.atomic():
+                    self.mail_template.save()
+                    raise IntegrityError
+        assert mail_template_revisions.get_many([pk]) == {pk: 1}
+
+    def test_missing_revisions_are_loaded_once(self):
+        pk = self.mail_template.pk
+        mail_template_revisions.forget(pk)
+        with self.assertNumQueries(1):
+            assert mail_template_revisions.get_many(
+                [pk, 0], MailTemplate.get_revisions) == {pk: 1}
+        with self.assertNumQueries(0):
+            assert mail_template_revisions.get_many([pk]) == {pk: 1}
+
+    def test_stale(self):
+        other = MailTemplate.objects.get(pk=self.mail_template.pk)
+        deleted = MailTemplate.objects.create(
+            title='Bye', subject='Bye', from_email='a@b.com')
+        MailTemplate.objects.get(pk=deleted.pk).delete()
+        assert mail_template_revisions.stale([self.mail_template, other]) == []
+        with self.captureOnCommitCallbacks(execute=True):
+            other.save()
+        with self.assertNumQueries(1):
+            assert mail_template_revisions.stale(
+                [self.mail_template, other, deleted],
+                MailTemplate.get_revisions) == [self.mail_template, deleted]
+
+    @override_settings(MAIL_TEMPLATE_REVISION_CHECK_INTERVAL=60)
+    def test_lookups_discard_mail_templates_saved_by_other_processes(self):
+        Configuration.get_mail_template('greeting')
+        # Another process saves the mail template: its receivers do not run
+        # in this one.
+        MailTemplate.objects.filter(pk=self.mail_template.pk).update(
+            subject='Bye', revision=2)
+        mail_template_revisions.publish(self.mail_template.pk, 2)
+        mail_template_lookup_cache.cache.delete(
+            mail_template_lookup_cache.make_key('greeting'))
+        # As if the interval had elapsed since the first lookup.
+        mail_template_lookup_cache._checked = 0
+        with self.assertNumQueries(1):
+            assert Configuration.get_mail_template('greeting').subject == \
+                'Bye'
+        with self.assertNumQueries(0):
+            Configuration.get_mail_templates(['greeting'])
+
+    @override_settings(MAIL_TEMPLATE_REVISION_CHECK_INTERVAL=0)
+    def test_discard_stale_interval(self):
+        Configuration.get_mail_template('greeting')
+        mail_template_revisions.publish(self.mail_template.pk, 5)
+        mail_template_lookup_cache.cache.delete(
+            mail_template_lookup_cache.make_key('greeting'))
+        mail_template_lookup_cache.discard_stale(MailTemplate.get_revisions,
+                                                 interval=60)
+        with self.assertNumQueries(1):
+            Configuration.get_mail_template('greeting')
+        # Still stale, but checked less than 60 seconds ago.
+        mail_template_lookup_cache.discard_stale(MailTemplate.get_revisions,
+                                                 interval=60)
+        with self.assertNumQueries(0):
+            Configuration.get_mail_template('greeting')
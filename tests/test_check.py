@@ -0,0 +1,74 @@
+# -*- coding: UTF-8 -*-
+import json
+import tempfile
+from io import StringIO
+from unittest.mock import patch
+
+from django.core import mail
+from django.core.management import call_command, CommandError
+from django.test import TestCase
+
+from django_mail_template.models import MailTemplate, Configuration
+
+
+class TestMailTemplateCheckCommand(TestCase):
+
+    def setUp(self) -> None:
+        self.mail_template = MailTemplate.objects.create(
+            title='Greeting', subject='Hello {name}', from_email='a@b.com',
+            body='<p>Dear {name} from {city}</p>', to='b@c.com')
+        Configuration.objects.create(process='greeting',
+                                     mail_template=self.mail_template)
+
+    def check(self, *args, contexts=None):
+        out = StringIO()
+        with tempfile.NamedTemporaryFile('w', suffix='.json') as f:
+            if contexts is not None:
+                f.write(contexts)
+                f.flush()
+                args += ('--contexts', f.name)
+            call_command('mail_template_check', *args, stdout=out)
+        return out.getvalue()
+
+    def test_contexts_list(self):
+        contexts = json.dumps([{'name': 'Ana', 'city': 'Rome'},
+                               {'name': 'Eva'}])
+        assert self.check('greeting', contexts=contexts) == (
+            'Context 2: missing city\n'
+            'Checked: 2, with missing variables: 1, with errors: 0.\n')
+        assert mail.outbox == []
+
+    def test_contexts_lines(self):
+        contexts = '{"name": "Ana", "city": "Rome"}\n\n{"name": "Eva"}\n'
+        output = self.check('--id', str(self.mail_template.pk),
+                            contexts=contexts)
+        assert 'Checked: 2, with missing variables: 1' in output
+
+    def test_contexts_from_stdin(self):
+        with patch('sys.stdin', StringIO('[{"name": "Ana", "city": "R"}]')):
+            assert self.check('greeting', '--contexts', '-') == \
+                'Checked: 1, with missing variables: 0, with errors: 0.\n'
+
+    def test_without_contexts(self):
+        assert self.check('greeting').startswith(
+            'Context 1: missing city, name\n')
+
+    def test_strict(self):
+        with self.assertRaises(CommandError):
+            self.check('greeting', '--strict')
+
+    def test_errors(self):
+        self.mail_template.subject = 'Hello {name'
+        self.mail_template.save()
+        with self.assertRaises(CommandError):
+            self.check('greeting')
+
+    def test_invalid_arguments(self):
+        with self.assertRaises(CommandError):
+            self.check()
+        with self.assertRaises(CommandError):
+            self.check('unknown')
+        with self.assertRaises(CommandError):
+            self.check('--id', '0')
+        with self.assertRaises(CommandError):
+            self.check('greeting', contexts='[{')
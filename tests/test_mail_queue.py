@@ -0,0 +1,188 @@
+# -*- coding: UTF-8 -*-
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import Mock
+
+from django.core import mail
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from django_mail_template.mail_queue import (claim_queued_mails,
+                                             process_queue,
+                                             send_queued_mails)
+from django_mail_template.models import MailTemplate, QueuedMail
+
+
+class TestEnqueue(TestCase):
+
+    def setUp(self) -> None:
+        self.mail_template = MailTemplate.objects.create(
+            title='Greeting', subject='Hello {name}', from_email='a@b.com',
+            to='b@c.com')
+
+    def test_enqueue_create_pending_queued_mail(self):
+        queued_mail = self.mail_template.enqueue({'name': 'Ana'})
+        queued_mail.refresh_from_db()
+        assert queued_mail.status == QueuedMail.PENDING
+        assert queued_mail.context == {'name': 'Ana'}
+        assert queued_mail.mail_template == self.mail_template
+        assert mail.outbox == []
+
+    def test_enqueue_invalid_context(self):
+        with self.assertRaises(ValueError):
+            self.mail_template.enqueue('fake-context')
+
+
+class TestProcessQueue(TestCase):
+
+    def setUp(self) -> None:
+        self.mail_template = MailTemplate.objects.create(
+            title='Greeting', subject='Hello {name}', from_email='a@b.com',
+            to='b@c.com')
+
+    def test_send_queued_mails(self):
+        for name in ['Ana', 'Bob']:
+            self.mail_template.enqueue({'name': name})
+        assert process_queue() == (2, 0)
+        assert [m.subject for m in mail.outbox] == ['Hello Ana', 'Hello Bob']
+        assert QueuedMail.objects.filter(status=QueuedMail.SENT,
+                                         sent__isnull=False).count() == 2
+        assert process_queue() == (0, 0)
+
+    def test_claim_batch_size(self):
+        for _ in range(3):
+            self.mail_template.enqueue()
+        assert len(claim_queued_mails(2)) == 2
+        assert len(claim_queued_mails(2)) == 1
+        assert QueuedMail.objects.filter(
+            status=QueuedMail.SENDING).count() == 3
+
+    def test_claim_mails_ready_only(self):
+        queued_mail = self.mail_template.enqueue()
+        queued_mail.next_attempt = timezone.now() + timedelta(minutes=1)
+        queued_mail.save()
+        assert claim_queued_mails(10) == []
+
+    def test_claim_again_mails_of_lost_workers(self):
+        self.mail_template.enqueue()
+        claim_queued_mails(10)
+        QueuedMail.objects.update(next_attempt=timezone.now())
+        assert len(claim_queued_mails(10)) == 1
+
+    def test_attempts_are_counted_when_claimed(self):
+        queued_mail = self.mail_template.enqueue()
+        for attempts in [1, 2]:
+            QueuedMail.objects.update(next_attempt=timezone.now())
+            assert claim_queued_mails(10, max_attempts=2)[0].attempts == \
+                attempts
+        # The worker never finished, it is not claimed a third time.
+        QueuedMail.objects.update(next_attempt=timezone.now())
+        assert claim_queued_mails(10, max_attempts=2) == []
+        queued_mail.refresh_from_db()
+        assert queued_mail.status == QueuedMail.FAILED
+        assert queued_mail.attempts == 2
+        assert queued_mail.last_error == \
+            'The worker sending the mail did not finish.'
+
+    def test_results_are_saved_as_each_mail_is_sent(self):
+        for _ in range(3):
+            self.mail_template.enqueue()
+        sent_before = []
+
+        def send_messages(messages):
+            sent_before.append(QueuedMail.objects.filter(
+                status=QueuedMail.SENT).count())
+            return 1
+
+        connection = Mock()
+        connection.send_messages.side_effect = send_messages
+        assert process_queue(connection=connection) == (3, 0)
+        assert sent_before == [0, 1, 2]
+
+    def test_claim_is_extended_while_sending(self):
+        for _ in range(2):
+            self.mail_template.enqueue()
+        queued_mails = claim_queued_mails(10)
+        # Claims about to expire, as after waiting for a rate limit.
+        expiring = timezone.now() + timedelta(seconds=1)
+        QueuedMail.objects.update(next_attempt=expiring)
+        for queued_mail in queued_mails:
+            queued_mail.next_attempt = expiring
+        claimed_until = []
+
+        def send_messages(messages):
+            claimed_until.append(QueuedMail.objects.filter(
+                status=QueuedMail.SENDING).values_list('next_attempt',
+                                                       flat=True)[0])
+            return 1
+
+        connection = Mock()
+        connection.send_messages.side_effect = send_messages
+        assert send_queued_mails(queued_mails, connection=connection) == \
+            (2, 0)
+        assert claimed_until[0] > expiring + timedelta(minutes=5)
+        assert claim_queued_mails(10) == []
+
+    def test_one_connection_for_the_batch(self):
+        for _ in range(3):
+            self.mail_template.enqueue()
+        connection = Mock()
+        connection.open.return_value = True
+        connection.send_messages.return_value = 1
+        process_queue(connection=connection)
+        assert connection.open.call_count == 1
+        assert connection.close.call_count == 1
+        assert connection.send_messages.call_count == 3
+
+    @override_settings(MAIL_TEMPLATE_QUEUE_RETRY_DELAY=10)
+    def test_retry_with_backoff(self):
+        queued_mail = self.mail_template.enqueue()
+        connection = Mock()
+        connection.send_messages.side_effect = OSError('Relay down')
+        for attempts, delay in [(1, 10), (2, 20)]:
+            QueuedMail.objects.update(next_attempt=timezone.now())
+            before = timezone.now()
+            assert process_queue(connection=connection) == (0, 1)
+            queued_mail.refresh_from_db()
+            assert queued_mail.status == QueuedMail.PENDING
+            assert queued_mail.attempts == attempts
+            assert queued_mail.last_error == 'Relay down (OSError)'
+            assert queued_mail.next_attempt >= \
+                before + timedelta(seconds=delay)
+
+    def test_failed_after_max_attempts(self):
+        queued_mail = self.mail_template.enqueue()
+        connection = Mock()
+        connection.open.side_effect = OSError('Relay down')
+        for _ in range(2):
+            QueuedMail.objects.update(next_attempt=timezone.now())
+            process_queue(connection=connection, max_attempts=2)
+        queued_mail.refresh_from_db()
+        assert queued_mail.status == QueuedMail.FAILED
+        assert queued_mail.attempts == 2
+
+    def test_render_errors_are_not_retried(self):
+        self.mail_template.body = 'Body with troubles {name{'
+        self.mail_template.save()
+        queued_mail = self.mail_template.enqueue({'name': 'Ana'})
+        assert process_queue() == (0, 1)
+        queued_mail.refresh_from_db()
+        assert queued_mail.status == QueuedMail.FAILED
+        assert 'ValueError' in queued_mail.last_error
+
+
+class TestMailTemplateWorkerCommand(TestCase):
+
+    def test_worker_send_queued_mails_once(self):
+        mail_template = MailTemplate.objects.create(
+            title='Greeting', subject='Hello', from_email='a@b.com',
+            to='b@c.com')
+        for _ in range(3):
+            mail_template.enqueue()
+        out = StringIO()
+        call_command('mail_template_worker', '--once', '--batch-size', '2',
+                     stdout=out)
+        assert len(mail.outbox) == 3
+        assert out.getvalue() == ('Sent: 2, failed: 0.\n'
+                                  'Sent: 1, failed: 0.\n')
@@ -0,0 +1,55 @@
+# -*- coding: UTF-8 -*-
+from django.core.mail import EmailMultiAlternatives
+from django.test import TestCase
+
+from django_mail_template.mime import (MessageSkeleton, TemplateEmailMessage,
+                                       get_skeleton)
+from django_mail_template.models import MailTemplate
+
+
+class TestTemplateEmailMessage(TestCase):
+
+    def setUp(self) -> None:
+        self.mail = MailTemplate.objects.create(
+            title='Mime', from_email='Ñandú <a@b.com>', subject='Hello {name}',
+            body='<p>Dear {name}</p>', to='b@c.com', cc='c@d.com',
+            reply_to='d@e.com')
+
+    def test_same_bytes_as_stock_message(self):
+        message = self.mail.build_message({'name': 'Ana'})
+        stock = EmailMultiAlternatives(
+            subject=message.subject, body=message.body,
+            from_email=message.from_email, to=message.to, cc=message.cc,
+            reply_to=message.reply_to, alternatives=message.alternatives,
+            headers={'Date': 'Sun, 18 Oct 2026 10:00:00 -0000',
+                     'Message-ID': '<1@b.com>'})
+        message.extra_headers = dict(stock.extra_headers)
+        expected = stock.message()
+        expected.set_boundary(message.skeleton.boundary)
+        assert message.message().as_bytes() == expected.as_bytes()
+        # SMTP backends serialize with CRLF line endings.
+        crlf = message.message().as_bytes(linesep='\r\n')
+        assert crlf == expected.as_bytes(linesep='\r\n')
+        assert b'\n' not in crlf.replace(b'\r\n', b'')
+
+    def test_boundary_reused(self):
+        first = self.mail.build_message({'name': 'Ana'}).message()
+        second = self.mail.build_message({'name': 'Eva'}).message()
+        assert first.get_boundary() == second.get_boundary()
+        assert self.mail.build_message().skeleton is \
+            get_skeleton((MailTemplate, self.mail.pk))
+
+    def test_boundary_in_content(self):
+        skeleton = MessageSkeleton()
+        boundary = skeleton.boundary
+        message = TemplateEmailMessage(
+            body=boundary, to=['a@b.com'], skeleton=skeleton)
+        message.attach_alternative('<p>html</p>', 'text/html')
+        msg = message.message()
+        assert msg.get_boundary() != boundary
+        assert boundary in msg.as_string()
+        assert skeleton.boundary != boundary
+
+    def test_without_skeleton(self):
+        message = TemplateEmailMessage(body='Hello', to=['a@b.com'])
+        assert b'Hello' in message.message().as_bytes()
@@ -1,9 +1,16 @@
 # -*- coding: UTF-8 -*-
-from unittest.mock import patch, call
+from types import MappingProxyType, SimpleNamespace
+from importlib import import_module
+from unittest.mock import patch, call, Mock
 
 import pytest
 from unittest import TestCase as UnitTestCase
+from django.apps import apps
+from django.core import mail
 from django.core.exceptions import ValidationError
+from django.contrib.auth import get_user_model
+from django.db.models import QuerySet
+from django.test import TestCase, override_settings
 from django.utils.translation import gettext as _
 from django.db import models
 from django_mail_template.models import (MailTemplate, Configuration)
@@ -266,37 +273,54 @@ class TestSendMailTemplate(UnitTestCase):
         self.mail.to = ['b@c.com']
         self.context_data = {'test': 'test_value'}
 
-    @patch('django_mail_template.models.replace_context_variable')
+    @patch('django_mail_template.models.compile_template')
     def test_subject_replace_context_variables(
-            self, mock_replace_context_variable
+            self, mock_compile_template
     ):
         self.mail.send(self.context_data)
-        assert call(text='Hello {test}', context_variable=self.context_data) \
-               in mock_replace_context_variable.call_args_list
+        assert call('Hello {test}') in mock_compile_template.call_args_list
+        assert call().render(self.context_data) in \
+            mock_compile_template.mock_calls
 
-    @patch('django_mail_template.models.replace_context_variable')
+    @patch('django_mail_template.models.compile_template')
     def test_body_replace_context_variables(
-            self, mock_replace_context_variable
+            self, mock_compile_template
     ):
         self.mail.send(self.context_data)
-        assert call(text='Hello {test}', context_variable=self.context_data) \
-               in mock_replace_context_variable.call_args_list
+        assert call('Test text using {test}') in \
+            mock_compile_template.call_args_list
 
-    @patch('django_mail_template.models.replace_context_variable')
-    def test_replace_context_variables_was_called_twice(
-            self, mock_replace_context_variable
+    @patch('django_mail_template.models.compile_template')
+    def test_replace_context_variables_was_called_for_subject_body_and_text(
+            self, mock_compile_template
     ):
         self.mail.send(self.context_data)
-        assert 2 == mock_replace_context_variable.call_count
+        assert 3 == mock_compile_template.return_value.render.call_count
 
-    @patch('django_mail_template.models.EmailMultiAlternatives.send')
+    def test_send_mail_replace_context_variables(self):
+        message = self.mail.build_message(self.context_data)
+        assert message.subject == 'Hello test_value'
+        assert message.body == 'Test text using test_value'
+
+    def test_send_mail_with_plain_text_version(self):
+        self.mail.body = '<p>Dear <b>{test}</b></p><p>Bye</p>'
+        message = self.mail.build_message(self.context_data)
+        assert message.body == 'Dear test_value\n\nBye'
+        assert message.alternatives == [
+            ('<p>Dear <b>test_value</b></p><p>Bye</p>', 'text/html')]
+
+    def test_send_mail_without_body(self):
+        self.mail.body = None
+        assert self.mail.build_message(self.context_data).body == ''
+
+    @patch('django_mail_template.mime.TemplateEmailMessage.send')
     def test_can_send_mail_without_context(
             self, mock_django_mail
     ):
         self.mail.send()
         assert 1 == mock_django_mail.call_count
 
-    @patch('django_mail_template.models.EmailMultiAlternatives.send')
+    @patch('django_mail_template.mime.TemplateEmailMessage.send')
     def test_can_not_send_mail_without_required_attributes_valid_context(
             self, mock_django_mail
     ):
@@ -318,6 +342,334 @@ class TestSendMailTemplate(UnitTestCase):
         self.assertEqual(mock_clean_address_list.call_args_list, expected)
 
 
+class TestSendManyMailTemplate(UnitTestCase):
+
+    def setUp(self) -> None:
+        self.mail = MailTemplate(from_email='a@b.com',
+                                 subject='Hello {name}',
+                                 body='Dear {name}')
+        self.mail.to = 'b@c.com'
+        mail.outbox = []
+
+    def test_send_one_mail_for_each_context(self):
+        contexts = [{'name': 'Ana'}, {'name': 'Bob'}, {'name': 'Eve'}]
+        assert self.mail.send_many(contexts) == [1, 1, 1]
+        self.assertEqual([m.subject for m in mail.outbox],
+                         ['Hello Ana', 'Hello Bob', 'Hello Eve'])
+
+    def test_send_with_a_single_connection(self):
+        connection = Mock()
+        connection.open.return_value = True
+        connection.send_messages.side_effect = lambda batch: len(batch)
+        self.mail.send_many([{'name': str(i)} for i in range(5)],
+                            batch_size=2, connection=connection)
+        assert connection.open.call_count == 1
+        assert connection.close.call_count == 1
+        assert [len(c.args[0]) for c in
+                connection.send_messages.call_args_list] == [2, 2, 1]
+
+    def test_batch_size_default_from_settings(self):
+        connection = Mock()
+        connection.send_messages.side_effect = lambda batch: len(batch)
+        with override_settings(MAIL_TEMPLATE_BATCH_SIZE=3):
+            self.mail.send_many([{'name': str(i)} for i in range(4)],
+                                connection=connection)
+        assert connection.send_messages.call_count == 2
+
+    def test_batch_not_fully_sent_is_reported_as_failed(self):
+        connection = Mock()
+        connection.send_messages.side_effect = [2, 1]
+        results = self.mail.send_many(
+            [{'name': str(i)} for i in range(4)], batch_size=2,
+            connection=connection)
+        assert results == [1, 1, 0, 0]
+
+    def test_mail_without_recipients_is_not_sent(self):
+        self.mail.to = ''
+        assert self.mail.send_many([{}, {}]) == [0, 0]
+        assert mail.outbox == []
+
+    def test_invalid_context(self):
+        with self.assertRaises(ValueError):
+            self.mail.send_many(['fake-context'])
+
+
+class TestRenderMailTemplate(UnitTestCase):
+
+    def setUp(self) -> None:
+        self.mail = MailTemplate(from_email='a@b.com',
+                                 subject='Hello {name}',
+                                 body='<p>Dear {name} from {city.name}</p>',
+                                 to='b@c.com')
+        mail.outbox = []
+
+    def test_render(self):
+        result = self.mail.render({'name': 'Ana',
+                                   'city': SimpleNamespace(name='Rome')})
+        assert result == {'subject': 'Hello Ana',
+                          'body': '<p>Dear Ana from Rome</p>',
+                          'text': 'Dear Ana from Rome', 'missing': []}
+        assert mail.outbox == []
+
+    def test_render_reports_missing_variables(self):
+        result = self.mail.render({'city': SimpleNamespace(name='Rome')})
+        assert result['subject'] == 'Hello {name}'
+        assert result['missing'] == ['name']
+        assert self.mail.render()['missing'] == ['city', 'name']
+
+    def test_render_errors(self):
+        with self.assertRaises(ValueError):
+            self.mail.render(['name'])
+        self.mail.subject = 'Hello {name'
+        with self.assertRaises(ValueError):
+            self.mail.render({})
+
+    def test_render_many(self):
+        results = self.mail.render_many([
+            {'name': 'Ana', 'city': SimpleNamespace(name='Rome')},
+            {'city': SimpleNamespace(name='Rome')},
+            {'name': 'Eva', 'city': 'Rome'}])
+        assert results == [
+            {'missing': [], 'error': None},
+            {'missing': ['name'], 'error': None},
+            {'missing': [], 'error': "'str' object has no attribute 'name' "
+                                     "(AttributeError)"}]
+
+
+class TestMailTemplatePlaceholders(TestCase):
+
+    def setUp(self) -> None:
+        self.mail = MailTemplate.objects.create(
+            title='Greeting', from_email='a@b.com', subject='Hello {name}',
+            body='<p>Dear {user.first_name} {last!r}</p>')
+
+    def test_placeholders_are_stored_on_save(self):
+        assert self.mail.placeholders == ',last,name,user,'
+        assert self.mail.get_placeholders() == {'last', 'name', 'user'}
+        self.mail.subject = 'Hello'
+        self.mail.save(update_fields=['subject'])
+        self.mail.refresh_from_db()
+        assert self.mail.get_placeholders() == {'last', 'user'}
+
+    def test_invalid_texts_are_skipped(self):
+        self.mail.body = 'Dear {name'
+        self.mail.save()
+        assert self.mail.get_placeholders() == {'name'}
+
+    def test_not_saved_mail_templates_are_parsed(self):
+        mail_template = MailTemplate(subject='Hi {a}', body=None)
+        assert mail_template.get_placeholders() == {'a'}
+        assert MailTemplate(subject='Hi').get_placeholders() == set()
+
+    def test_with_placeholders(self):
+        other = MailTemplate.objects.create(
+            title='Other', from_email='a@b.com', subject='Hello {username}')
+        assert list(MailTemplate.objects.with_placeholders('name')) == \
+            [self.mail]
+        assert list(MailTemplate.objects.with_placeholders(
+            'name', 'user')) == [self.mail]
+        assert list(MailTemplate.objects.with_placeholders(
+            'username')) == [other]
+        assert not MailTemplate.objects.with_placeholders('name',
+                                                          'username')
+
+    def test_placeholders_migration(self):
+        migration = import_module('django_mail_template.migrations.'
+                                  '0008_mailtemplate_placeholders')
+        MailTemplate.objects.create(
+            title='Other', from_email='a@b.com', subject='Hi {a[0]}',
+            body='<a href="{url}">&#123;b&#125;</a><style>x</style>{c:>3}')
+        mail_templates = MailTemplate.objects.all()
+        expected = {m.pk: m.placeholders for m in mail_templates}
+        mail_templates.update(placeholders=None)
+        migration.fill_placeholders(apps, None)
+        assert {m.pk: m.placeholders for m in mail_templates} == expected
+
+    @patch('django_mail_template.models.resolve_attribute')
+    def test_send_objects_resolves_used_variables(self, resolve_attribute):
+        resolve_attribute.return_value = 'x'
+        self.mail.body = 'Dear {name}'
+        self.mail.to = 'b@c.com'
+        self.mail.save()
+        self.mail.send_objects([object()], {'name': 'a', 'unused': 'b'})
+        assert resolve_attribute.call_count == 1
+        assert resolve_attribute.call_args.args[1] == 'a'
+
+
+class TestLazyContextMailTemplate(UnitTestCase):
+
+    def setUp(self) -> None:
+        self.mail = MailTemplate(from_email='a@b.com', to='b@c.com',
+                                 subject='Total {total}',
+                                 body='<p>Your total is {total}</p>')
+
+    def test_callables_are_called_once_if_used(self):
+        total = Mock(spec=lambda: None, return_value=10)
+        recommendations = Mock(spec=lambda: None)
+        message = self.mail.build_message({
+            'total': total, 'recommendations': recommendations})
+        assert message.subject == 'Total 10'
+        assert message.body == 'Your total is 10'
+        assert total.call_count == 1
+        recommendations.assert_not_called()
+        assert self.mail.render({'total': lambda: 5})['subject'] == 'Total 5'
+
+    def test_mappings_are_accepted(self):
+        context = MappingProxyType({'total': 3})
+        assert self.mail.build_message(context).subject == 'Total 3'
+        with self.assertRaises(ValueError):
+            self.mail.build_message([('total', 3)])
+
+
+class TestDjangoEngineMailTemplate(UnitTestCase):
+
+    def setUp(self) -> None:
+        self.mail = MailTemplate(
+            from_email='a@b.com', to='b@c.com', engine=MailTemplate.DJANGO,
+            subject='Order for {{ name }}',
+            body='<p>Dear {{ name }}</p><ul>{% for item in items %}'
+                 '<li>{{ item }}</li>{% endfor %}</ul>')
+
+    def test_build_message(self):
+        message = self.mail.build_message({'name': 'Ana & Eva',
+                                           'items': ['<tea>', 'milk']})
+        assert message.subject == 'Order for Ana & Eva'
+        assert message.alternatives[0][0] == (
+            '<p>Dear Ana &amp; Eva</p><ul><li>&lt;tea&gt;</li>'
+            '<li>milk</li></ul>')
+        # Lines with block tags are left empty, as in any Django template.
+        assert message.body.split() == ['Dear', 'Ana', '&', 'Eva', '-',
+                                        '<tea>', '-', 'milk']
+
+    def test_render(self):
+        result = self.mail.render({'items': []})
+        assert result['subject'] == 'Order for '
+        assert result['missing'] == ['name']
+        assert self.mail.get_placeholders() == {'name', 'items'}
+
+    def test_without_context(self):
+        self.mail.subject = 'Order{% if name %} for {{ name }}{% endif %}'
+        message = self.mail.build_message()
+        assert message.subject == 'Order'
+        assert message.alternatives[0][0] == '<p>Dear </p><ul></ul>'
+        assert self.mail.render()['subject'] == 'Order'
+
+    def test_braces_written_as_references(self):
+        self.mail.body = '<p>&#123;&#125; {{ name }}</p>'
+        message = self.mail.build_message({'name': 'Ana'})
+        assert message.body == '{} Ana'
+        assert message.alternatives[0][0] == '<p>&#123;&#125; Ana</p>'
+
+    def test_clean_reports_syntax_errors(self):
+        self.mail.body = '{% for item in items %}'
+        with self.assertRaises(ValidationError):
+            self.mail.clean()
+        self.mail.engine = MailTemplate.FORMAT
+        self.mail.clean()
+
+    @override_settings(MAIL_TEMPLATE_RENDER_CACHE=True)
+    def test_render_cache(self):
+        context = {'name': 'Ana', 'items': ('tea',)}
+        first = self.mail.build_message(context)
+        second = self.mail.build_message(context)
+        assert first.subject == second.subject == 'Order for Ana'
+        assert first.alternatives == second.alternatives
+
+
+class TestSendMergeMailTemplate(UnitTestCase):
+
+    def setUp(self) -> None:
+        self.mail = MailTemplate(from_email='a@b.com',
+                                 subject='Hello {name}',
+                                 body='Dear {name}', to='b@c.com',
+                                 cc='c@d.com', reply_to='r@b.com')
+        mail.outbox = []
+
+    def test_send_one_mail_for_each_recipient(self):
+        results = self.mail.send_merge([('ana@b.com', {'name': 'Ana'}),
+                                        ('bob@b.com', {'name': 'Bob'})])
+        assert results == [1, 1]
+        assert [(m.to, m.cc, m.subject, m.reply_to) for m in mail.outbox] == [
+            (['ana@b.com'], [], 'Hello Ana', ['r@b.com']),
+            (['bob@b.com'], [], 'Hello Bob', ['r@b.com'])]
+        assert self.mail.to == 'b@c.com'
+
+    def test_invalid_addresses_are_not_sent(self):
+        results = self.mail.send_merge([('ana', {'name': 'Ana'}),
+                                        ('', {'name': 'Eve'}),
+                                        ('bob@b.com', {'name': 'Bob'})])
+        assert results == [0, 0, 1]
+        assert len(mail.outbox) == 1
+
+    def test_send_with_a_single_connection(self):
+        connection = Mock()
+        connection.send_messages.side_effect = lambda batch: len(batch)
+        self.mail.send_merge(
+            (('{}@b.com'.format(i), {'name': i}) for i in range(5)),
+            batch_size=2, connection=connection)
+        assert connection.open.call_count == 1
+        assert connection.send_messages.call_count == 3
+
+
+class TestSendObjectsMailTemplate(TestCase):
+
+    def setUp(self) -> None:
+        self.mail = MailTemplate(from_email='a@b.com',
+                                 subject='Hello {name}',
+                                 body='Dear {name} {last}', to='static@c.com',
+                                 cc='copy@c.com')
+        User = get_user_model()
+        for name, last in [('ana', 'Smith'), ('bob', 'Wellies')]:
+            User.objects.create(username=name, last_name=last,
+                                email=name + '@c.com')
+        self.users = User.objects.order_by('username')
+
+    def test_send_a_mail_for_each_object(self):
+        report = self.mail.send_objects(
+            self.users, {'name': 'username', 'last': 'last_name'},
+            recipient_field='email')
+        assert report == {'sent': 2, 'failed': 0}
+        assert [(m.to, m.cc, m.body) for m in mail.outbox] == [
+            (['ana@c.com'], [], 'Dear ana Smith'),
+            (['bob@c.com'], [], 'Dear bob Wellies')]
+
+    def test_context_fields_as_list(self):
+        self.mail.body = '{username}'
+        self.mail.send_objects(self.users, ['username'])
+        assert [m.body for m in mail.outbox] == ['ana', 'bob']
+        assert mail.outbox[0].to == ['static@c.com']
+        assert mail.outbox[0].cc == ['copy@c.com']
+
+    def test_queryset_is_read_with_iterator(self):
+        queryset = Mock(spec=QuerySet)
+        queryset.iterator.return_value = iter(self.users)
+        self.mail.send_objects(queryset, ['username'], chunk_size=500)
+        queryset.iterator.assert_called_once_with(chunk_size=500)
+
+    def test_any_iterable_of_objects(self):
+        objects = (SimpleNamespace(first='x{}'.format(i),
+                                   email='{}@c.com'.format(i))
+                   for i in range(5))
+        report = self.mail.send_objects(
+            objects, {'name': 'first'}, recipient_field='email',
+            batch_size=2)
+        assert report == {'sent': 5, 'failed': 0}
+
+    def test_objects_without_valid_email_are_failed(self):
+        self.users.filter(username='ana').update(email='')
+        get_user_model().objects.create(username='eve', email='no-mail')
+        report = self.mail.send_objects(self.users, ['username'],
+                                        recipient_field='email')
+        assert report == {'sent': 1, 'failed': 2}
+
+    def test_context_fields_with_callables(self):
+        self.mail.send_objects(
+            self.users, {'name': lambda user: user.username.upper(),
+                         'last': 'get_full_name'},
+            recipient_field='email')
+        assert mail.outbox[0].body == 'Dear ANA Smith'
+
+
 class TestConfiguration(UnitTestCase):
     """
     Store dynamic configuration data used to set up django_mail_template.
@@ -0,0 +1,150 @@
+# -*- coding: UTF-8 -*-
+from unittest import TestCase as UnitTest
+
+from django.core import mail
+from django.test import TestCase, override_settings
+
+from django_mail_template.models import MailTemplate
+from django_mail_template.optimize import optimize_html, parse_css
+
+CKEDITOR_BODY = '''<html>
+<head>
+<style type="text/css">
+/* Written with the editor */
+p {{ color: #333; margin: 0 }}
+.note, td.total {{ font-weight: bold }}
+#footer {{ color: {footer_color} }}
+a:hover {{ color: red }}
+</style>
+</head>
+<body>
+  <!-- A comment -->
+  <p class="note cke_editable" style="color: blue;" data-cke-saved-src="x">
+     Hello   <b>{name}</b>,
+     <span data-cke-bookmark="1" style="display:none">&nbsp;</span>welcome!
+  </p>
+  <p id="footer">Price {{not a variable}} {price:.2f}</p>
+  <br type="_moz">
+</body>
+</html>'''
+
+
+class TestOptimizeHtml(UnitTest):
+
+    def test_ckeditor_body(self):
+        assert optimize_html(CKEDITOR_BODY) == (
+            '<html><head><style>a:hover{{color:red}}</style></head><body>'
+            '<p class="note" style="color:blue;margin:0;font-weight:bold">'
+            'Hello <b>{name}</b>, welcome!</p>'
+            '<p id="footer" style="color:{footer_color};margin:0">'
+            'Price {{not a variable}} {price:.2f}</p></body></html>')
+
+    def test_context_variables_are_preserved(self):
+        context = {'name': 'Ana', 'footer_color': 'gray', 'price': 2}
+        optimized = optimize_html(CKEDITOR_BODY)
+        assert 'Hello <b>Ana</b>, welcome!' in optimized.format(**context)
+        assert 'color:gray' in optimized.format(**context)
+
+    def test_django_engine(self):
+        body = ('<style>td { padding: 0 }</style>\n<table>\n'
+                '{% for item in items %}\n<tr><td>{{ item }}</td></tr>\n'
+                '{% endfor %}\n</table>')
+        assert optimize_html(body, 'django') == (
+            '<table>{% for item in items %}<tr><td style="padding:0">'
+            '{{ item }}</td></tr>{% endfor %}</table>')
+
+    def test_context_variables_in_style_attributes(self):
+        assert optimize_html('<p style="{css}">A</p>') == \
+            '<p style="{css}">A</p>'
+        assert optimize_html('<p style="color:red;{extra}">A</p>') == \
+            '<p style="color:red;{extra}">A</p>'
+        body = ('<style>p {{ margin: 0 }}</style>'
+                '<p style="{extra}; color: {color}">A</p>')
+        assert optimize_html(body) == \
+            '<p style="margin:0;{extra};color:{color}">A</p>'
+
+    def test_django_tags_in_style_attributes(self):
+        assert optimize_html('<td style="{{ cell_style }}">A</td>',
+                             'django') == \
+            '<td style="{{ cell_style }}">A</td>'
+        body = ('<style>td { padding: 0 }</style><td style="'
+                '{% if wide %}width:100%;{% endif %}color:red">A</td>')
+        assert optimize_html(body, 'django') == (
+            '<td style="padding:0;{% if wide %}width:100%;{% endif %}'
+            'color:red">A</td>')
+
+    def test_specificity(self):
+        body = ('<style>.a {{ color: red }} p {{ color: blue; margin: 0 }}'
+                '#b {{ color: green }}</style><p class="a">A</p>'
+                '<p id="b" class="a">B</p><p>C</p>')
+        assert optimize_html(body) == (
+            '<p class="a" style="color:red;margin:0">A</p>'
+            '<p id="b" class="a" style="color:green;margin:0">B</p>'
+            '<p style="color:blue;margin:0">C</p>')
+
+    def test_whitespace(self):
+        body = ('<p>  One <b>two</b>  <i>three</i>\n</p>'
+                '<pre>  keep\n  it </pre>')
+        assert optimize_html(body) == (
+            '<p>One <b>two</b> <i>three</i></p><pre>  keep\n  it </pre>')
+
+    def test_conditional_comments_are_kept(self):
+        body = '<!--[if mso]><table><tr><td><![endif]--><p>Hi</p>'
+        assert optimize_html(body) == body
+
+    def test_not_valid_format_body(self):
+        with self.assertRaises(ValueError):
+            optimize_html('<p>{name</p>')
+
+    def test_parse_css(self):
+        rules, css = parse_css(
+            'p, div > p { color: red } @media (max-width: 600px) '
+            '{ p { color: blue } } @import url("a.css");')
+        assert [(rule.tag, rule.declarations) for rule in rules] == [
+            ('p', {'color': 'red'})]
+        assert css == ('div>p{color:red}@media (max-width: 600px){p{color: '
+                       'blue}}@import url("a.css");')
+
+
+class TestOptimizedBodyMailTemplate(TestCase):
+
+    def setUp(self) -> None:
+        self.mail = MailTemplate(title='Price', from_email='a@b.com',
+                                 to='b@c.com', subject='Hi {name}',
+                                 body=CKEDITOR_BODY)
+        mail.outbox = []
+
+    def test_disabled(self):
+        self.mail.save()
+        assert self.mail.optimized_body is None
+        assert self.mail.body_bytes_saved is None
+        assert self.mail.get_send_body() == CKEDITOR_BODY
+
+    @override_settings(MAIL_TEMPLATE_OPTIMIZE_BODY=True)
+    def test_optimized_body_is_sent(self):
+        self.mail.save()
+        self.mail.refresh_from_db()
+        assert self.mail.optimized_body == optimize_html(CKEDITOR_BODY)
+        assert self.mail.body_bytes_saved == \
+            len(CKEDITOR_BODY) - len(self.mail.optimized_body)
+        self.mail.send({'name': 'Ana', 'footer_color': 'gray', 'price': 2})
+        html = mail.outbox[0].alternatives[0][0]
+        assert html.startswith('<html><head><style>a:hover{color:red}')
+        assert 'Hello <b>Ana</b>, welcome!' in html
+        assert 'Price {not a variable} 2.00' in html
+
+    @override_settings(MAIL_TEMPLATE_OPTIMIZE_BODY=True)
+    def test_update_fields(self):
+        self.mail.save()
+        self.mail.body = '<p>  Bye  </p>'
+        self.mail.save(update_fields=['body'])
+        self.mail.refresh_from_db()
+        assert self.mail.optimized_body == '<p>Bye</p>'
+        assert self.mail.body_bytes_saved == 4
+
+    @override_settings(MAIL_TEMPLATE_OPTIMIZE_BODY=True)
+    def test_not_valid_body(self):
+        self.mail.body = '<p>{name</p>'
+        self.mail.save()
+        assert self.mail.optimized_body is None
+        assert self.mail.get_send_body() == '<p>{name</p>'
@@ -0,0 +1,79 @@
+# -*- coding: UTF-8 -*-
+from unittest import TestCase as UnitTestCase
+from unittest.mock import patch
+
+import pytest
+from django.core import mail
+from django.db.transaction import TransactionManagementError
+from django.test import TestCase
+
+from django_mail_template import parallel
+from django_mail_template.models import MailTemplate
+
+
+class TestSendParallel(UnitTestCase):
+
+    def setUp(self) -> None:
+        self.mail = MailTemplate(from_email='a@b.com',
+                                 subject='Hello {name}',
+                                 body='Dear {name}', to='b@c.com')
+        mail.outbox = []
+
+    def test_send_with_threads(self):
+        contexts = ({'name': str(i)} for i in range(25))
+        report = self.mail.send_parallel(contexts, workers=3, batch_size=4)
+        assert report == {'sent': 25, 'failed': 0, 'errors': []}
+        assert sorted(m.subject for m in mail.outbox) == \
+            sorted('Hello {}'.format(i) for i in range(25))
+
+    def test_each_thread_has_its_own_mail_template(self):
+        used = set()
+        send_many = MailTemplate.send_many
+
+        def record(mail_template, *args, **kwargs):
+            used.add(id(mail_template))
+            return send_many(mail_template, *args, **kwargs)
+
+        with patch.object(MailTemplate, 'send_many', autospec=True,
+                          side_effect=record):
+            self.mail.send_parallel([{}] * 20, workers=2, batch_size=2)
+        assert used
+        assert id(self.mail) not in used
+
+    def test_one_connection_for_each_worker(self):
+        with patch('django_mail_template.parallel.get_connection',
+                   wraps=mail.get_connection) as mock_get_connection:
+            self.mail.send_parallel([{}] * 20, workers=2, batch_size=2)
+        assert mock_get_connection.call_count <= 2
+
+    def test_chunks_with_errors_are_reported_as_failed(self):
+        contexts = [{}] * 3 + ['fake-context'] + [{}] * 2
+        report = self.mail.send_parallel(contexts, workers=2, batch_size=3)
+        assert report['sent'] == 3
+        assert report['failed'] == 3
+        assert report['errors'] == [
+            'The argument for send method must be a mapping. (ValueError)']
+
+    @pytest.mark.django_db(transaction=True)
+    def test_send_with_processes(self):
+        report = self.mail.send_parallel([{'name': 'Ana'}] * 10, workers=2,
+                                         batch_size=3, processes=True)
+        assert report == {'sent': 10, 'failed': 0, 'errors': []}
+
+    def test_processes_flush_the_sent_log_on_exit(self):
+        with patch('django_mail_template.parallel.Finalize') as finalize:
+            parallel._init_worker(self.mail)
+        finalizers = [call.args[1] for call in finalize.call_args_list]
+        assert parallel._flush_sent_log in finalizers
+        with patch('django_mail_template.sent_log.flush') as flush:
+            parallel._flush_sent_log()
+        flush.assert_called_once_with()
+
+
+class TestSendParallelTransaction(TestCase):
+
+    def test_processes_are_not_allowed_in_atomic_blocks(self):
+        mail_template = MailTemplate(from_email='a@b.com', subject='Hi',
+                                     to='b@c.com')
+        with self.assertRaises(TransactionManagementError):
+            mail_template.send_parallel([{}], processes=True)
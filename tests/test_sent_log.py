@@ -0,0 +1,155 @@
+# -*- coding: UTF-8 -*-
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import Mock, patch
+
+from django.core.management import call_command
+from django.db import DatabaseError, IntegrityError, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from django_mail_template import sent_log
+from django_mail_template.models import MailTemplate, SentMail
+
+
+@override_settings(MAIL_TEMPLATE_SENT_LOG_BUFFER_SIZE=3,
+                   MAIL_TEMPLATE_SENT_LOG_FLUSH_INTERVAL=60)
+class TestSentLog(TestCase):
+
+    def setUp(self) -> None:
+        self.mail_template = MailTemplate.objects.create(
+            title='Greeting', subject='Hello {name}', from_email='a@b.com',
+            to='b@c.com', cc='c@d.com')
+        sent_log.connect()
+        self.addCleanup(sent_log.disconnect)
+        sent_log.buffer.flush()
+        self.addCleanup(sent_log.buffer.flush)
+
+    def test_sent_mails_are_logged_in_bulk(self):
+        self.mail_template.send({'name': 'Ana'})
+        self.mail_template.send({'name': 'Eva'})
+        assert len(sent_log.buffer) == 2
+        assert not SentMail.objects.exists()
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.mail_template.send_many([{'name': 'Noa'}, {'name': 'Pía'}])
+        assert len(sent_log.buffer) == 4
+        # One INSERT, in a savepoint.
+        with self.assertNumQueries(3):
+            callbacks[0]()
+        assert len(sent_log.buffer) == 0
+        sent_mails = SentMail.objects.order_by('subject')
+        assert [s.subject for s in sent_mails] == [
+            'Hello Ana', 'Hello Eva', 'Hello Noa', 'Hello Pía']
+        sent_mail = sent_mails[0]
+        assert sent_mail.mail_template == self.mail_template
+        assert sent_mail.recipients == 'b@c.com, c@d.com'
+        assert sent_mail.status == SentMail.SENT
+        assert sent_mail.message_id.startswith('<')
+        assert sent_mail.duration >= 0
+
+    def test_flush_after_interval(self):
+        self.mail_template.send({'name': 'Ana'})
+        with override_settings(MAIL_TEMPLATE_SENT_LOG_FLUSH_INTERVAL=0), \
+                self.captureOnCommitCallbacks(execute=True):
+            self.mail_template.send({'name': 'Eva'})
+        assert SentMail.objects.count() == 2
+
+    def test_flush(self):
+        self.mail_template.send({'name': 'Ana'})
+        assert sent_log.flush() == 1
+        assert sent_log.flush() == 0
+        assert SentMail.objects.count() == 1
+
+    def test_failed_mails(self):
+        connection = Mock()
+        connection.send_messages.side_effect = [1, 1, OSError('Down')]
+        self.mail_template.send_many([{}, {}, {}], batch_size=2,
+                                     connection=connection)
+        with self.assertRaises(OSError):
+            self.mail_template.send_many([{}], connection=connection)
+        sent_log.flush()
+        assert list(SentMail.objects.order_by('pk').values_list(
+            'status', 'error')) == [
+            (SentMail.FAILED, ''), (SentMail.FAILED, ''),
+            (SentMail.SENT, ''), (SentMail.FAILED, 'Down (OSError)')]
+
+    def test_rolled_back_transaction_keeps_other_rows(self):
+        self.mail_template.send({'name': 'Ana'})
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            try:
+                with transaction.atomic():
+                    self.mail_template.send_many([{'name': 'Eva'},
+                                                  {'name': 'Noa'}])
+                    raise IntegrityError
+            except IntegrityError:
+                pass
+        assert callbacks == []
+        assert len(sent_log.buffer) == 3
+        assert sent_log.flush() == 3
+        assert SentMail.objects.count() == 3
+
+    def test_database_errors_are_not_raised(self):
+        self.mail_template.send({'name': 'Ana'})
+        with patch('django_mail_template.sent_log._write',
+                   side_effect=DatabaseError('Down')), \
+                self.assertLogs('django_mail_template.sent_log') as logs, \
+                self.captureOnCommitCallbacks(execute=True):
+            self.mail_template.send_many([{'name': 'Eva'}, {'name': 'Noa'}])
+        assert '3 sent mails could not be logged.' in logs.output[0]
+        assert len(sent_log.buffer) == 0
+
+    @override_settings(MAIL_TEMPLATE_SENT_LOG=True,
+                       MAIL_TEMPLATE_SENT_LOG_BUFFER_SIZE=1)
+    async def test_async_sent_mails(self):
+        await self.mail_template.asend({'name': 'Ana'})
+        assert len(sent_log.buffer) == 0
+        await self.mail_template.asend_many([{'name': 'Eva'}, {}],
+                                            batch_size=1)
+        assert len(sent_log.buffer) == 0
+        assert await SentMail.objects.acount() == 3
+
+    def test_not_saved_mail_templates(self):
+        MailTemplate(subject='Hi', from_email='a@b.com', to='b@c.com').send()
+        sent_log.flush()
+        assert SentMail.objects.get().mail_template is None
+
+
+@override_settings(MAIL_TEMPLATE_SENT_LOG_BUFFER_SIZE=2)
+class TestSentLogDeletedMailTemplate(TransactionTestCase):
+
+    def setUp(self) -> None:
+        sent_log.connect()
+        self.addCleanup(sent_log.disconnect)
+        self.addCleanup(sent_log.buffer.flush)
+
+    def test_rows_of_deleted_mail_templates(self):
+        kept, deleted = [
+            MailTemplate.objects.create(title=title, subject=title,
+                                        from_email='a@b.com', to='b@c.com')
+            for title in ['Kept', 'Deleted']]
+        deleted.send()
+        MailTemplate.objects.filter(pk=deleted.pk).delete()
+        kept.send()
+        assert list(SentMail.objects.order_by('subject').values_list(
+            'subject', 'mail_template')) == [
+            ('Deleted', None), ('Kept', kept.pk)]
+
+
+class TestPruneSentCommand(TestCase):
+
+    def test_old_sent_mails_are_deleted(self):
+        now = timezone.now()
+        SentMail.objects.bulk_create([
+            SentMail(status=SentMail.SENT, created=now - timedelta(days=days))
+            for days in [1, 10, 11, 12]])
+        out = StringIO()
+        call_command('mail_template_prune_sent', '--days', '5',
+                     '--batch-size', '2', stdout=out)
+        assert out.getvalue() == 'Deleted: 3.\n'
+        assert SentMail.objects.count() == 1
+
+    @override_settings(MAIL_TEMPLATE_SENT_LOG=True)
+    def test_worker_flushes_sent_log(self):
+        with patch('django_mail_template.sent_log.flush') as flush:
+            call_command('mail_template_worker', '--once', stdout=StringIO())
+        flush.assert_called_once_with()
@@ -0,0 +1,103 @@
+# -*- coding: UTF-8 -*-
+from unittest.mock import Mock
+
+from django.test import TestCase
+
+from django_mail_template import metrics
+from django_mail_template.models import MailTemplate
+from django_mail_template.signals import (pre_render, post_render, pre_send,
+                                          post_send)
+
+
+class TestSignals(TestCase):
+
+    def setUp(self) -> None:
+        self.mail = MailTemplate.objects.create(
+            title='Signals', from_email='a@b.com', subject='Hello {name}',
+            body='Dear {name}', to='b@c.com')
+        self.receivers = {}
+        for signal in [pre_render, post_render, pre_send, post_send]:
+            receiver = Mock()
+            signal.connect(receiver, sender=MailTemplate)
+            self.addCleanup(signal.disconnect, receiver, sender=MailTemplate)
+            self.receivers[signal] = receiver
+
+    def test_render_signals(self):
+        message = self.mail.build_message({'name': 'Ana'})
+        self.receivers[pre_render].assert_called_once_with(
+            signal=pre_render, sender=MailTemplate, mail_template=self.mail,
+            context={'name': 'Ana'})
+        kwargs = self.receivers[post_render].call_args.kwargs
+        assert kwargs['message'] is message
+        assert kwargs['size'] == len('Hello AnaDear AnaDear Ana')
+        assert set(kwargs['durations']) == {'render', 'addresses'}
+
+    def test_send_signals(self):
+        self.mail.send({'name': 'Ana'})
+        assert self.receivers[pre_send].call_count == 1
+        kwargs = self.receivers[post_send].call_args.kwargs
+        assert kwargs['mail_template'] == self.mail
+        assert kwargs['sent'] == 1
+        assert kwargs['error'] is None
+        assert kwargs['durations']['transport'] >= 0
+
+    def test_send_signals_for_each_batch(self):
+        self.mail.send_many([{}] * 5, batch_size=2)
+        assert self.receivers[pre_send].call_count == 3
+        assert [c.kwargs['sent'] for c in
+                self.receivers[post_send].call_args_list] == [2, 2, 1]
+
+    def test_post_send_when_sending_fails(self):
+        connection = Mock()
+        connection.send_messages.side_effect = OSError('Relay down')
+        with self.assertRaises(OSError):
+            self.mail.send_many([{}], connection=connection)
+        kwargs = self.receivers[post_send].call_args.kwargs
+        assert kwargs['sent'] == 0
+        assert isinstance(kwargs['error'], OSError)
+
+
+class TestMetrics(TestCase):
+
+    def setUp(self) -> None:
+        self.mail = MailTemplate.objects.create(
+            title='Metrics', from_email='a@b.com', subject='Hello',
+            body='Body', to='b@c.com')
+        metrics.connect()
+        self.addCleanup(metrics.disconnect)
+
+    def test_counters(self):
+        before = metrics.sent_total.get(mail_template=self.mail.pk)
+        self.mail.send_many([{}] * 3)
+        assert metrics.sent_total.get(mail_template=self.mail.pk) == \
+            before + 3
+        count, _ = metrics.render_seconds.get(mail_template=self.mail.pk)
+        assert count >= 3
+
+    def test_failed_counter(self):
+        before = metrics.failed_total.get(mail_template=self.mail.pk)
+        connection = Mock()
+        connection.send_messages.return_value = 1
+        self.mail.send_many([{}] * 3, connection=connection)
+        assert metrics.failed_total.get(mail_template=self.mail.pk) == \
+            before + 2
+
+    def test_render_prometheus_text(self):
+        registry = metrics.Registry()
+        counter = registry.register(
+            metrics.Counter('sent_total', 'Mails sent.', ['mail_template']))
+        histogram = registry.register(metrics.Histogram(
+            'send_seconds', 'Send time.', buckets=(0.1, 1)))
+        counter.inc(2, mail_template=1)
+        histogram.observe(0.5)
+        assert registry.render() == (
+            '# HELP sent_total Mails sent.\n'
+            '# TYPE sent_total counter\n'
+            'sent_total{mail_template="1"} 2\n'
+            '# HELP send_seconds Send time.\n'
+            '# TYPE send_seconds histogram\n'
+            'send_seconds_bucket{le="0.1"} 0\n'
+            'send_seconds_bucket{le="1"} 1\n'
+            'send_seconds_bucket{le="+Inf"} 1\n'
+            'send_seconds_count 1\n'
+            'send_seconds_sum 0.5\n')
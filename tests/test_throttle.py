@@ -0,0 +1,144 @@
+# -*- coding: UTF-8 -*-
+from unittest.mock import Mock, patch
+
+from django.test import TestCase, override_settings
+
+from django_mail_template import throttle
+from django_mail_template.models import MailTemplate
+from django_mail_template.throttle import (CacheRateLimiter, TokenBucket,
+                                           athrottled, get_limiter,
+                                           throttled)
+
+
+class Clock:
+
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class TestTokenBucket(TestCase):
+
+    def test_burst_then_rate(self):
+        clock = Clock()
+        bucket = TokenBucket(2, burst=4, clock=clock)
+        assert bucket.reserve(4) == 0
+        assert bucket.reserve(1) == 0.5
+        clock.now += 1.5
+        # 3 tokens were added, one paid the debt.
+        assert bucket.reserve(2) == 0
+        assert bucket.reserve(1) == 0.5
+
+    def test_tokens_are_not_accumulated_over_burst(self):
+        clock = Clock()
+        bucket = TokenBucket(10, clock=clock)
+        assert bucket.burst == 10
+        clock.now += 60
+        assert bucket.reserve(20) == 1
+
+    @patch('django_mail_template.throttle.time.sleep')
+    def test_acquire_waits(self, sleep):
+        bucket = TokenBucket(1, burst=1, clock=Clock())
+        bucket.acquire()
+        sleep.assert_not_called()
+        assert bucket.acquire() == 1
+        sleep.assert_called_once_with(1)
+
+
+class TestCacheRateLimiter(TestCase):
+
+    def test_window_is_shared(self):
+        clock = Clock(1000.2)
+        first = CacheRateLimiter('example.com', 5, clock=clock)
+        second = CacheRateLimiter('example.com', 5, clock=clock)
+        assert first.reserve(3) == 0
+        assert second.reserve(2) == 0
+        assert round(first.reserve(1), 3) == 0.8
+        clock.now += 1
+        assert second.reserve(5) == 0
+
+    def test_burst_is_not_exceeded(self):
+        clock = Clock(1000.0)
+        limiter = CacheRateLimiter('example.com', 5, clock=clock)
+        assert limiter.reserve(4) == 0
+        assert limiter.reserve(5) == 1
+        # Rejected messages do not take room in the window.
+        assert limiter.reserve(5) == 1
+        assert limiter.reserve(1) == 0
+        assert limiter.reserve(1) == 1
+        clock.now += 1
+        assert limiter.reserve(8) == 0
+
+    def test_other_names_are_not_shared(self):
+        clock = Clock()
+        CacheRateLimiter('a.com', 1, clock=clock).reserve()
+        assert CacheRateLimiter('b.com', 1, clock=clock).reserve() == 0
+
+    @patch('django_mail_template.throttle.time.sleep')
+    def test_acquire_waits_for_next_window(self, sleep):
+        clock = Clock(1000.0)
+        limiter = CacheRateLimiter('example.com', 1, clock=clock)
+        limiter.acquire()
+
+        def advance(seconds):
+            clock.now += seconds
+        sleep.side_effect = advance
+        assert limiter.acquire() == 1
+        assert clock.now == 1001
+
+    async def test_areserve(self):
+        limiter = CacheRateLimiter('example.com', 1, clock=Clock())
+        assert await limiter.areserve() == 0
+        assert await limiter.areserve() == 1
+
+
+class TestThrottled(TestCase):
+
+    def setUp(self) -> None:
+        throttle._limiters.clear()
+        self.addCleanup(throttle._limiters.clear)
+
+    def test_no_limits(self):
+        assert get_limiter('a@b.com') is None
+        messages = [1, 2, 3]
+        assert list(throttled('a@b.com', messages)) == [messages]
+
+    @override_settings(MAIL_TEMPLATE_RATE_LIMITS={
+        'news@b.com': (5, 2), 'b.com': 10, '*': 100})
+    def test_limit_lookup(self):
+        assert get_limiter('Ana <News@b.com>').burst == 2
+        assert get_limiter('other@b.com').rate == 10
+        assert get_limiter('a@c.com').rate == 100
+        assert get_limiter('other@b.com') is get_limiter('more@b.com')
+
+    @override_settings(MAIL_TEMPLATE_RATE_LIMITS={'b.com': 1},
+                       MAIL_TEMPLATE_RATE_LIMIT_CACHE='default')
+    def test_shared_limiter(self):
+        assert isinstance(get_limiter('a@b.com'), CacheRateLimiter)
+
+    @override_settings(MAIL_TEMPLATE_RATE_LIMITS={'b.com': (100, 2)})
+    def test_chunks(self):
+        with patch.object(TokenBucket, 'acquire') as acquire:
+            chunks = list(throttled('a@b.com', [1, 2, 3, 4, 5]))
+        assert chunks == [[1, 2], [3, 4], [5]]
+        assert [c.args for c in acquire.call_args_list] == [(2,), (2,),
+                                                            (1,)]
+
+    @override_settings(MAIL_TEMPLATE_RATE_LIMITS={'b.com': (100, 2)})
+    async def test_async_chunks(self):
+        chunks = [chunk async for chunk in athrottled('a@b.com', [1, 2, 3])]
+        assert chunks == [[1, 2], [3]]
+
+    @override_settings(MAIL_TEMPLATE_RATE_LIMITS={'b.com': (1000, 2)})
+    def test_send_many_is_throttled(self):
+        mail_template = MailTemplate(from_email='a@b.com', subject='Hello',
+                                     to='c@d.com')
+        connection = Mock()
+        connection.send_messages.side_effect = lambda batch: len(batch)
+        results = mail_template.send_many([{}] * 5, batch_size=5,
+                                          connection=connection)
+        assert results == [1] * 5
+        assert [len(c.args[0]) for c in
+                connection.send_messages.call_args_list] == [2, 2, 1]
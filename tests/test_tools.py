@@ -1,8 +1,18 @@
 # -*- coding: UTF-8 -*-
+from types import SimpleNamespace
 from unittest import TestCase as UnitTest
+from unittest.mock import Mock, patch
+
+from django.core.exceptions import ValidationError
 
 from django_mail_template.tools import (replace_context_variable,
-                                        clean_address_list)
+                                        CompiledTemplate, compile_template,
+                                        DjangoTemplate,
+                                        compile_django_template,
+                                        LazyContext,
+                                        clean_address_list,
+                                        resolve_attribute, html_to_text,
+                                        send_messages_in_batches)
 
 
 class TestReplaceContextVariable(UnitTest):
@@ -53,6 +63,131 @@ class TestReplaceContextVariable(UnitTest):
         assert expected == replace_context_variable(text, data)
 
 
+class TestCompiledTemplate(UnitTest):
+
+    def assert_same_as_format_map(self, text, context):
+        self.assertEqual(CompiledTemplate(text).render(context),
+                         replace_context_variable(text, context))
+
+    def test_render_variables(self):
+        self.assert_same_as_format_map(
+            'Dummy text {context_variable} {replaced_text}.',
+            {'context_variable': 'example', 'replaced_text': 'of replace'})
+
+    def test_render_keep_missing_variables(self):
+        self.assert_same_as_format_map(
+            'Dummy text {context_variable} {fake%2d0} {more-fake}.',
+            {'context_variable': 'example'})
+
+    def test_render_escaped_braces(self):
+        self.assert_same_as_format_map('{{literal}} {name}', {'name': 'a'})
+
+    def test_render_complex_fields(self):
+        self.assert_same_as_format_map(
+            '{name!r} {name:>6} {items[1]} {name.upper}',
+            {'name': 'ab', 'items': ['x', 'y']})
+
+    def test_render_not_string_values(self):
+        self.assert_same_as_format_map('{number} {none}',
+                                       {'number': 1.5, 'none': None})
+
+    def test_render_many_times(self):
+        template = CompiledTemplate('Hello {name}')
+        assert template.render({'name': 'Ana'}) == 'Hello Ana'
+        assert template.render({'name': 'Bob'}) == 'Hello Bob'
+        assert template.render({}) == 'Hello {name}'
+
+    def test_field_names(self):
+        template = CompiledTemplate('{a} {b.c} {d[0]} {e:>3} {{f}} {0}')
+        assert template.field_names == {'a', 'b', 'd', 'e'}
+
+    def test_parse_errors_are_raised_on_creation(self):
+        with self.assertRaisesRegex(ValueError, "unexpected '{'"):
+            CompiledTemplate('Body with troubles {name{')
+        with self.assertRaisesRegex(ValueError, "Single '}'"):
+            CompiledTemplate('Body with troubles }name}')
+
+    def test_compile_template_is_cached(self):
+        text = 'Cached {text}'
+        assert compile_template(text) is compile_template(text)
+
+
+class TestDjangoTemplate(UnitTest):
+
+    def test_render(self):
+        template = DjangoTemplate(
+            '{% for item in items %}{{ item.name|upper }}, {% endfor %}'
+            '{% if total > 10 %}<b>{{ total }}</b>{% endif %}')
+        context = {'items': [SimpleNamespace(name='a'),
+                             SimpleNamespace(name='b')], 'total': 11}
+        assert template.render(context) == 'A, B, <b>11</b>'
+
+    def test_autoescape(self):
+        context = {'name': '<Ana & Eva>'}
+        assert DjangoTemplate('{{ name }}').render(context) == \
+            '&lt;Ana &amp; Eva&gt;'
+        assert DjangoTemplate('{{ name }}', autoescape=False).render(
+            context) == '<Ana & Eva>'
+
+    def test_tags_setting_variables(self):
+        template = DjangoTemplate(
+            '{% firstof name "friend" as who %}Hi {{ who }}, '
+            '{% now "Y" as year %}{{ year|length }}')
+        assert template.render(LazyContext({})) == 'Hi friend, 4'
+        assert template.field_names == {'name'}
+
+    def test_field_names(self):
+        template = DjangoTemplate(
+            '{% for item in items %}{{ item|default:fallback }}'
+            '{{ forloop.counter }}{% endfor %}'
+            '{% if user.is_active and not blocked %}{% endif %}'
+            '{% with total=cart.total %}{{ total }}{% endwith %}'
+            '{{ "literal" }}')
+        assert template.field_names == {'items', 'fallback', 'user',
+                                        'blocked', 'cart'}
+
+    def test_parse_errors_are_raised_on_creation(self):
+        with self.assertRaisesRegex(ValueError, 'if'):
+            DjangoTemplate('{% if %}')
+
+    def test_compile_django_template_is_cached(self):
+        text = 'Cached {{ text }}'
+        assert compile_django_template(text) is compile_django_template(text)
+        assert compile_django_template(text, autoescape=False) is not \
+            compile_django_template(text)
+
+
+class TestHtmlToText(UnitTest):
+
+    def test_plain_text_is_not_changed(self):
+        assert html_to_text('Hello {name}!') == 'Hello {name}!'
+
+    def test_blocks_and_line_breaks(self):
+        html = '<h1>Title</h1><p>First   line<br>second line</p><div>End</div>'
+        assert html_to_text(html) == 'Title\n\nFirst line\nsecond line\n\nEnd'
+
+    def test_lists(self):
+        html = '<ul><li>One</li><li>Two</li></ul>'
+        assert html_to_text(html) == '- One\n- Two'
+
+    def test_links_followed_by_url(self):
+        html = '<a href="https://b.com/{code}">Click</a>'
+        assert html_to_text(html) == 'Click (https://b.com/{code})'
+
+    def test_skip_style_and_script(self):
+        html = '<style>p {color: red}</style><script>x()</script><p>Text</p>'
+        assert html_to_text(html) == 'Text'
+
+    def test_character_references(self):
+        html = 'A &amp; B &#123;literal&#125; {name}'
+        assert html_to_text(html) == 'A & B {{literal}} {name}'
+        assert CompiledTemplate(html_to_text(html)).render(
+            {'name': 'x'}) == 'A & B {literal} x'
+
+    def test_images_alt_text(self):
+        assert html_to_text('<img src="logo.png" alt="Logo">') == 'Logo'
+
+
 class TestConvertToComaSeparatedList(UnitTest):
 
     def test_receive_string_with_one_email_return_a_list(self):
@@ -78,3 +213,108 @@ class TestConvertToComaSeparatedList(UnitTest):
     def test_receive_none_return_empty_list(self):
         result = clean_address_list(None)
         assert result == []
+
+    def test_validation_is_done_once_for_same_value(self):
+        with patch('django_mail_template.tools._email_field') as mock_field:
+            mock_field.clean.side_effect = lambda value: value.strip()
+            clean_address_list('once@b.com, twice@b.com')
+            result = clean_address_list('once@b.com, twice@b.com')
+        assert result == ['once@b.com', 'twice@b.com']
+        assert mock_field.clean.call_count == 2
+
+    def test_return_a_new_list_on_each_call(self):
+        result = clean_address_list('new@b.com')
+        result.append('other@b.com')
+        assert clean_address_list('new@b.com') == ['new@b.com']
+
+    def test_invalid_value_raise_error_each_time(self):
+        for _ in range(2):
+            with self.assertRaises(ValidationError):
+                clean_address_list('no-mail, simple@mail.com', 'To')
+
+
+class TestSendMessagesInBatches(UnitTest):
+
+    def setUp(self) -> None:
+        self.connection = Mock()
+        self.connection.open.return_value = True
+        self.connection.send_messages.side_effect = lambda batch: len(batch)
+
+    def test_split_messages_in_batches(self):
+        result = list(send_messages_in_batches(
+            range(5), 2, connection=self.connection))
+        assert result == [([0, 1], 2), ([2, 3], 2), ([4], 1)]
+
+    def test_open_and_close_connection_once(self):
+        list(send_messages_in_batches(range(5), 2,
+                                      connection=self.connection))
+        assert self.connection.open.call_count == 1
+        assert self.connection.close.call_count == 1
+
+    def test_do_not_close_connection_already_opened(self):
+        self.connection.open.return_value = False
+        list(send_messages_in_batches(range(5), 2,
+                                      connection=self.connection))
+        assert self.connection.close.call_count == 0
+
+    def test_batch_size_must_be_positive(self):
+        with self.assertRaises(ValueError):
+            list(send_messages_in_batches(range(5), 0,
+                                          connection=self.connection))
+
+
+class TestResolveAttribute(UnitTest):
+
+    def setUp(self) -> None:
+        self.obj = SimpleNamespace(
+            name_='Ana', profile=SimpleNamespace(city='Madrid'),
+            get_name=lambda: 'Ana Smith')
+
+    def test_attribute(self):
+        assert resolve_attribute(self.obj, 'name_') == 'Ana'
+
+    def test_dotted_path(self):
+        assert resolve_attribute(self.obj, 'profile.city') == 'Madrid'
+
+    def test_callable_value_is_called(self):
+        assert resolve_attribute(self.obj, 'get_name') == 'Ana Smith'
+
+    def test_callable_path(self):
+        assert resolve_attribute(self.obj, lambda obj: obj.name_) == 'Ana'
+
+
+class TestLazyContext(UnitTest):
+
+    def test_callables_are_called_once_when_used(self):
+        total = Mock(spec=lambda: None, return_value=10)
+        unused = Mock(spec=lambda: None)
+        context = LazyContext({'total': total, 'unused': unused, 'name': 'A'})
+        assert context['total'] == 10
+        assert context['total'] == 10
+        assert context['name'] == 'A'
+        assert total.call_count == 1
+        unused.assert_not_called()
+        assert 'unused' in context
+        assert 'other' not in context
+        assert set(context) == {'total', 'unused', 'name'}
+        assert len(context) == 3
+
+    def test_do_not_call_in_templates(self):
+        value = Mock(do_not_call_in_templates=True)
+        assert LazyContext({'value': value})['value'] is value
+
+    def test_missing_keys(self):
+        with self.assertRaises(KeyError):
+            LazyContext({})['name']
+        assert LazyContext({}).get('name') is None
+
+    def test_compiled_template_with_lazy_context(self):
+        user = Mock(spec=lambda: None,
+                    return_value=SimpleNamespace(name='Ana'))
+        context = LazyContext({'user': user})
+        text = compile_template('{user.name} {user.name!r} {missing.x}')
+        with self.assertRaises(AttributeError):
+            text.render(context)
+        assert compile_template('{user.name} {user.name!r} {other}').render(
+            context) == "Ana 'Ana' {other}"
+        assert user.call_count == 1
@@ -0,0 +1,70 @@
+# -*- coding: UTF-8 -*-
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from django_mail_template.cache import mail_template_lookup_cache
+from django_mail_template.models import MailTemplate, Configuration
+from django_mail_template.warmup import warm_up
+
+
+class TestWarmUp(TestCase):
+
+    def setUp(self) -> None:
+        self.greeting = MailTemplate.objects.create(
+            title='Greeting', subject='Hello {name}', from_email='a@b.com',
+            body='<p>Dear {name}</p>', to='b@c.com')
+        self.bye = MailTemplate.objects.create(
+            title='Bye', subject='Bye', from_email='a@b.com')
+        Configuration.objects.create(process='greeting',
+                                     mail_template=self.greeting)
+        Configuration.objects.create(process='welcome',
+                                     mail_template=self.greeting)
+        Configuration.objects.create(process='bye', mail_template=self.bye)
+        Configuration.objects.create(process='none')
+        mail_template_lookup_cache.clear()
+
+    def test_lookups_do_not_query_after_warm_up(self):
+        with self.assertNumQueries(1):
+            assert warm_up() == (4, 2)
+        with self.assertNumQueries(0):
+            assert Configuration.get_mail_template('greeting') == \
+                self.greeting
+            assert Configuration.get_mail_template('bye') == self.bye
+            assert Configuration.get_mail_template('none') is None
+
+    def test_shared_cache_is_filled(self):
+        warm_up()
+        mail_template_lookup_cache.clear()
+        with self.assertNumQueries(0):
+            assert Configuration.get_mail_template('welcome') == \
+                self.greeting
+
+    def test_some_processes(self):
+        assert warm_up(['bye']) == (1, 1)
+        with self.assertNumQueries(1):
+            Configuration.get_mail_template('greeting')
+
+    def test_mail_templates_are_prepared(self):
+        with patch.object(MailTemplate, 'prepare', autospec=True) as prepare:
+            warm_up()
+        assert {c.args[0] for c in prepare.call_args_list} == {self.greeting,
+                                                               self.bye}
+
+    @override_settings(MAIL_TEMPLATE_CACHE_TIMEOUT=0)
+    def test_cache_disabled(self):
+        warm_up()
+        with self.assertNumQueries(1):
+            Configuration.get_mail_template('greeting')
+
+    def test_command(self):
+        out = StringIO()
+        call_command('mail_template_warmup', stdout=out)
+        assert out.getvalue() == \
+            'Warmed up 4 processes and 2 mail templates.\n'
+
+    def test_prepare_ignores_errors(self):
+        mail_template = MailTemplate(subject='Hello {', to='not an address')
+        mail_template.prepare()